@@ -108,6 +108,48 @@ DATABASES = {
     )
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # File-backed test database so concurrency tests see SQLite's real locking
+    # (the booking write paths take the write lock up front - see write_transaction)
+    DATABASES['default']['TEST'] = {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')}
+
+
+# Cache
+# Database-backed so every worker shares the availability version and payloads
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'availability_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    }
+}
+
+# Memory-mapped availability grid shared by every worker on this machine. Kept in
+# a directory of the app's own rather than the shared temp directory
+AVAILABILITY_GRID_PATH = os.environ.get(
+    'AVAILABILITY_GRID_PATH',
+    os.path.join(BASE_DIR, 'var', 'availability.grid')
+)
+
+# Seconds between each worker's availability version reads while live
+# availability streams are open - raise it to trade freshness for database load
+AVAILABILITY_FEED_POLL_INTERVAL = float(os.environ.get('AVAILABILITY_FEED_POLL_INTERVAL', 1))
+
+# How long a booking's Idempotency-Key replays its response (seconds)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# How long an in-flight booking holds its Idempotency-Key before a retry can
+# claim it - longer than the web worker timeout, so only dead requests lose it
+IDEMPOTENCY_PROCESSING_LEASE = 60
+
+# Reverse proxies in front of the app, whose X-Forwarded-For entries are
+# trusted when rate limiting by client address (Render's router is one)
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 1 if os.environ.get('RENDER') else 0))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
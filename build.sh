@@ -9,4 +9,7 @@ pip install -r requirements.txt
 python manange.py collectstatic --no-input
 
 # Run migrations
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+
+# Create the shared cache table (no-op if it already exists)
+python manage.py createcachetable
\ No newline at end of file
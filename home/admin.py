@@ -1,9 +1,15 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.validators import validate_email
+from django.db.models import Q
+from django.shortcuts import render
 from django.utils.html import format_html
-from django.urls import reverse
+from django.urls import path, reverse
 from django.utils import timezone
 from datetime import date
-from .models import GroupWalk, IndividualWalk, Dog, GroupWalkSlotManager, BookingSettings
+from . import slot_catalogue
+from .forms import AvailabilityRuleForm, ClosureImportForm
+from .models import CalendarSyncTask, Customer, EmailOutbox, GroupWalk, IndividualWalk, DogProfile, GroupWalkSlotManager, BookingSettings, SlotOverride, AvailabilityRule
 
 @admin.register(BookingSettings)
 class BookingSettingsAdmin(admin.ModelAdmin):
@@ -32,19 +38,83 @@ class BookingSettingsAdmin(admin.ModelAdmin):
         # Prevent deleting the settigns instance
         return False
 
+class CustomerEmailSearchMixin:
+    """
+    Search bookings by a full email address through the customer's unique index
+
+    Anything that isn't a complete address (e.g. '@gmail.com') uses the normal
+    search. Bookings no longer linked to a customer are still matched on
+    customer_email.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        try:
+            validate_email(term)
+        except ValidationError:
+            return super().get_search_results(request, queryset, search_term)
+
+        return queryset.filter(
+            Q(customer__email=Customer.normalize_email(term))
+            | Q(customer__isnull=True, customer_email__iexact=term)
+        ), False
+
+
+class GroupWalkInline(admin.TabularInline):
+    model = GroupWalk
+    fields = ['booking_date', 'time_slot', 'number_of_dogs', 'status']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class IndividualWalkInline(admin.TabularInline):
+    model = IndividualWalk
+    fields = ['preferred_date', 'preferred_time', 'number_of_dogs', 'status']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ['name', 'email', 'phone', 'postcode', 'created_at']
+    search_fields = ['=email', 'name']
+    readonly_fields = ['created_at', 'updated_at']
+    inlines = [GroupWalkInline, IndividualWalkInline]
+
+    fieldsets = (
+        ('Customer Information', {
+            'fields': ('name', 'email', 'phone', 'address', 'postcode')
+        }),
+        ('System Information', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        })
+    )
+
 @admin.register(GroupWalk)
-class GroupWalkAdmin(admin.ModelAdmin):
+class GroupWalkAdmin(CustomerEmailSearchMixin, admin.ModelAdmin):
     list_display = ['customer_name', 'booking_date', 'time_slot', 'number_of_dogs', 'status', 'created_at']
     list_filter = ['booking_date', 'time_slot', 'status']
     search_fields = ['customer_name', 'customer_email']
     readonly_fields = ['calendar_event_id', 'created_at', 'updated_at']
+    autocomplete_fields = ['customer', 'dogs']
 
     fieldsets = (
         ('Customer Information', {
-            'fields': ('customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_postcode')
+            'fields': ('customer', 'customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_postcode')
         }),
         ('Booking Details', {
-            'fields': ('booking_date', 'time_slot', 'number_of_dogs', 'status')
+            'fields': ('booking_date', 'time_slot', 'number_of_dogs', 'status', 'dogs')
         }),
         ('System Information', {
             'fields': ('calendar_event_id', 'created_at', 'updated_at'),
@@ -53,18 +123,19 @@ class GroupWalkAdmin(admin.ModelAdmin):
     )
 
 @admin.register(IndividualWalk)
-class IndividualWalkAdmin(admin.ModelAdmin):
+class IndividualWalkAdmin(CustomerEmailSearchMixin, admin.ModelAdmin):
     list_display = ['customer_name', 'preferred_date', 'preferred_time', 'status', 'created_at']
     list_filter = ['status', 'preferred_date']
     search_fields = ['customer_name', 'customer_email']
     readonly_fields = ['calendar_event_id', 'created_at', 'updated_at']
+    autocomplete_fields = ['customer', 'dogs']
 
     fieldsets = (
         ('Customer Information', {
-            'fields': ('customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_postcode')
+            'fields': ('customer', 'customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_postcode')
         }),
         ('Walk Request Details', {
-            'fields': ('preferred_date', 'preferred_time', 'reason_for_individual', 'number_of_dogs', 'status')
+            'fields': ('preferred_date', 'preferred_time', 'reason_for_individual', 'number_of_dogs', 'status', 'dogs')
         }),
         ('Admin Response', {
             'fields': ('admin_response', 'confirmed_date', 'confirmed_time'),
@@ -76,13 +147,38 @@ class IndividualWalkAdmin(admin.ModelAdmin):
         })
     )
 
-@admin.register(Dog)
-class DogAdmin(admin.ModelAdmin):
-    list_display = ['name', 'breed', 'age', 'get_booking_customer', 'good_with_other_dogs']
-    list_filter = ['breed', 'good_with_other_dogs', 'age']
-    search_fields = ['name', 'breed', 'group_walk__customer_name', 'individual_walk__customer_name']
+class NeedsReviewFilter(admin.SimpleListFilter):
+    """ Filter dogs on whether a booking proposed details that need review """
+    title = 'needs review'
+    parameter_name = 'needs_review'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('yes', 'Yes'),
+            ('no', 'No'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(pending_details__isnull=False)
+        if self.value() == 'no':
+            return queryset.filter(pending_details__isnull=True)
+        return queryset
+
+
+@admin.register(DogProfile)
+class DogProfileAdmin(admin.ModelAdmin):
+    list_display = ['name', 'breed', 'age', 'owner_name', 'owner_email', 'good_with_other_dogs', 'get_needs_review']
+    list_filter = [NeedsReviewFilter, 'breed', 'good_with_other_dogs', 'age']
+    # Owner details live on the profile, so searching needs no joins to the bookings
+    search_fields = ['name', 'breed', 'owner_name', 'owner_email']
+    readonly_fields = ['pending_details', 'created_at', 'updated_at']
+    actions = ['apply_pending_details', 'discard_pending_details']
 
     fieldsets = (
+        ('Owner', {
+            'fields': ('owner_name', 'owner_email')
+        }),
         ('Basic Information', {
             'fields': ('name', 'breed', 'age')
         }),
@@ -92,40 +188,120 @@ class DogAdmin(admin.ModelAdmin):
         ('Veterinary Information', {
             'fields': ('vet_name', 'vet_phone', 'vet_address')
         }),
-        ('Booking Association', {
-            'fields': ('group_walk', 'individual_walk'),
+        ('Waiting for Review', {
+            'fields': ('pending_details',),
+            'description': "Details from a booking that differ from the profile. They aren't used until applied."
+        }),
+        ('System Information', {
+            'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         })
     )
-    
-    def get_booking_customer(self, obj):
-        if obj.group_walk:
-            return f"{obj.group_walk.customer_name} (Group)"
-        elif obj.individual_walk:
-            return f"{obj.individual_walk.customer_name} (Individual)"
-        return "No booking"
-    get_booking_customer.short_description = 'Customer'
+
+    def get_needs_review(self, obj):
+        """ Show whether a booking proposed details that need review """
+        return obj.pending_details is not None
+
+    get_needs_review.short_description = 'Needs Review'
+    get_needs_review.boolean = True
+
+    def apply_pending_details(self, request, queryset):
+        profiles = list(queryset.filter(pending_details__isnull=False))
+        for profile in profiles:
+            profile.apply_pending_details()
+        self.message_user(request, f"Applied the reviewed details to {len(profiles)} dog(s).", messages.SUCCESS)
+    apply_pending_details.short_description = "Apply details waiting for review"
+
+    def discard_pending_details(self, request, queryset):
+        updated = queryset.filter(pending_details__isnull=False).update(pending_details=None, updated_at=timezone.now())
+        self.message_user(request, f"Discarded the details waiting for review on {updated} dog(s).", messages.SUCCESS)
+    discard_pending_details.short_description = "Discard details waiting for review"
+
+class FullyBookedFilter(admin.SimpleListFilter):
+    """ Filter slot managers on whether every open slot is full """
+    title = 'fully booked'
+    parameter_name = 'fully_booked'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('yes', 'Yes'),
+            ('no', 'No'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(fully_booked=True)
+        if self.value() == 'no':
+            return queryset.filter(fully_booked=False)
+        return queryset
+
+
+class UtilizationFilter(admin.SimpleListFilter):
+    """ Filter slot managers by the share of open capacity booked """
+    title = 'utilization'
+    parameter_name = 'utilization'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('empty', 'No bookings'),
+            ('low', 'Under 50%'),
+            ('high', '50% - 99%'),
+            ('full', '100%'),
+            ('closed', 'All slots closed'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'empty':
+            return queryset.filter(utilization=0)
+        if self.value() == 'low':
+            return queryset.filter(utilization__gt=0, utilization__lt=50)
+        if self.value() == 'high':
+            return queryset.filter(utilization__gte=50, utilization__lt=100)
+        if self.value() == 'full':
+            return queryset.filter(utilization__gte=100)
+        if self.value() == 'closed':
+            return queryset.filter(utilization__isnull=True)
+        return queryset
+
+
+class ClosedSlotFilter(admin.SimpleListFilter):
+    """ Filter slot managers on which slot is closed """
+    title = 'closed slot'
+    parameter_name = 'closed_slot'
+
+    def lookups(self, request, model_admin):
+        return [(slot.id, slot.key.title()) for slot in slot_catalogue.SLOTS]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(slot_overrides__time_slot=self.value(), slot_overrides__is_available=False)
+        return queryset
+
+
+class SlotOverrideInline(admin.TabularInline):
+    model = SlotOverride
+    extra = 0
+    fields = ['time_slot', 'is_available', 'capacity']
+    verbose_name = "Slot change"
+    verbose_name_plural = "Slot changes (slots not listed here are open at their usual capacity)"
+
 
 @admin.register(GroupWalkSlotManager)
 class GroupWalkSlotManagerAdmin(admin.ModelAdmin):
-    list_display = ['date', 'get_availability_status', 'get_bookings_count', 'get_capacity_info', 'notes_preview']
-    list_filter = ['date', 'morning_slot_available', 'afternoon_slot_available', 'evening_slot_available']
+    list_display = [
+        'date', 'get_availability_status', 'get_bookings_count', 'get_capacity_info',
+        'get_utilization', 'get_fully_booked', 'notes_preview'
+    ]
+    list_filter = ['date', FullyBookedFilter, UtilizationFilter, ClosedSlotFilter]
     search_fields = ['date', 'notes']
     date_hierarchy = 'date'
     ordering = ['date']
+    inlines = [SlotOverrideInline]
 
     fieldsets = (
         ('Date', {
             'fields': ('date',)
         }),
-        ('Slot Availability', {
-            'fields': (
-                ('morning_slot_available', 'morning_slot_capacity'),
-                ('afternoon_slot_available', 'afternoon_slot_capacity'),
-                ('evening_slot_available', 'evening_slot_capacity')
-            ),
-            'description': 'Control which time slots are available for booking on this date.'
-        }),
         ('Notes', {
             'fields': ('notes',),
             'description': 'Internal notes about why slots are unavailable (holiday, sick day, etc.)'
@@ -137,20 +313,62 @@ class GroupWalkSlotManagerAdmin(admin.ModelAdmin):
     )
 
     readonly_fields = ['created_at', 'updated_at']
+    change_list_template = 'admin/home/groupwalkslotmanager/change_list.html'
+
+    def get_urls(self):
+        """ Add the closure calendar import page """
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_closures_view),
+                name='home_groupwalkslotmanager_import'
+            ),
+        ] + super().get_urls()
+
+    def import_closures_view(self, request):
+        """ Upload an ICS or CSV calendar of closures """
+        from .closure_import import import_closures
+
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        result = None
+        if request.method == 'POST':
+            form = ClosureImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                result = import_closures(
+                    form.cleaned_data['closures'],
+                    cancel_bookings=form.cleaned_data['cancel_bookings'],
+                    dry_run=form.cleaned_data['dry_run']
+                )
+                result['warnings'] = form.cleaned_data['warnings']
+                result['dry_run'] = form.cleaned_data['dry_run']
+                if not result['dry_run']:
+                    messages.success(
+                        request,
+                        f"Closed {result['closed_slots']} slot(s) across {len(result['dates'])} date(s)."
+                    )
+        else:
+            form = ClosureImportForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import closures',
+            'form': form,
+            'result': result,
+        }
+        return render(request, 'admin/home/groupwalkslotmanager/import_closures.html', context)
 
     def get_availability_status(self, obj):
         """ Show availablity status with color coding """
-        available_slots = []
-        if obj.morning_slot_available:
-            available_slots.append('Morning')
-        if obj.afternoon_slot_available:
-            available_slots.append('Afternoon')
-        if obj.evening_slot_available:
-            available_slots.append('Evening')
+        available_slots = [
+            slot.key.title() for slot in slot_catalogue.SLOTS if obj.is_slot_available(slot.id)
+        ]
 
         if not available_slots:
                 return format_html('<span style="color: red; font-weight: bold;">❌ All Unavailable</span>')
-        elif len(available_slots) == 3:
+        elif len(available_slots) == len(slot_catalogue.SLOTS):
             return format_html('<span style="color: green; font-weight: bold;">✅ All Available</span>')
         else:
             return format_html('<span style="color: orange; font-weight: bold;">⚠️ Partial: {}</span>', ', '.join(available_slots))
@@ -159,24 +377,43 @@ class GroupWalkSlotManagerAdmin(admin.ModelAdmin):
 
     def get_bookings_count(self, obj):
         """ Show current bookings for this date """
-        morning_count = obj.morning_bookings_count
-        afternoon_count = obj.afternoon_bookings_count
-        evening_count = obj.evening_bookings_count
+        counts = [(slot.abbreviation, obj.bookings_count(slot.id)) for slot in slot_catalogue.SLOTS]
 
-        total_bookings = morning_count + afternoon_count + evening_count
+        total_bookings = sum(count for abbreviation, count in counts)
 
         if total_bookings == 0:
             return 'No bookings'
         
-        return f"M:{morning_count} | A:{afternoon_count} | E:{evening_count} ({total_bookings} total)"
+        return f"{' | '.join(f'{abbreviation}:{count}' for abbreviation, count in counts)} ({total_bookings} total)"
 
     get_bookings_count.short_description = 'Current Bookings'
 
     def get_capacity_info(self, obj):
         """ Show capacity information """
-        return f"M:{obj.morning_slot_capacity} | A:{obj.afternoon_slot_capacity} | E:{obj.evening_slot_capacity}"
+        return ' | '.join(f"{slot.abbreviation}:{obj.slot_capacity(slot.id)}" for slot in slot_catalogue.SLOTS)
+
+    get_capacity_info.short_description = f"Capacity ({'|'.join(slot.abbreviation for slot in slot_catalogue.SLOTS)})"
+
+    def get_queryset(self, request):
+        """ Annotate booking counts so the changelist doesn't query each row """
+        return GroupWalkSlotManager.with_booking_counts(super().get_queryset(request))
+
+    def get_utilization(self, obj):
+        """ Show the share of open capacity that is booked """
+        if obj.utilization is None:
+            return '-'
+        return f"{obj.utilization:.0f}%"
+
+    get_utilization.short_description = 'Utilization'
+    get_utilization.admin_order_field = 'utilization'
+
+    def get_fully_booked(self, obj):
+        """ Show whether every open slot is full """
+        return obj.fully_booked
 
-    get_capacity_info.short_description = 'Capacity (M|A|E)'
+    get_fully_booked.short_description = 'Fully Booked'
+    get_fully_booked.boolean = True
+    get_fully_booked.admin_order_field = 'fully_booked'
 
     def notes_preview(self, obj):
         """ Show preview of notes """
@@ -187,35 +424,100 @@ class GroupWalkSlotManagerAdmin(admin.ModelAdmin):
     notes_preview.short_description = 'Notes'
 
     def save_model(self, request, obj, form, change):
-        """ Handle booking cancellations when slots are made unavailable """
-        if change: #Only for existing objects
-            # Get the original object to compare changes
+        """ Remember which slots were closed before the slot changes are saved """
+        obj.previously_closed = set()
+        if change:
             original = GroupWalkSlotManager.objects.get(pk=obj.pk)
-
-            # check what slots were disabled
-            cancelled_slots = []
-            if original.morning_slot_available and not obj.morning_slot_available:
-                cancelled_slots.append('10:00-12:00')
-            if original.afternoon_slot_available and not obj.afternoon_slot_available:
-                cancelled_slots.append('14:00-16:00')
-            if original.evening_slot_available and not obj.evening_slot_available:
-                cancelled_slots.append('18:00-20:00')
-            
-            # Cancel existing bookings for disabled slots
-            if cancelled_slots:
-                from django.contrib import messages
-                from .utils import cancel_bookings_for_unavailable_slots
-
-                cancelled_count = cancel_bookings_for_unavailable_slots(obj.date, cancelled_slots, obj.notes or "Date marked unavailable by admin")
-
-                if cancelled_count > 0:
-                    messages.warning(
-                        request,
-                        f"⚠️ {cancelled_count} existing booking(s) were automatically cancelled and customers have been notified by email."
-                    )
+            obj.previously_closed = {slot.id for slot in original.unavailable_slots}
         super().save_model(request, obj, form, change)
 
+    def save_related(self, request, form, formsets, change):
+        """ Handle booking cancellations when slots are made unavailable """
+        super().save_related(request, form, formsets, change)
+
+        # Re-read without the changelist annotations, which predate the inline changes
+        obj = GroupWalkSlotManager.objects.get(pk=form.instance.pk)
+        cancelled_slots = [
+            slot.id for slot in obj.unavailable_slots if slot.id not in form.instance.previously_closed
+        ]
+
+        # Cancel existing bookings for disabled slots
+        if cancelled_slots:
+            from .utils import cancel_bookings_for_unavailable_slots
+
+            cancelled_count = cancel_bookings_for_unavailable_slots(obj.date, cancelled_slots, obj.notes or "Date marked unavailable by admin")
+
+            if cancelled_count > 0:
+                messages.warning(
+                    request,
+                    f"⚠️ {cancelled_count} existing booking(s) were automatically cancelled and customers have been notified by email."
+                )
+
+@admin.register(AvailabilityRule)
+class AvailabilityRuleAdmin(admin.ModelAdmin):
+    form = AvailabilityRuleForm
+    list_display = ['name', 'get_description', 'start_date', 'end_date', 'is_active']
+    list_filter = ['is_active']
+    search_fields = ['name']
+
+    fieldsets = (
+        ('Rule', {
+            'fields': ('name', 'is_active'),
+            'description': 'Standing closures, e.g. closed every Monday or no evening walks in December. '
+                           'Dates changed on the slot manager always take priority.'
+        }),
+        ('When', {
+            'fields': ('weekdays', 'months', 'time_slots', ('start_date', 'end_date')),
+        }),
+    )
+
+    def get_description(self, obj):
+        """ Show when the rule applies """
+        return obj.describe()
+
+    get_description.short_description = 'Applies'
+
 # Customize the admin site
 admin.site.site_header = "Canine Compadre Administration"
 admin.site.site_title = "Canine Compadre Admin"
-admin.site.index_title = "Welcome to Canine Compadre Administartion"
\ No newline at end of file
+admin.site.index_title = "Welcome to Canine Compadre Administartion"
+
+
+@admin.register(CalendarSyncTask)
+class CalendarSyncTaskAdmin(admin.ModelAdmin):
+    list_display = ['booking_type', 'booking_id', 'action', 'status', 'attempts', 'next_attempt_at', 'last_error']
+    list_filter = ['status', 'action', 'booking_type']
+    readonly_fields = ['booking_type', 'booking_id', 'action', 'event_id', 'attempts', 'last_error', 'created_at', 'updated_at']
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        # Tasks are queued by booking changes
+        return False
+
+    def retry_now(self, request, queryset):
+        updated = queryset.update(status='pending', attempts=0, next_attempt_at=timezone.now(), last_error='')
+        self.message_user(request, f"{updated} calendar task(s) queued to retry.", messages.SUCCESS)
+    retry_now.short_description = "Retry selected tasks now"
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipients', 'status', 'attempts', 'created_at', 'sent_at', 'last_error']
+    list_filter = ['status', 'created_at']
+    search_fields = ['=dedupe_key', 'subject']
+    readonly_fields = [
+        'dedupe_key', 'subject', 'body', 'html_body', 'from_email', 'recipients', 'reply_to',
+        'attempts', 'last_error', 'created_at', 'sent_at'
+    ]
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        # Emails are queued by the site
+        return False
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f"{updated} email(s) queued to retry.", messages.SUCCESS)
+    retry_now.short_description = "Retry selected emails now"
@@ -9,32 +9,50 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from datetime import date, timedelta
+from urllib.parse import urlencode
 import json
 
-from .models import GroupWalkSlotManager, GroupWalk
-from .utils import cancel_bookings_for_unavailable_slots
+from . import slot_catalogue
+from .models import AvailabilityRule, GroupWalkSlotManager, GroupWalk
+from .utils import cancel_bookings_for_closed_slots
+from .availability import BOOKING_HORIZON_DAYS, get_booking_window
 
 @staff_member_required
 def manage_unavailable_dates(request):
     """
     Main view for managing unavailable dates - shows calendar interface
+
+    Pass month (YYYY-MM) or start/end to page through the booking horizon.
     """
     
-    # Get upcoming unavailable dates
     today = date.today()
-    upcoming_unavailable = GroupWalkSlotManager.objects.filter(
-        date__gte=today,
-    ).exclude(
-        morning_slot_available=True,
-        afternoon_slot_available=True,
-        evening_slot_available=True
-    ).order_by('date')[:10]
+    try:
+        window = get_booking_window(
+            start=request.GET.get('start'),
+            end=request.GET.get('end'),
+            month=request.GET.get('month')
+        )
+    except ValueError:
+        messages.error(request, "Invalid date range - showing the next 30 days instead.")
+        window = get_booking_window()
+    
+    # Get unavailable dates in the window
+    upcoming_unavailable = list(GroupWalkSlotManager.with_closed_slots(
+        GroupWalkSlotManager.objects.filter(
+            date__range=(window['start_date'], window['end_date']),
+        )
+    ).filter(closed_slots__gt=0).prefetch_related('slot_overrides').order_by('date'))
     
-    # Get dates with existing bookings (next 30 days)
+    # Recurring rules are loaded once and shared by every slot manager on the page
+    rules = AvailabilityRule.load()
+    for slot_manager in upcoming_unavailable:
+        slot_manager.rules = rules
+    
+    # Get dates with existing bookings in the window
     dates_with_bookings = GroupWalk.objects.filter(
-        booking_date__gte=today,
-        booking_date__lte=today + timedelta(days=30),
+        booking_date__range=(window['start_date'], window['end_date']),
         status='confirmed'
     ).values_list('booking_date', flat=True).distinct()
     
@@ -42,11 +60,65 @@ def manage_unavailable_dates(request):
         'upcoming_unavailable': upcoming_unavailable,
         'dates_with_bookings': list(dates_with_bookings),
         'today': today,
+        'window_start': window['start_date'],
+        'window_end': window['end_date'],
+        'previous_query': urlencode(window['previous']) if window['previous'] else None,
+        'next_query': urlencode(window['next']) if window['next'] else None,
+        'slots': slot_catalogue.SLOTS,
+        'recurring_rules': rules.rules,
         'title': 'Manage Unavailable Dates',
     }
     
     return render(request, 'admin/manage_unavailable_dates.html', context)
 
+def parse_selected_dates(data):
+    """
+    Read the dates an availability change applies to from a request body
+
+    Accepts a single 'date', a list of 'dates', or an inclusive 'start' and
+    'end' range, all as YYYY-MM-DD strings.
+
+    Returns:
+        list: Sorted, de-duplicated dates
+
+    Raises:
+        ValueError: If no dates are given, a range runs backwards, or the
+            selection reaches past the booking horizon
+    """
+    if 'date' in data:
+        selected_dates = [date.fromisoformat(data['date'])]
+    elif 'dates' in data:
+        selected_dates = sorted({date.fromisoformat(value) for value in data['dates']})
+    elif 'start' in data:
+        start_date = date.fromisoformat(data['start'])
+        end_date = date.fromisoformat(data.get('end') or data['start'])
+        if end_date < start_date:
+            raise ValueError('End date must be on or after the start date')
+        selected_dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    else:
+        raise ValueError('Choose a date or a date range')
+
+    if not selected_dates:
+        raise ValueError('Choose a date or a date range')
+    if selected_dates[-1] > date.today() + timedelta(days=BOOKING_HORIZON_DAYS):
+        raise ValueError(f'Dates must be within the next {BOOKING_HORIZON_DAYS} days')
+    return selected_dates
+
+def close_dates(selected_dates, time_slots, reason):
+    """
+    Close slots on a set of dates and cancel the bookings on them
+
+    The closure and the cancellations commit together. Customers are notified
+    in one batch once the transaction commits.
+
+    Returns:
+        tuple: (changed (date, time_slot) pairs, number of bookings cancelled)
+    """
+    with transaction.atomic():
+        changed = GroupWalkSlotManager.set_dates_available(selected_dates, time_slots, False, notes=reason)
+        cancelled_count = cancel_bookings_for_closed_slots(changed, reason)
+    return changed, cancelled_count
+
 @staff_member_required
 @require_POST
 def mark_date_unavailable(request):
@@ -58,7 +130,7 @@ def mark_date_unavailable(request):
         data = json.loads(request.body)
         selected_date = date.fromisoformat(data['date'])
         reason = data.get('reason', 'Marked unavailable by admin')
-        slots_to_disable = data.get('slots', ['morning', 'afternoon', 'evening'])
+        slots_to_disable = slot_catalogue.resolve_slots(data.get('slots', slot_catalogue.SLOT_IDS))
         
         # Validate date is not in the past
         if selected_date <= date.today():
@@ -67,49 +139,8 @@ def mark_date_unavailable(request):
                 'error': 'Cannot mark past dates as unavailable'
             })
         
-        # Get or create slot manager
-        slot_manager, created = GroupWalkSlotManager.objects.get_or_create(
-            date=selected_date,
-            defaults={
-                'morning_slot_available': True,
-                'afternoon_slot_available': True,
-                'evening_slot_available': True,
-                'morning_slot_capacity': 4,
-                'afternoon_slot_capacity': 4,
-                'evening_slot_capacity': 4,
-                'notes': reason,
-            }
-        )
-        
-        # Update notes
-        if not created:
-            slot_manager.notes = reason
-        
-        # Determine which slots to cancel
-        cancelled_slots = []
-        
-        if 'morning' in slots_to_disable and slot_manager.morning_slot_available:
-            slot_manager.morning_slot_available = False
-            cancelled_slots.append('10:00-12:00')
-        
-        if 'afternoon' in slots_to_disable and slot_manager.afternoon_slot_available:
-            slot_manager.afternoon_slot_available = False
-            cancelled_slots.append('14:00-16:00')
-        
-        if 'evening' in slots_to_disable and slot_manager.evening_slot_available:
-            slot_manager.evening_slot_available = False
-            cancelled_slots.append('18:00-20:00')
-        
-        slot_manager.save()
-        
-        # Cancel existing bookings and send emails
-        cancelled_count = 0
-        if cancelled_slots:
-            cancelled_count = cancel_bookings_for_unavailable_slots(
-                selected_date, 
-                cancelled_slots, 
-                reason
-            )
+        # Close the slots and cancel existing bookings - emails go out once it commits
+        changed, cancelled_count = close_dates([selected_date], [slot.id for slot in slots_to_disable], reason)
         
         return JsonResponse({
             'success': True,
@@ -135,39 +166,90 @@ def mark_date_available(request):
     try:
         data = json.loads(request.body)
         selected_date = date.fromisoformat(data['date'])
-        slots_to_enable = data.get('slots', ['morning', 'afternoon', 'evening'])
+        slots_to_enable = slot_catalogue.resolve_slots(data.get('slots', slot_catalogue.SLOT_IDS))
         
-        # Get slot manager
-        try:
-            slot_manager = GroupWalkSlotManager.objects.get(date=selected_date)
-        except GroupWalkSlotManager.DoesNotExist:
+        # Enable the specified slots - notes are cleared once every slot is open
+        GroupWalkSlotManager.set_dates_available([selected_date], [slot.id for slot in slots_to_enable], True)
+        
+        return JsonResponse({
+            'success': True,
+            'message': 'Date marked as available for booking.',
+            'date': selected_date.isoformat()
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        })
+
+@staff_member_required
+@require_POST
+def mark_dates_unavailable(request):
+    """
+    AJAX endpoint to close slots across a date range or a list of dates
+
+    Every date is written in one transaction and the affected bookings are
+    cancelled together, so closing a fortnight costs the same handful of
+    queries as closing a single day.
+    """
+    
+    try:
+        data = json.loads(request.body)
+        selected_dates = parse_selected_dates(data)
+        reason = data.get('reason', 'Marked unavailable by admin')
+        slots_to_disable = slot_catalogue.resolve_slots(data.get('slots', slot_catalogue.SLOT_IDS))
+        
+        # Validate dates are not in the past
+        if selected_dates[0] <= date.today():
             return JsonResponse({
                 'success': False,
-                'error': 'No slot manager found for this date'
+                'error': 'Cannot mark past dates as unavailable'
             })
         
-        # Enable the specified slots
-        if 'morning' in slots_to_enable:
-            slot_manager.morning_slot_available = True
+        changed, cancelled_count = close_dates(selected_dates, [slot.id for slot in slots_to_disable], reason)
         
-        if 'afternoon' in slots_to_enable:
-            slot_manager.afternoon_slot_available = True
-        
-        if 'evening' in slots_to_enable:
-            slot_manager.evening_slot_available = True
+        return JsonResponse({
+            'success': True,
+            'message': (
+                f'{len(selected_dates)} date{"s" if len(selected_dates) != 1 else ""} marked unavailable. '
+                f'{cancelled_count} existing bookings were cancelled and customers notified.'
+            ),
+            'cancelled_count': cancelled_count,
+            'changed_slots': len(changed),
+            'dates': [selected_date.isoformat() for selected_date in selected_dates],
+            'reason': reason
+        })
         
-        # Clear notes if all slots are now available
-        if (slot_manager.morning_slot_available and 
-            slot_manager.afternoon_slot_available and 
-            slot_manager.evening_slot_available):
-            slot_manager.notes = ''
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        })
+
+@staff_member_required
+@require_POST
+def mark_dates_available(request):
+    """
+    AJAX endpoint to reopen slots across a date range or a list of dates
+    """
+    
+    try:
+        data = json.loads(request.body)
+        selected_dates = parse_selected_dates(data)
+        slots_to_enable = slot_catalogue.resolve_slots(data.get('slots', slot_catalogue.SLOT_IDS))
         
-        slot_manager.save()
+        changed = GroupWalkSlotManager.set_dates_available(
+            selected_dates,
+            [slot.id for slot in slots_to_enable],
+            True
+        )
         
         return JsonResponse({
             'success': True,
-            'message': 'Date marked as available for booking.',
-            'date': selected_date.isoformat()
+            'message': f'{len(selected_dates)} date{"s" if len(selected_dates) != 1 else ""} marked as available for booking.',
+            'changed_slots': len(changed),
+            'dates': [selected_date.isoformat() for selected_date in selected_dates]
         })
         
     except Exception as e:
@@ -189,18 +271,12 @@ def get_date_info(request):
         try:
             slot_manager = GroupWalkSlotManager.objects.get(date=selected_date)
             availability = {
-                'morning': slot_manager.morning_slot_available,
-                'afternoon': slot_manager.afternoon_slot_available,
-                'evening': slot_manager.evening_slot_available,
-                'notes': slot_manager.notes or '',
+                slot.key: slot_manager.is_slot_available(slot.id) for slot in slot_catalogue.SLOTS
             }
+            availability['notes'] = slot_manager.notes or ''
         except GroupWalkSlotManager.DoesNotExist:
-            availability = {
-                'morning': True,
-                'afternoon': True,
-                'evening': True,
-                'notes': '',
-            }
+            availability = {slot.key: True for slot in slot_catalogue.SLOTS}
+            availability['notes'] = ''
         
         # Get existing bookings
         bookings = GroupWalk.objects.filter(
@@ -0,0 +1,555 @@
+"""
+Availability engine for Canine Compadre group walks
+
+Loads every slot override, the recurring closure rules and all confirmed
+occupancy (from the SlotOccupancy table) for a date window in one query each,
+then assembles the calendar in memory against the slot catalogue, so the query
+count grows with neither the number of slots per day nor the number of closed
+dates. Outside transactions the calendar is read from the shared
+availability grid instead (see availability_grid).
+"""
+
+import logging
+from datetime import date, timedelta
+from django.db import transaction
+from . import availability_grid, slot_catalogue
+from .availability_rules import NO_RULES
+from .models import AvailabilityRule, BookingSettings, GroupWalkSlotManager, SlotOccupancy, SlotOverride
+
+logger = logging.getLogger(__name__)
+
+# Bookings open from tomorrow for this many days
+BOOKING_HORIZON_DAYS = 180
+
+# Window length used when only a start date is given
+DEFAULT_WINDOW_DAYS = 30
+
+
+def get_booking_window(start=None, end=None, month=None):
+    """
+    Resolve window parameters to a date range inside the booking horizon
+
+    Args:
+        start: First date as an ISO string (defaults to tomorrow)
+        end: Last date as an ISO string (defaults to a 30 day window)
+        month: 'YYYY-MM' - takes precedence over start/end
+
+    Returns:
+        dict: start_date, end_date and days for the window, plus previous and
+        next cursors (query parameters for the neighbouring window, or None)
+
+    Raises:
+        ValueError: If the parameters are malformed or the window is empty
+    """
+    first_date = date.today() + timedelta(days=1)
+    last_date = first_date + timedelta(days=BOOKING_HORIZON_DAYS - 1)
+
+    if month:
+        year, month_number = (int(part) for part in month.split('-'))
+        month_start = date(year, month_number, 1)
+        next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+        previous_month_start = (month_start - timedelta(days=1)).replace(day=1)
+        start_date = max(month_start, first_date)
+        end_date = min(next_month_start - timedelta(days=1), last_date)
+        previous = {'month': previous_month_start.strftime('%Y-%m')} if month_start > first_date else None
+        next_cursor = {'month': next_month_start.strftime('%Y-%m')} if next_month_start <= last_date else None
+    else:
+        requested_start = date.fromisoformat(start) if start else first_date
+        requested_end = (
+            date.fromisoformat(end) if end
+            else requested_start + timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+        )
+        if requested_end < requested_start:
+            raise ValueError("Window end is before its start")
+
+        length = (requested_end - requested_start).days + 1
+        if length > BOOKING_HORIZON_DAYS:
+            raise ValueError(f"Window cannot be longer than {BOOKING_HORIZON_DAYS} days")
+
+        start_date = max(requested_start, first_date)
+        end_date = min(requested_end, last_date)
+        previous = None
+        if requested_start > first_date:
+            previous = {
+                'start': (requested_start - timedelta(days=length)).isoformat(),
+                'end': (requested_start - timedelta(days=1)).isoformat(),
+            }
+        next_cursor = None
+        if requested_end < last_date:
+            next_cursor = {
+                'start': (requested_end + timedelta(days=1)).isoformat(),
+                'end': (requested_end + timedelta(days=length)).isoformat(),
+            }
+
+    if start_date > end_date:
+        raise ValueError("Window is outside the booking horizon")
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'days': (end_date - start_date).days + 1,
+        'previous': previous,
+        'next': next_cursor,
+    }
+
+
+def load_slot_overrides(start_date, end_date):
+    """
+    Load all slot overrides for a date window in a single query
+
+    Returns:
+        dict: (available, capacity) keyed by (date, time_slot)
+    """
+    return SlotOverride.for_range(start_date, end_date)
+
+
+async def aload_slot_overrides(start_date, end_date):
+    """Async version of load_slot_overrides"""
+    return await SlotOverride.afor_range(start_date, end_date)
+
+
+def load_rules():
+    """Load and compile the recurring closure rules in a single query"""
+    return AvailabilityRule.load()
+
+
+async def aload_rules():
+    """Async version of load_rules"""
+    return await AvailabilityRule.aload()
+
+
+def load_occupancy(start_date, end_date):
+    """
+    Load confirmed dog counts for a date window in a single query
+
+    Returns:
+        dict: Number of dogs booked keyed by (date, time_slot)
+    """
+    return SlotOccupancy.booked_for_range(start_date, end_date)
+
+
+async def aload_occupancy(start_date, end_date):
+    """Async version of load_occupancy"""
+    return await SlotOccupancy.abooked_for_range(start_date, end_date)
+
+
+def resolve_window(start_date, days_ahead):
+    """Get the (start, end) dates of a window, starting tomorrow when start_date is None"""
+    if start_date is None:
+        start_date = date.today() + timedelta(days=1)
+    return start_date, start_date + timedelta(days=days_ahead - 1)
+
+
+def get_capacity_matrix(days_ahead=180, start_date=None):
+    """
+    Get remaining capacity for every slot in a date window
+
+    Served from the shared availability grid when possible. Inside a
+    transaction it reads the database, so uncommitted changes are seen.
+
+    Args:
+        days_ahead: Number of days in the window
+        start_date: First date of the window (defaults to tomorrow)
+
+    Returns:
+        list: One (date, capacities) pair per day, where capacities holds the
+        remaining spots for each slot in slot catalogue order, or None
+        when the slot is blocked
+    """
+    start_date, end_date = resolve_window(start_date, days_ahead)
+
+    if not transaction.get_connection().in_atomic_block:
+        grid_result = availability_grid.read_matrix(start_date, days_ahead)
+        if grid_result:
+            return grid_result[1]
+
+    return load_capacity_matrix(days_ahead, start_date)
+
+
+async def aget_capacity_matrix(days_ahead=180, start_date=None):
+    """Async version of get_capacity_matrix"""
+    start_date, end_date = resolve_window(start_date, days_ahead)
+
+    grid_result = await availability_grid.aread_matrix(start_date, days_ahead)
+    if grid_result:
+        return grid_result[1]
+
+    return await aload_capacity_matrix(days_ahead, start_date)
+
+
+def load_capacity_matrix(days_ahead=180, start_date=None):
+    """Compute the capacity matrix from the database - one query each for settings, overrides, rules and occupancy"""
+    start_date, end_date = resolve_window(start_date, days_ahead)
+
+    return build_capacity_matrix(
+        start_date,
+        days_ahead,
+        BookingSettings.get_settings(),
+        load_slot_overrides(start_date, end_date),
+        load_occupancy(start_date, end_date),
+        load_rules(),
+    )
+
+
+async def aload_capacity_matrix(days_ahead=180, start_date=None):
+    """Async version of load_capacity_matrix, using the async ORM"""
+    start_date, end_date = resolve_window(start_date, days_ahead)
+
+    return build_capacity_matrix(
+        start_date,
+        days_ahead,
+        await BookingSettings.aget_settings(),
+        await aload_slot_overrides(start_date, end_date),
+        await aload_occupancy(start_date, end_date),
+        await aload_rules(),
+    )
+
+
+def build_capacity_matrix(start_date, days_ahead, booking_settings, overrides, occupancy, rules):
+    """Assemble the capacity matrix from already loaded state - see get_capacity_matrix"""
+    matrix = []
+
+    for i in range(days_ahead):
+        check_date = start_date + timedelta(days=i)
+        capacities = [
+            remaining_capacity(check_date, slot.id, booking_settings, overrides, occupancy, rules)
+            for slot in slot_catalogue.SLOTS
+        ]
+        matrix.append((check_date, capacities))
+
+    return matrix
+
+
+def slot_capacity(check_date, time_slot, overrides, rules):
+    """
+    Get the capacity of one slot from already loaded overrides and rules
+
+    A per-date override wins over the recurring rules, so an override can
+    reopen a slot that a rule closes.
+
+    Returns:
+        int: Maximum dogs for the slot, or None when it is closed or unknown
+    """
+    slot = slot_catalogue.get_slot(time_slot)
+    if slot is None:
+        return None
+
+    override = overrides.get((check_date, time_slot))
+    if override is None:
+        if rules.is_closed(check_date, time_slot):
+            return None
+        return slot.default_capacity
+
+    is_available, capacity = override
+    if not is_available:
+        return None
+    return slot.default_capacity if capacity is None else capacity
+
+
+def remaining_capacity(check_date, time_slot, booking_settings, overrides, occupancy, rules):
+    """
+    Get the remaining capacity of one slot from already loaded state
+
+    Returns:
+        int: Spots remaining, or None when the slot is blocked
+    """
+    # Filter out weekends and slots switched off in settings (e.g. the evening slot)
+    if not booking_settings.allow_weekend_bookings and check_date.weekday() >= 5:
+        return None
+    slot = slot_catalogue.get_slot(time_slot)
+    if slot is None or not slot_catalogue.is_offered(slot, booking_settings):
+        return None
+
+    max_capacity = slot_capacity(check_date, time_slot, overrides, rules)
+    if max_capacity is None:
+        return None
+
+    return max_capacity - occupancy.get((check_date, time_slot), 0)
+
+
+def get_slot_capacities(slots):
+    """
+    Get the remaining capacity of specific slots, as shown on the calendar
+
+    Args:
+        slots: Iterable of (date, time_slot) pairs
+
+    Returns:
+        dict: Spots remaining (or None when blocked) keyed by (date, time_slot)
+    """
+    slots = set(slots)
+    if not slots:
+        return {}
+
+    booking_settings = BookingSettings.get_settings()
+    overrides = SlotOverride.for_slots(slots)
+    occupancy = SlotOccupancy.booked_for_slots(slots)
+    rules = load_rules()
+
+    return {
+        (check_date, time_slot): remaining_capacity(
+            check_date, time_slot, booking_settings, overrides, occupancy, rules
+        )
+        for check_date, time_slot in slots
+    }
+
+
+def closed_dates(start_date, end_date, overrides, rules):
+    """
+    List the dates in a window on which every slot is closed, from already loaded state
+
+    Only explicit overrides and recurring rules count - weekends and slots
+    switched off in the booking settings are left to the calendar.
+    """
+    dates = []
+    check_date = start_date
+    while check_date <= end_date:
+        if all(slot_capacity(check_date, slot.id, overrides, rules) is None for slot in slot_catalogue.SLOTS):
+            dates.append(check_date)
+        check_date += timedelta(days=1)
+    return dates
+
+
+async def aget_closed_dates(start_date=None, end_date=None):
+    """
+    List the dates from start_date (default today) to the end of the booking
+    horizon on which every slot is closed - one query each for overrides and rules
+    """
+    start_date = start_date or date.today()
+    end_date = end_date or date.today() + timedelta(days=BOOKING_HORIZON_DAYS)
+    return closed_dates(
+        start_date,
+        end_date,
+        await aload_slot_overrides(start_date, end_date),
+        await aload_rules(),
+    )
+
+
+def get_date_closure(check_date):
+    """
+    Explain why a date is closed for walks
+
+    Returns:
+        str: The slot manager notes or rule names closing every slot, or
+        None if any slot is open on the date
+    """
+    overrides = load_slot_overrides(check_date, check_date)
+    rules = load_rules()
+    if not closed_dates(check_date, check_date, overrides, rules):
+        return None
+
+    reasons = []
+    if overrides:
+        notes = GroupWalkSlotManager.objects.filter(date=check_date).values_list('notes', flat=True).first()
+        reasons.append(notes or 'Date marked unavailable')
+
+    closed_by_rules = rules.closed_slots(check_date)
+    for slot in slot_catalogue.SLOTS:
+        if (check_date, slot.id) not in overrides and closed_by_rules[slot.id] not in reasons:
+            reasons.append(closed_by_rules[slot.id])
+    return '; '.join(reasons)
+
+
+def get_available_slots(days_ahead=180, required_dogs=1, start_date=None):
+    """
+    Get all available slots in a date window that can accommodate required_dogs
+
+    Args:
+        days_ahead: Number of days in the window
+        required_dogs: Number of dogs the slot must have room for
+        start_date: First date of the window (defaults to tomorrow)
+
+    Returns:
+        list: One dict per bookable slot, ordered by date then time slot
+    """
+    return available_slots_from_matrix(get_capacity_matrix(days_ahead, start_date), required_dogs)
+
+
+async def aget_available_slots(days_ahead=180, required_dogs=1, start_date=None):
+    """Async version of get_available_slots"""
+    return available_slots_from_matrix(await aget_capacity_matrix(days_ahead, start_date), required_dogs)
+
+
+def find_nearest_slots(target_date, num_dogs=1, time_slot=None, limit=5, max_distance=14):
+    """
+    Find the bookable slots closest to a date and time slot
+
+    Capacities for the whole max_distance window either side of target_date
+    (never before tomorrow) are read up front in one go - from the shared grid
+    when possible, otherwise with one set of queries. The ranking then walks
+    outward one day at a time over that matrix and stops as soon as a full
+    ring of days has produced limit slots, since every further day ranks lower.
+    Stopping early saves ranking work, not reads.
+
+    Args:
+        target_date: Date to search around (e.g. a cancelled booking's date)
+        num_dogs: Number of dogs the slot must have room for
+        time_slot: Original time slot - excluded on target_date and used to rank
+        limit: Number of slots to return
+        max_distance: Furthest number of days from target_date to consider
+
+    Returns:
+        list: Up to limit slots in the get_available_slots format, closest first
+        (fewest days away, then nearest time of day, then later date)
+    """
+    first_date = max(target_date - timedelta(days=max_distance), date.today() + timedelta(days=1))
+    last_date = min(
+        target_date + timedelta(days=max_distance),
+        date.today() + timedelta(days=BOOKING_HORIZON_DAYS),
+    )
+    if first_date > last_date:
+        return []
+
+    capacities_by_date = dict(get_capacity_matrix((last_date - first_date).days + 1, first_date))
+    target_index = slot_catalogue.SLOT_POSITIONS.get(time_slot, 0)
+    no_capacity = [None] * len(slot_catalogue.SLOTS)
+
+    candidates = []
+    for distance in range(max_distance + 1):
+        ring = [target_date + timedelta(days=distance)]
+        if distance:
+            ring.append(target_date - timedelta(days=distance))
+
+        for check_date in ring:
+            for index, slot in enumerate(slot_catalogue.SLOTS):
+                if check_date == target_date and slot.id == time_slot:
+                    continue
+                available_spots = capacities_by_date.get(check_date, no_capacity)[index]
+                if available_spots is not None and available_spots >= num_dogs:
+                    rank = (distance, abs(index - target_index), check_date < target_date)
+                    candidates.append((rank, {
+                        'date': check_date,
+                        'time_slot': slot.id,
+                        'time_display': slot.label,
+                        'available_spots': available_spots,
+                        'can_book': True,
+                        'is_full': False,
+                    }))
+
+        # Anything further out ranks below what we already have, so skip ranking it
+        if len(candidates) >= limit:
+            break
+
+    candidates.sort(key=lambda candidate: candidate[0])
+    return [slot for rank, slot in candidates[:limit]]
+
+
+def available_slots_from_matrix(matrix, required_dogs):
+    """List the slots in a capacity matrix that can accommodate required_dogs"""
+    available_slots = []
+
+    for check_date, capacities in matrix:
+        for slot, available_spots in zip(slot_catalogue.SLOTS, capacities):
+            # Only include if can accommodate the required number of dogs
+            if available_spots is not None and available_spots >= required_dogs:
+                available_slots.append({
+                    'date': check_date,
+                    'time_slot': slot.id,
+                    'time_display': slot.label,
+                    'available_spots': available_spots,
+                    'can_book': True,
+                    'is_full': False,
+                })
+
+    return available_slots
+
+
+def check_slots(slots, num_dogs=1, booking_settings=None):
+    """
+    Check whether each (date, time_slot) pair can take num_dogs
+
+    Runs one slot override, one rules and one occupancy query however many
+    slots are checked, so a whole multi-booking cart can be validated at once.
+    Capacity comes from remaining_capacity, so slots the booking settings
+    switch off (weekends, the evening slot) are never bookable.
+
+    Args:
+        slots: Iterable of (date, time_slot) pairs
+        num_dogs: Number of dogs each slot must have room for
+        booking_settings: BookingSettings already read by the caller (read here if None)
+
+    Returns:
+        list: One result dict per pair, in the order given
+    """
+    slots = list(slots)
+    future_slots = get_future_slots(slots)
+
+    overrides = {}
+    occupancy = {}
+    rules = NO_RULES
+    if future_slots:
+        booking_settings = booking_settings or BookingSettings.get_settings()
+        overrides = SlotOverride.for_slots(future_slots)
+        occupancy = SlotOccupancy.booked_for_slots(future_slots)
+        rules = load_rules()
+
+    return build_slot_checks(slots, num_dogs, booking_settings, overrides, occupancy, rules)
+
+
+async def acheck_slots(slots, num_dogs=1, booking_settings=None):
+    """Async version of check_slots"""
+    slots = list(slots)
+    future_slots = get_future_slots(slots)
+
+    overrides = {}
+    occupancy = {}
+    rules = NO_RULES
+    if future_slots:
+        booking_settings = booking_settings or await BookingSettings.aget_settings()
+        overrides = await SlotOverride.afor_slots(future_slots)
+        occupancy = await SlotOccupancy.abooked_for_slots(future_slots)
+        rules = await aload_rules()
+
+    return build_slot_checks(slots, num_dogs, booking_settings, overrides, occupancy, rules)
+
+
+def get_future_slots(slots):
+    """Drop pairs for today or earlier - those are never bookable"""
+    today = date.today()
+    return [(check_date, time_slot) for check_date, time_slot in slots if check_date > today]
+
+
+def build_slot_checks(slots, num_dogs, booking_settings, overrides, occupancy, rules):
+    """Build the check_slots results from already loaded state"""
+    today = date.today()
+    results = []
+
+    for check_date, time_slot in slots:
+        result = {
+            'date': check_date.isoformat(),
+            'time_slot': time_slot,
+            'requested_dogs': num_dogs,
+        }
+
+        # Validate date is not in the past
+        if check_date <= today:
+            result.update({
+                'available_spots': 0,
+                'can_book': False,
+                'message': 'Cannot book walks for past dates'
+            })
+            results.append(result)
+            continue
+
+        available_spots = remaining_capacity(check_date, time_slot, booking_settings, overrides, occupancy, rules)
+        if available_spots is None:
+            result.update({
+                'available_spots': 0,
+                'can_book': False,
+                'message': 'This time slot is not available on this date'
+            })
+            results.append(result)
+            continue
+
+        max_capacity = slot_capacity(check_date, time_slot, overrides, rules)
+        can_book = available_spots >= num_dogs
+
+        result.update({
+            'available_spots': available_spots,
+            'can_book': can_book,
+            'max_capacity': max_capacity,
+            'message': f'{"Available" if can_book else "Not enough space"} - {available_spots} spots remaining'
+        })
+        results.append(result)
+
+    return results
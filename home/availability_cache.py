@@ -0,0 +1,251 @@
+"""
+Versioned cache for the public availability endpoints
+
+Every cached payload is keyed on a global availability version, held in the
+AvailabilityVersion row. Writes to GroupWalk, SlotOverride and BookingSettings
+(and slot manager deletes) bump the version once their transaction commits, so
+old entries are never read again and simply expire.
+"""
+
+import logging
+import time
+from asgiref.local import Local
+from collections import Counter
+from datetime import date, datetime, timezone
+from django.core.cache import cache
+from django.db import transaction
+
+from . import availability_grid
+
+logger = logging.getLogger(__name__)
+
+MODIFIED_KEY = 'availability:modified'
+CHANGES_KEY = 'availability:changes:v{}'
+
+# Hit/miss counters for this worker process - kept in memory so a cache read
+# never turns into a write
+STATS = Counter({'hits': 0, 'misses': 0})
+
+# Entries are unreachable once the version moves on, so this only bounds storage
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long the slots changed by each version are kept for the change feed
+CHANGES_TIMEOUT = 60 * 15
+
+# Recorded instead of a slot list when a change can affect every slot
+ALL_SLOTS = '*'
+
+# The PendingBump for each connection's open transaction - a Local, like the
+# connections themselves, so threads and async tasks never share one
+_pending_bumps = Local()
+
+
+def get_version():
+    """Get the current availability version"""
+    from .models import AvailabilityVersion
+
+    return AvailabilityVersion.current()
+
+
+async def aget_version():
+    """Async version of get_version"""
+    from .models import AvailabilityVersion
+
+    return await AvailabilityVersion.acurrent()
+
+
+def bump_version(changes=None):
+    """
+    Move to a new availability version, invalidating every cached payload
+
+    Args:
+        changes: (date, time_slot) pairs the write changed, recorded for the
+            change feed - None means any slot may have changed
+    """
+    from .models import AvailabilityVersion
+
+    version = AvailabilityVersion.increment()
+    cache.set(MODIFIED_KEY, time.time(), None)
+
+    if changes is None:
+        recorded = ALL_SLOTS
+    else:
+        recorded = sorted((check_date.isoformat(), time_slot) for check_date, time_slot in changes)
+    cache.set(CHANGES_KEY.format(version), recorded, CHANGES_TIMEOUT)
+
+    availability_grid.apply_changes(version, changes)
+
+    logger.info(f"Availability version bumped to {version}")
+    return version
+
+
+def get_changes(version):
+    """
+    Get the slots changed by a version
+
+    Returns:
+        list: (date, time_slot) pairs, or None if every slot may have changed
+        or the record has expired
+    """
+    recorded = cache.get(CHANGES_KEY.format(version))
+    if recorded is None or recorded == ALL_SLOTS:
+        return None
+    return [(date.fromisoformat(check_date), time_slot) for check_date, time_slot in recorded]
+
+
+class PendingBump:
+    """on_commit callback that bumps the version once for everything a transaction changed"""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.changes = set()
+        self.all_slots = False
+        self.done = False
+
+    def add(self, changes):
+        if changes is None:
+            self.all_slots = True
+        else:
+            self.changes.update(changes)
+
+    def __call__(self):
+        # Every write registers this, and the first one to run bumps for all of them
+        if self.done:
+            return
+        self.done = True
+        if getattr(_pending_bumps, self.alias, None) is self:
+            delattr(_pending_bumps, self.alias)
+        bump_version(None if self.all_slots else self.changes)
+
+
+def schedule_version_bump(changes=None):
+    """
+    Bump the version once the current transaction commits (immediately in autocommit)
+
+    Args:
+        changes: (date, time_slot) pairs the write changed - None means any slot
+    """
+    connection = transaction.get_connection()
+
+    if not connection.in_atomic_block:
+        discard_pending_bump(connection.alias)
+        bump_version(changes)
+        return
+
+    # One bump per transaction is enough, however many rows it writes. Each
+    # write still registers the callback, so rolling back a savepoint can't
+    # drop the bump for writes made outside it.
+    pending = getattr(_pending_bumps, connection.alias, None)
+    if pending is None or pending.done:
+        pending = PendingBump(connection.alias)
+        setattr(_pending_bumps, connection.alias, pending)
+    pending.add(changes)
+    transaction.on_commit(pending)
+
+
+def discard_pending_bump(alias):
+    """Forget the changes waiting on a connection's transaction after it rolls back"""
+    if hasattr(_pending_bumps, alias):
+        delattr(_pending_bumps, alias)
+
+
+def _cache_key(name, version, params):
+    # Windows are relative to today, so the date is part of the key as well
+    return 'availability:{}:v{}:{}:{}'.format(
+        name,
+        version,
+        date.today().isoformat(),
+        ':'.join(str(param) for param in params),
+    )
+
+
+def etag_for(name, params):
+    """Get a strong ETag for an endpoint payload at the current version"""
+    return etag_at(name, get_version(), params)
+
+
+def etag_at(name, version, params):
+    """Get a strong ETag for an endpoint payload at a given version"""
+    return '"{}"'.format(_cache_key(name, version, params).replace('"', ''))
+
+
+async def aetag_for(name, params):
+    """Async version of etag_for"""
+    return etag_at(name, await aget_version(), params)
+
+
+def last_modified():
+    """
+    Get when availability last changed
+
+    Never earlier than the start of today, because payloads roll forward daily
+    even when nothing is written.
+    """
+    start_of_today = datetime.combine(date.today(), datetime.min.time(), tzinfo=timezone.utc)
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        return start_of_today
+    return max(datetime.fromtimestamp(modified, tz=timezone.utc), start_of_today)
+
+
+async def alast_modified():
+    """Async version of last_modified - served from the shared grid when it is available"""
+    start_of_today = datetime.combine(date.today(), datetime.min.time(), tzinfo=timezone.utc)
+    grid_modified = availability_grid.last_modified()
+    if grid_modified is not None:
+        return max(grid_modified, start_of_today)
+
+    modified = await cache.aget(MODIFIED_KEY)
+    if modified is None:
+        return start_of_today
+    return max(datetime.fromtimestamp(modified, tz=timezone.utc), start_of_today)
+
+
+def get_or_compute(name, params, compute):
+    """
+    Return the cached payload for name/params at the current version, computing it on a miss
+
+    Args:
+        name: Endpoint name used in the cache key
+        params: Tuple of request parameters that change the payload
+        compute: Callable returning a JSON-serialisable payload
+
+    Returns:
+        The payload, from cache or freshly computed
+    """
+    key = _cache_key(name, get_version(), params)
+
+    payload = cache.get(key)
+    if payload is not None:
+        STATS['hits'] += 1
+        return payload
+
+    STATS['misses'] += 1
+    payload = compute()
+    cache.set(key, payload, CACHE_TIMEOUT)
+    return payload
+
+
+async def aget_or_compute(name, params, compute):
+    """Async version of get_or_compute - compute is an async callable"""
+    key = _cache_key(name, await aget_version(), params)
+
+    payload = await cache.aget(key)
+    if payload is not None:
+        STATS['hits'] += 1
+        return payload
+
+    STATS['misses'] += 1
+    payload = await compute()
+    await cache.aset(key, payload, CACHE_TIMEOUT)
+    return payload
+
+
+def get_stats():
+    """Get this process's cache counters and the current version for the health check"""
+    return {**STATS, 'version': get_version()}
+
+
+async def aget_stats():
+    """Async version of get_stats"""
+    return {**STATS, 'version': await aget_version()}
@@ -0,0 +1,177 @@
+"""
+Server-Sent Events feed of availability changes for the booking calendar
+
+One broadcaster per process watches the availability version. When it moves,
+the slots recorded for the new versions are turned into compact deltas
+(date, time slot, remaining capacity) once and fanned out to every open
+stream. While any stream is open, each process reads the version row from
+the database once every AVAILABILITY_FEED_POLL_INTERVAL seconds, however many
+booking pages are open, instead of each client polling the slot check endpoint.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import date
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import availability_cache
+from .availability import get_slot_capacities
+
+logger = logging.getLogger(__name__)
+
+# Seconds between availability version checks, unless AVAILABILITY_FEED_POLL_INTERVAL is set
+POLL_INTERVAL = 1
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Streams close after this many seconds and the browser reconnects with Last-Event-ID
+STREAM_LIFETIME = 60 * 5
+
+# Reconnect delay sent to the browser, in milliseconds
+RETRY_MS = 3000
+
+# Beyond this many missed versions the client is told to reload instead
+MAX_CATCH_UP_VERSIONS = 50
+
+
+def build_event(from_version, to_version):
+    """
+    Build the event covering every version after from_version up to to_version
+
+    Args:
+        from_version: Last version the client has seen
+        to_version: Current availability version
+
+    Returns:
+        dict: version plus changes as [date, time_slot, remaining] lists
+        (remaining is None when the slot is blocked), or version plus
+        reset=True when the client has to reload the whole calendar
+    """
+    reset = {'version': to_version, 'reset': True}
+    if to_version < from_version or to_version - from_version > MAX_CATCH_UP_VERSIONS:
+        return reset
+
+    slots = set()
+    for version in range(from_version + 1, to_version + 1):
+        changes = availability_cache.get_changes(version)
+        if changes is None:
+            return reset
+        slots.update(changes)
+
+    # Past dates are no longer on the calendar
+    today = date.today()
+    capacities = get_slot_capacities(
+        (check_date, time_slot) for check_date, time_slot in slots if check_date > today
+    )
+
+    return {
+        'version': to_version,
+        'changes': [
+            [check_date.isoformat(), time_slot, remaining]
+            for (check_date, time_slot), remaining in sorted(capacities.items())
+        ],
+    }
+
+
+def format_event(event, event_type=None):
+    """Format an event dict as an SSE message"""
+    if event_type is None:
+        event_type = 'reset' if event.get('reset') else 'availability'
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        event['version'],
+        event_type,
+        json.dumps(event, separators=(',', ':')),
+    )
+
+
+class AvailabilityBroadcaster:
+    """Polls the availability version for this process and fans events out to subscribers"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.version = None
+        self.task = None
+
+    def subscribe(self):
+        """Register a stream and start polling if nothing else is listening"""
+        queue = asyncio.Queue()
+        self.subscribers.add(queue)
+
+        # The task belongs to the loop that started it, so restart it on a new loop
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def run(self):
+        try:
+            self.version = await sync_to_async(availability_cache.get_version)()
+            poll_interval = getattr(settings, 'AVAILABILITY_FEED_POLL_INTERVAL', POLL_INTERVAL)
+
+            while self.subscribers:
+                await asyncio.sleep(poll_interval)
+                version = await sync_to_async(availability_cache.get_version)()
+                if version == self.version:
+                    continue
+
+                event = await sync_to_async(build_event)(self.version, version)
+                self.version = version
+                for queue in self.subscribers:
+                    queue.put_nowait(event)
+        except Exception as e:
+            logger.error(f"Availability broadcaster stopped: {str(e)}")
+            # Closing the streams makes browsers reconnect and restart the broadcaster
+            for queue in self.subscribers:
+                queue.put_nowait(None)
+
+
+broadcaster = AvailabilityBroadcaster()
+
+
+async def stream_events(last_event_id=None):
+    """
+    Async generator of SSE messages for one client
+
+    Args:
+        last_event_id: Version from the browser's Last-Event-ID header, used
+            to send whatever changed while it was disconnected
+    """
+    queue = broadcaster.subscribe()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_LIFETIME
+
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+
+        current = await sync_to_async(availability_cache.get_version)()
+        if last_event_id is not None and last_event_id != current:
+            yield format_event(await sync_to_async(build_event)(last_event_id, current))
+        else:
+            yield format_event({'version': current}, 'ready')
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(HEARTBEAT_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+
+            if event is None:
+                break
+            if event['version'] == current:
+                continue
+
+            current = event['version']
+            yield format_event(event)
+    finally:
+        broadcaster.unsubscribe(queue)
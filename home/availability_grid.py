@@ -0,0 +1,354 @@
+"""
+Memory-mapped availability grid shared by every worker on a machine
+
+The grid holds one byte per date and time slot for the whole booking horizon:
+the low seven bits are the remaining capacity and the high bit marks a blocked
+slot. It lives in a file that each worker maps once, so readers build the
+calendar straight from shared memory without touching the database.
+
+Writers hold an exclusive flock while they update cells, and bracket each
+update with a sequence counter in the header (odd while writing) so readers can
+detect a torn read and retry. Every committed availability change updates the
+cells it touched; settings changes, day rollover and missed versions trigger a
+full rebuild.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import time
+from datetime import date, datetime, timedelta, timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+try:
+    import fcntl
+    GRID_SUPPORTED = True
+except ImportError:
+    # No flock (e.g. Windows) - readers fall back to the database
+    GRID_SUPPORTED = False
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CCAG'
+LAYOUT_VERSION = 1
+
+# magic, layout version, slots per day, sequence, availability version, base date ordinal, days,
+# last write (unix seconds)
+HEADER = struct.Struct('<4sHHIQIII')
+HEADER_SIZE = 32
+
+BLOCKED = 0x80
+CAPACITY_MASK = 0x7F
+
+# Seconds between checks that this machine's grid has seen the latest availability version
+VERSION_CHECK_INTERVAL = 1
+
+# Torn reads to retry before giving up and using the database
+MAX_READ_ATTEMPTS = 10
+
+
+def encode_cell(remaining):
+    """Pack remaining capacity (None when blocked) into one byte"""
+    if remaining is None:
+        return BLOCKED
+    return max(0, min(remaining, CAPACITY_MASK))
+
+
+def decode_cell(cell):
+    """Unpack one byte into remaining capacity, or None when blocked"""
+    if cell & BLOCKED:
+        return None
+    return cell & CAPACITY_MASK
+
+
+class AvailabilityGrid:
+    """Remaining capacity for every date and slot in the booking horizon, in a shared mmap"""
+
+    def __init__(self, path, slots, days):
+        self.path = path
+        self.slots = list(slots)
+        self.days = days
+        self.size = HEADER_SIZE + days * len(self.slots)
+        self.last_version_check = 0
+
+        # Only this app's user can read or write the grid and its lock
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self.buffer = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        self.lock_fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+
+    # Reading
+
+    def read_header(self):
+        magic, layout, slot_count, sequence, version, base_ordinal, days, modified = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or layout != LAYOUT_VERSION or slot_count != len(self.slots) or not base_ordinal:
+            return None
+        return {
+            'sequence': sequence,
+            'version': version,
+            'base_date': date.fromordinal(base_ordinal),
+            'days': days,
+            'modified': modified,
+        }
+
+    def read(self, start_date, days_ahead):
+        """
+        Read a window of the grid without touching the database
+
+        Returns:
+            tuple: (version, matrix) in the get_capacity_matrix format, or None
+            when the grid is empty, being rewritten, or doesn't cover the window
+        """
+        slot_count = len(self.slots)
+
+        for _ in range(MAX_READ_ATTEMPTS):
+            header = self.read_header()
+            if header is None:
+                return None
+            if header['sequence'] % 2:
+                # A writer is mid-update
+                time.sleep(0)
+                continue
+
+            offset = (start_date - header['base_date']).days
+            if offset < 0 or offset + days_ahead > header['days']:
+                return None
+
+            first_cell = HEADER_SIZE + offset * slot_count
+            cells = self.buffer[first_cell:first_cell + days_ahead * slot_count]
+
+            # Retry if a writer started while we were copying
+            if HEADER.unpack_from(self.buffer, 0)[3] != header['sequence']:
+                continue
+
+            matrix = [
+                (
+                    start_date + timedelta(days=i),
+                    [decode_cell(cell) for cell in cells[i * slot_count:(i + 1) * slot_count]],
+                )
+                for i in range(days_ahead)
+            ]
+            return header['version'], matrix
+
+        return None
+
+    def version(self):
+        """Availability version the grid reflects, or None if it has not been built"""
+        header = self.read_header()
+        return header['version'] if header else None
+
+    # Writing
+
+    def locked(self):
+        return _FileLock(self.lock_fd)
+
+    def begin_write(self):
+        sequence = HEADER.unpack_from(self.buffer, 0)[3]
+        struct.pack_into('<I', self.buffer, 8, sequence + 1)
+        return sequence + 1
+
+    def end_write(self, sequence, version, base_date):
+        HEADER.pack_into(
+            self.buffer, 0,
+            MAGIC, LAYOUT_VERSION, len(self.slots), sequence + 1, version, base_date.toordinal(), self.days,
+            int(time.time())
+        )
+
+    def rebuild(self, version=None):
+        """Recompute every cell from the database"""
+        from .availability import load_capacity_matrix
+        from .availability_cache import get_version
+
+        with self.locked():
+            if version is None:
+                version = get_version()
+            base_date = date.today() + timedelta(days=1)
+            matrix = load_capacity_matrix(days_ahead=self.days, start_date=base_date)
+
+            sequence = self.begin_write()
+            self.buffer[HEADER_SIZE:self.size] = bytes(
+                encode_cell(remaining) for check_date, capacities in matrix for remaining in capacities
+            )
+            self.end_write(sequence, version, base_date)
+
+        logger.info(f"Availability grid rebuilt at version {version}")
+
+    def apply(self, version, changes):
+        """
+        Update the cells for the slots a committed version changed
+
+        Falls back to a full rebuild when every slot may have changed, the
+        grid has missed an earlier version, or the day has rolled over.
+        """
+        from .availability import get_slot_capacities
+
+        with self.locked():
+            header = self.read_header()
+            today = date.today()
+            if (
+                changes is None
+                or header is None
+                or header['version'] < version - 1
+                or header['base_date'] != today + timedelta(days=1)
+            ):
+                rebuild = True
+            else:
+                rebuild = False
+                slot_index = {time_slot: index for index, time_slot in enumerate(self.slots)}
+                in_grid = [
+                    (check_date, time_slot) for check_date, time_slot in changes
+                    if 0 <= (check_date - header['base_date']).days < header['days'] and time_slot in slot_index
+                ]
+
+                # Read inside the lock so a later commit can never be overwritten by older data
+                capacities = get_slot_capacities(in_grid)
+
+                sequence = self.begin_write()
+                for (check_date, time_slot), remaining in capacities.items():
+                    cell = HEADER_SIZE + (check_date - header['base_date']).days * len(self.slots) + slot_index[time_slot]
+                    self.buffer[cell] = encode_cell(remaining)
+                self.end_write(sequence, max(version, header['version']), header['base_date'])
+
+        if rebuild:
+            self.rebuild(version)
+
+    def is_due_version_check(self):
+        """Whether the once-a-second check against the global version is due"""
+        now = time.monotonic()
+        if now - self.last_version_check < VERSION_CHECK_INTERVAL:
+            return False
+        self.last_version_check = now
+        return True
+
+    def refresh_if_stale(self):
+        """Rebuild if the global version has moved on without this grid, e.g. from another machine"""
+        from .availability_cache import get_version
+
+        version = get_version()
+        grid_version = self.version()
+        if grid_version is None or grid_version < version:
+            self.rebuild(version)
+
+
+class _FileLock:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __enter__(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+_grid = None
+
+
+def get_grid():
+    """Get this process's mapping of the grid, or None if it is unavailable"""
+    global _grid
+    if _grid is None and GRID_SUPPORTED:
+        from .availability import BOOKING_HORIZON_DAYS
+        from .slot_catalogue import SLOT_IDS
+
+        try:
+            _grid = AvailabilityGrid(
+                settings.AVAILABILITY_GRID_PATH,
+                SLOT_IDS,
+                BOOKING_HORIZON_DAYS,
+            )
+        except OSError as e:
+            logger.error(f"Availability grid unavailable: {str(e)}")
+            return None
+    return _grid
+
+
+def read_matrix(start_date, days_ahead):
+    """
+    Read a capacity matrix window from the grid, rebuilding it if needed
+
+    Returns:
+        tuple: (version, matrix), or None if the grid can't be used
+    """
+    grid = get_grid()
+    if grid is None:
+        return None
+
+    try:
+        if grid.is_due_version_check():
+            grid.refresh_if_stale()
+        result = grid.read(start_date, days_ahead)
+        if result is None:
+            # Empty, or the day rolled over - rebuild once and read again
+            grid.rebuild()
+            result = grid.read(start_date, days_ahead)
+        return result
+    except Exception as e:
+        logger.error(f"Error reading availability grid: {str(e)}")
+        return None
+
+
+async def aread_matrix(start_date, days_ahead):
+    """Async version of read_matrix - only leaves the event loop when a check or rebuild is due"""
+    grid = get_grid()
+    if grid is None:
+        return None
+
+    try:
+        if grid.is_due_version_check():
+            await sync_to_async(grid.refresh_if_stale)()
+        result = grid.read(start_date, days_ahead)
+        if result is None:
+            await sync_to_async(grid.rebuild)()
+            result = grid.read(start_date, days_ahead)
+        return result
+    except Exception as e:
+        logger.error(f"Error reading availability grid: {str(e)}")
+        return None
+
+
+async def acurrent_version():
+    """
+    Version of the data the grid serves, or None if it is unavailable
+
+    Runs the same version check as aread_matrix first, so an ETag built from
+    it never lags behind the calendar the grid would serve.
+    """
+    grid = get_grid()
+    if grid is None:
+        return None
+
+    try:
+        if grid.is_due_version_check():
+            await sync_to_async(grid.refresh_if_stale)()
+        return grid.version()
+    except Exception as e:
+        logger.error(f"Error reading availability grid version: {str(e)}")
+        return None
+
+
+def last_modified():
+    """When the grid was last written, or None if it is unavailable"""
+    grid = get_grid()
+    header = grid.read_header() if grid else None
+    if header is None:
+        return None
+    return datetime.fromtimestamp(header['modified'], tz=timezone.utc)
+
+
+def apply_changes(version, changes):
+    """Update this machine's grid after a version bump - never raises"""
+    grid = get_grid()
+    if grid is None:
+        return
+    try:
+        grid.apply(version, changes)
+    except Exception as e:
+        logger.error(f"Error updating availability grid: {str(e)}")
@@ -0,0 +1,135 @@
+"""
+Recurring availability rules compiled into an in-memory closure table
+
+Standing closures ("closed every Monday", "no evening walks in December") are
+stored as a handful of AvailabilityRule rows instead of a slot manager row per
+date. They are compiled once per load into a (month, weekday) table of closed
+slots, plus a short list of date-bounded tables for rules with a start or end
+date, so checking a date is a dictionary lookup rather than a query.
+
+Explicit per-date SlotOverride rows always win over these rules.
+"""
+
+from datetime import date
+from django.db.models import Q
+
+from . import slot_catalogue
+
+ALL_WEEKDAYS = frozenset(range(7))
+ALL_MONTHS = frozenset(range(1, 13))
+
+
+class ClosureRules:
+    """Compiled recurring closures - answers which slots a rule closes on a date"""
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        # (month, weekday) -> {time_slot: rule name} for rules without date bounds
+        self.table = {}
+        # (start_date, end_date, table) for rules limited to a date range
+        self.bounded = []
+        self.memo = {}
+
+        for rule in self.rules:
+            if rule.start_date is None and rule.end_date is None:
+                self.add_to_table(self.table, rule)
+            else:
+                table = {}
+                self.add_to_table(table, rule)
+                self.bounded.append((rule.start_date or date.min, rule.end_date or date.max, table))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    @staticmethod
+    def add_to_table(table, rule):
+        for month in rule.month_set:
+            for weekday in rule.weekday_set:
+                closed = table.setdefault((month, weekday), {})
+                for time_slot in rule.slot_ids:
+                    closed.setdefault(time_slot, rule.name)
+
+    def closed_slots(self, check_date):
+        """
+        Get the slots closed by a rule on a date
+
+        Returns:
+            dict: Name of the first matching rule keyed by time slot
+        """
+        if not self.rules:
+            return {}
+
+        closed = self.memo.get(check_date)
+        if closed is None:
+            key = (check_date.month, check_date.weekday())
+            closed = self.table.get(key, {})
+            for start_date, end_date, table in self.bounded:
+                if start_date <= check_date <= end_date and key in table:
+                    closed = {**table[key], **closed}
+            self.memo[check_date] = closed
+        return closed
+
+    def is_closed(self, check_date, time_slot):
+        """Whether a rule closes a slot on a date"""
+        return time_slot in self.closed_slots(check_date)
+
+    def closed_q(self, time_slot, field='date'):
+        """
+        Build a filter matching the dates on which rules close a slot
+
+        Args:
+            time_slot: Slot id
+            field: Name of the date field to filter on
+
+        Returns:
+            Q: Matches rule-closed dates, or None if no rule closes the slot
+        """
+        condition = None
+        for rule in self.rules:
+            if time_slot not in rule.slot_ids:
+                continue
+
+            limits = []
+            if rule.weekday_set != ALL_WEEKDAYS:
+                # ISO weekdays run 1 (Monday) to 7 (Sunday)
+                limits.append(Q(**{f'{field}__iso_week_day__in': [weekday + 1 for weekday in rule.weekday_set]}))
+            if rule.month_set != ALL_MONTHS:
+                limits.append(Q(**{f'{field}__month__in': sorted(rule.month_set)}))
+            if rule.start_date:
+                limits.append(Q(**{f'{field}__gte': rule.start_date}))
+            if rule.end_date:
+                limits.append(Q(**{f'{field}__lte': rule.end_date}))
+
+            if not limits:
+                # Closed on every date - an empty Q() would match nothing once OR-ed
+                # with other rules and can't be used in When()
+                return Q(**{f'{field}__isnull': False})
+
+            rule_q = limits[0]
+            for limit in limits[1:]:
+                rule_q &= limit
+            condition = rule_q if condition is None else condition | rule_q
+        return condition
+
+
+NO_RULES = ClosureRules()
+
+
+def parse_numbers(value, allowed):
+    """Parse a comma separated list of numbers, e.g. '0,6' - blank means all of allowed"""
+    if not value:
+        return allowed
+    numbers = frozenset(int(part) for part in value.split(',') if part.strip())
+    unknown = numbers - allowed
+    if unknown:
+        raise ValueError(f"Unexpected values: {', '.join(str(number) for number in sorted(unknown))}")
+    return numbers
+
+
+def parse_slots(value):
+    """Parse a comma separated list of slot ids or keys - blank means every slot"""
+    if not value:
+        return frozenset(slot_catalogue.SLOT_IDS)
+    return frozenset(
+        slot.id for slot in slot_catalogue.resolve_slots(part.strip() for part in value.split(',') if part.strip())
+    )
@@ -6,9 +6,13 @@ from googleapiclient.discovery import build
 from django.conf import settings
 from django.utils import timezone
 import logging
+from .slot_catalogue import get_slot
 
 logger = logging.getLogger(__name__)
 
+# Google allows up to 50 calls per batch request
+CALENDAR_BATCH_SIZE = 50
+
 class GoogleCalendarService:
     """Service for Google Calendar integration"""
     
@@ -45,24 +49,15 @@ class GoogleCalendarService:
             return None
         
         try:
-            # Parse time slot
-            time_slot = booking.time_slot
-            if time_slot == '09:30-11:30':
-                start_time = '09:30:00'
-                end_time = '11:30:00'
-            elif time_slot == '14:00-16:00':
-                start_time = '14:00:00'
-                end_time = '16:00:00'
-            elif time_slot == '18:00-20:00':
-                start_time = '18:00:00'
-                end_time = '20:00:00'
-            else:
-                logger.error(f"Unknown time slot: {time_slot}")
+            # Look up the slot's times
+            slot = get_slot(booking.time_slot)
+            if slot is None:
+                logger.error(f"Unknown time slot: {booking.time_slot}")
                 return None
             
             # Create datetime objects
-            start_datetime = datetime.combine(booking.booking_date, datetime.strptime(start_time, '%H:%M:%S').time())
-            end_datetime = datetime.combine(booking.booking_date, datetime.strptime(end_time, '%H:%M:%S').time())
+            start_datetime = datetime.combine(booking.booking_date, slot.start)
+            end_datetime = datetime.combine(booking.booking_date, slot.end)
             
             # Convert to timezone-aware datetimes using Django's timezone utilities
             # Make them timezone-aware for London timezone
@@ -109,7 +104,7 @@ Status: {booking.get_status_display()}''',
                         {'method': 'popup', 'minutes': 30},       # 30 minutes before
                     ],
                 },
-                'colorId': '2',  # Green color for group walks
+                'colorId': slot.calendar_color,
             }
             
             created_event = self.service.events().insert(
@@ -286,3 +281,40 @@ Status: {booking.get_status_display()}'''
         except Exception as e:
             logger.error(f"Error deleting calendar event {event_id}: {str(e)}")
             return False
+
+    def delete_events(self, event_ids):
+        """
+        Delete many calendar events using batched API requests
+
+        Args:
+            event_ids: Calendar event ids to delete
+
+        Returns:
+            set: Ids of the events that were deleted
+        """
+        if not self.service or not event_ids:
+            return set()
+
+        deleted = set()
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Error deleting calendar event {request_id}: {str(exception)}")
+            else:
+                deleted.add(request_id)
+
+        event_ids = list(event_ids)
+        for i in range(0, len(event_ids), CALENDAR_BATCH_SIZE):
+            try:
+                batch = self.service.new_batch_http_request(callback=on_response)
+                for event_id in event_ids[i:i + CALENDAR_BATCH_SIZE]:
+                    batch.add(
+                        self.service.events().delete(calendarId=self.calendar_id, eventId=event_id),
+                        request_id=event_id
+                    )
+                batch.execute()
+            except Exception as e:
+                logger.error(f"Error deleting calendar event batch: {str(e)}")
+
+        logger.info(f"Deleted {len(deleted)} of {len(event_ids)} calendar events")
+        return deleted
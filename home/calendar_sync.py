@@ -0,0 +1,156 @@
+"""
+Background Google Calendar sync
+
+Bookings queue CalendarSyncTask rows in the transaction that changes them.
+The sync_calendar command runs this worker, which claims due tasks through
+the shared WorkQueue (see home.queue) and:
+
+- deletes events with batched API requests and creates or updates the rest
+  one call each, reading every booking it needs in one query per type
+- writes new calendar_event_ids back with a conditional UPDATE, so an event
+  created for a booking that was cancelled meanwhile is queued for deletion
+
+Finished tasks are deleted.
+"""
+
+import logging
+
+from .models import CalendarSyncTask, GroupWalk, IndividualWalk
+from .queue import BATCH_SIZE, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+tasks_queue = WorkQueue(CalendarSyncTask, on_success=lambda tasks: tasks.delete())
+
+BOOKING_MODELS = {
+    'group_walk': GroupWalk,
+    'individual_walk': IndividualWalk,
+}
+
+# Status a booking must still have for its event to be created
+EVENT_STATUS = {
+    'group_walk': 'confirmed',
+    'individual_walk': 'approved',
+}
+
+
+def load_bookings(tasks):
+    """Read the bookings behind create and update tasks with one query per booking type"""
+    ids_by_type = {}
+    for task in tasks:
+        if task.action != 'delete':
+            ids_by_type.setdefault(task.booking_type, set()).add(task.booking_id)
+
+    bookings = {}
+    for booking_type, ids in ids_by_type.items():
+        for booking in BOOKING_MODELS[booking_type].objects.filter(pk__in=ids).prefetch_related('dogs'):
+            bookings[(booking_type, booking.pk)] = booking
+    return bookings
+
+
+def create_event(calendar_service, task, booking):
+    """
+    Create the event for a booking and store its id
+
+    Returns:
+        str: Error message, or None on success or when there's nothing to do
+    """
+    if booking is None or booking.calendar_event_id or booking.status != EVENT_STATUS[task.booking_type]:
+        return None
+
+    if task.booking_type == 'group_walk':
+        event_id = calendar_service.create_group_walk_event(booking)
+    else:
+        event_id = calendar_service.create_individual_walk_event(booking)
+    if not event_id:
+        return "Calendar event could not be created"
+
+    # Only store the id if the booking still wants an event
+    stored = type(booking).objects.filter(
+        pk=booking.pk,
+        status=EVENT_STATUS[task.booking_type],
+        calendar_event_id__isnull=True
+    ).update(calendar_event_id=event_id)
+    if stored:
+        logger.info(f"Calendar event created for {task.booking_type} {booking.pk}: {event_id}")
+    else:
+        booking.calendar_event_id = event_id
+        CalendarSyncTask.enqueue([booking], 'delete')
+        logger.info(f"{task.booking_type} {booking.pk} changed while its event was created - event queued for deletion")
+    return None
+
+
+def update_event(calendar_service, task, booking):
+    """
+    Update a booking's existing event
+
+    Returns:
+        str: Error message, or None on success or when there's nothing to do
+    """
+    if booking is None or not booking.calendar_event_id:
+        return None
+    if not calendar_service.update_event(booking.calendar_event_id, booking):
+        return "Calendar event could not be updated"
+    return None
+
+
+def run_tasks(tasks, calendar_service):
+    """
+    Carry out claimed tasks against Google Calendar
+
+    Returns:
+        dict: Error message keyed by the id of each task that failed
+    """
+    errors = {}
+    bookings = load_bookings(tasks)
+
+    deletes = [task for task in tasks if task.action == 'delete' and task.event_id]
+    if deletes:
+        deleted = calendar_service.delete_events({task.event_id for task in deletes})
+        for task in deletes:
+            if task.event_id not in deleted:
+                errors[task.pk] = f"Calendar event {task.event_id} could not be deleted"
+
+    for task in tasks:
+        if task.action == 'delete':
+            continue
+        booking = bookings.get((task.booking_type, task.booking_id))
+        try:
+            if task.action == 'create':
+                error = create_event(calendar_service, task, booking)
+            else:
+                error = update_event(calendar_service, task, booking)
+        except Exception as e:
+            error = str(e)
+        if error:
+            errors[task.pk] = error
+
+    return errors
+
+
+def process_pending(limit=BATCH_SIZE, calendar_service=None):
+    """
+    Claim and run one batch of due calendar tasks
+
+    Args:
+        limit: Most tasks to claim
+        calendar_service: Calendar service to use - a GoogleCalendarService is
+            created when tasks are claimed if not given
+
+    Returns:
+        tuple: (succeeded, failed) task counts
+    """
+    def run(tasks):
+        service = calendar_service
+        try:
+            if service is None:
+                from .calendar_service import GoogleCalendarService
+                service = GoogleCalendarService()
+            if service.service is None:
+                raise RuntimeError("Google Calendar service not initialized")
+            return run_tasks(tasks, service)
+        except Exception as e:
+            logger.error(f"Calendar sync unavailable: {str(e)}")
+            return {task.pk: str(e) for task in tasks}
+
+    return tasks_queue.process(run, limit)
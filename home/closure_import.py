@@ -0,0 +1,361 @@
+"""
+Import holiday and closure calendars from ICS or CSV files
+
+Closures kept in a normal calendar app can be exported and loaded in one go
+instead of being entered date by date. Files are parsed here without any
+calendar library:
+
+- ICS: every VEVENT becomes a closure. All-day events close every slot on the
+  days they cover; timed events close the slots they overlap.
+- CSV: a header row with either a date column or start_date/end_date columns,
+  plus optional slots (ids or keys separated by spaces or semicolons) and
+  reason columns.
+
+The whole file is applied with one bulk upsert of slot managers and overrides,
+and bookings on the newly closed slots are found with a single query.
+"""
+
+import csv
+import io
+import logging
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from django.db import transaction
+from django.utils import timezone
+
+from . import slot_catalogue
+
+logger = logging.getLogger(__name__)
+
+Closure = namedtuple('Closure', [
+    'start',   # First closed date
+    'end',     # Last closed date (inclusive)
+    'slots',   # Slot ids closed on each date, or None for a timed event (see times)
+    'reason',
+    'times',   # (start datetime, end datetime) in local time for timed events, else None
+])
+
+DEFAULT_REASON = 'Imported closure'
+
+CSV_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+# ICS
+
+def unfold_lines(text):
+    """Join folded ICS content lines - a line starting with a space or tab continues the previous one"""
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (' ', '\t') and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def parse_property(line):
+    """Split an ICS content line into (name, params, value)"""
+    head, _, value = line.partition(':')
+    name, *raw_params = head.split(';')
+    params = {}
+    for param in raw_params:
+        key, _, param_value = param.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def unescape_text(value):
+    return (
+        value.replace('\\n', ' ').replace('\\N', ' ')
+        .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+        .strip()
+    )
+
+
+def parse_ics_value(params, value):
+    """
+    Parse a DTSTART/DTEND value
+
+    Returns:
+        date or datetime: A date for all-day values, otherwise a naive datetime
+        in the site's local time
+    """
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d').date()
+
+    if value.endswith('Z'):
+        moment = datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=ZoneInfo('UTC'))
+    else:
+        moment = datetime.strptime(value, '%Y%m%dT%H%M%S')
+        if 'TZID' in params:
+            moment = moment.replace(tzinfo=ZoneInfo(params['TZID']))
+        else:
+            # Floating time - already local
+            return moment
+    return timezone.localtime(moment, timezone.get_current_timezone()).replace(tzinfo=None)
+
+
+def parse_ics(text):
+    """
+    Parse the events in an ICS calendar into closures
+
+    Args:
+        text: ICS file content
+
+    Returns:
+        tuple: (closures, warnings)
+
+    Raises:
+        ValueError: If the file isn't a calendar or an event can't be read
+    """
+    lines = unfold_lines(text)
+    if not lines or lines[0].strip().upper() != 'BEGIN:VCALENDAR':
+        raise ValueError("Not an ICS calendar (expected BEGIN:VCALENDAR)")
+
+    closures = []
+    warnings = []
+    event = None
+    for line in lines:
+        name, params, value = parse_property(line)
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {}
+        elif name == 'END' and value.upper() == 'VEVENT':
+            if event is not None:
+                closure = event_to_closure(event, warnings)
+                if closure:
+                    closures.append(closure)
+            event = None
+        elif event is not None and name not in event:
+            event[name] = (params, value)
+
+    return closures, warnings
+
+
+def event_to_closure(event, warnings):
+    """Turn one parsed VEVENT into a Closure, or None (with a warning) if it should be skipped"""
+    reason = unescape_text(event['SUMMARY'][1]) if 'SUMMARY' in event else DEFAULT_REASON
+
+    if 'DTSTART' not in event:
+        warnings.append(f"Skipped '{reason}': no start date")
+        return None
+    if event.get('STATUS', (None, ''))[1].upper() == 'CANCELLED':
+        return None
+    if 'RRULE' in event:
+        warnings.append(f"'{reason}' repeats - only its first occurrence was imported. Use a recurring rule instead.")
+
+    try:
+        start = parse_ics_value(*event['DTSTART'])
+        end = parse_ics_value(*event['DTEND']) if 'DTEND' in event else None
+    except (ValueError, KeyError) as e:
+        raise ValueError(f"Could not read the dates of '{reason}': {str(e)}")
+
+    if not isinstance(start, datetime):
+        # All-day events end the day after their last day
+        last = end - timedelta(days=1) if isinstance(end, date) and end > start else start
+        return Closure(start, last, slot_catalogue.SLOT_IDS, reason, None)
+
+    if not isinstance(end, datetime) or end < start:
+        end = start
+    return Closure(start.date(), end.date(), None, reason, (start, end))
+
+
+def slots_overlapping(check_date, start, end):
+    """Slot ids on a date that overlap a local time range"""
+    slots = []
+    for slot in slot_catalogue.SLOTS:
+        slot_start = datetime.combine(check_date, slot.start)
+        slot_end = datetime.combine(check_date, slot.end)
+        # A zero-length event closes the slot it falls in
+        if slot_start < end and start < slot_end or slot_start <= start == end < slot_end:
+            slots.append(slot.id)
+    return slots
+
+
+# CSV
+
+def parse_csv_date(value, line_number):
+    for date_format in CSV_DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Line {line_number}: '{value}' is not a date (use YYYY-MM-DD)")
+
+
+def parse_csv(text):
+    """
+    Parse a CSV of closures
+
+    Args:
+        text: CSV file content with a header row
+
+    Returns:
+        tuple: (closures, warnings)
+
+    Raises:
+        ValueError: If the header is missing a date column or a row can't be read
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    columns = {(column or '').strip().lower(): column for column in reader.fieldnames or []}
+
+    start_column = columns.get('date') or columns.get('start_date') or columns.get('start')
+    end_column = columns.get('end_date') or columns.get('end')
+    slots_column = columns.get('slots') or columns.get('time_slots')
+    reason_column = columns.get('reason') or columns.get('summary') or columns.get('notes')
+    if not start_column:
+        raise ValueError("CSV needs a 'date' or 'start_date' column")
+
+    closures = []
+    warnings = []
+    # Line 1 is the header
+    for line_number, row in enumerate(reader, start=2):
+        if not (row.get(start_column) or '').strip():
+            warnings.append(f"Line {line_number}: skipped, no date")
+            continue
+
+        start = parse_csv_date(row[start_column], line_number)
+        end = start
+        if end_column and (row.get(end_column) or '').strip():
+            end = parse_csv_date(row[end_column], line_number)
+        if end < start:
+            raise ValueError(f"Line {line_number}: end date is before the start date")
+
+        slots = slot_catalogue.SLOT_IDS
+        if slots_column and (row.get(slots_column) or '').strip():
+            try:
+                slots = tuple(
+                    slot.id for slot in slot_catalogue.resolve_slots(row[slots_column].replace(';', ' ').split())
+                )
+            except ValueError as e:
+                raise ValueError(f"Line {line_number}: {str(e)}")
+
+        reason = (row.get(reason_column) or '').strip() if reason_column else ''
+        closures.append(Closure(start, end, slots, reason or DEFAULT_REASON, None))
+
+    return closures, warnings
+
+
+def parse_closures(filename, content):
+    """
+    Parse an uploaded closure file, choosing the format from its name or content
+
+    Args:
+        filename: Name of the file, used to tell ICS from CSV
+        content: File content as bytes or text
+
+    Returns:
+        tuple: (closures, warnings)
+
+    Raises:
+        ValueError: If the file can't be parsed
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+
+    if filename.lower().endswith(('.ics', '.ical', '.ifb')) or content.lstrip().upper().startswith('BEGIN:VCALENDAR'):
+        return parse_ics(content)
+    return parse_csv(content)
+
+
+# Import
+
+def expand_closures(closures):
+    """
+    Expand closures into the slots and notes for each date
+
+    Returns:
+        tuple: ({date: set of slot ids}, {date: notes})
+    """
+    slots_by_date = {}
+    reasons_by_date = {}
+    for closure in closures:
+        check_date = closure.start
+        while check_date <= closure.end:
+            if closure.times:
+                day_start = max(closure.times[0], datetime.combine(check_date, time.min))
+                day_end = min(closure.times[1], datetime.combine(check_date + timedelta(days=1), time.min))
+                slots = slots_overlapping(check_date, day_start, day_end)
+            else:
+                slots = closure.slots
+
+            if slots:
+                slots_by_date.setdefault(check_date, set()).update(slots)
+                reasons = reasons_by_date.setdefault(check_date, [])
+                if closure.reason not in reasons:
+                    reasons.append(closure.reason)
+            check_date += timedelta(days=1)
+
+    notes = {check_date: '; '.join(reasons) for check_date, reasons in reasons_by_date.items()}
+    return slots_by_date, notes
+
+
+def import_closures(closures, cancel_bookings=False, dry_run=False):
+    """
+    Close every slot the closures cover and report the bookings that conflict
+
+    Past dates and today are skipped. Everything else is written in one
+    transaction with GroupWalkSlotManager.set_slots_available_by_date.
+
+    Args:
+        closures: Closures from parse_closures
+        cancel_bookings: Also cancel the conflicting bookings and notify customers
+        dry_run: Report what would change without writing anything
+
+    Returns:
+        dict: dates, closed_slots (number newly closed), skipped_dates,
+        conflicts (confirmed GroupWalk bookings on the closed slots) and
+        cancelled_count
+    """
+    from .models import GroupWalk, GroupWalkSlotManager
+    from .utils import cancel_bookings_for_closed_slots
+
+    slots_by_date, notes = expand_closures(closures)
+
+    today = date.today()
+    skipped_dates = sorted(check_date for check_date in slots_by_date if check_date <= today)
+    for check_date in skipped_dates:
+        del slots_by_date[check_date]
+        del notes[check_date]
+
+    result = {
+        'dates': sorted(slots_by_date),
+        'closed_slots': 0,
+        'skipped_dates': skipped_dates,
+        'conflicts': [],
+        'cancelled_count': 0,
+    }
+    if not slots_by_date:
+        return result
+
+    with transaction.atomic():
+        # One query for every booking on the imported dates, narrowed to the closed slots here
+        result['conflicts'] = [
+            booking for booking in GroupWalk.objects.filter(
+                booking_date__in=slots_by_date,
+                status='confirmed'
+            ).order_by('booking_date', 'time_slot', 'id')
+            if booking.time_slot in slots_by_date[booking.booking_date]
+        ]
+
+        if dry_run:
+            return result
+
+        changed = GroupWalkSlotManager.set_slots_available_by_date(slots_by_date, False, notes)
+        result['closed_slots'] = len(changed)
+
+        if cancel_bookings:
+            # Customers are told the reason for their own date
+            slots_by_reason = {}
+            for booking in result['conflicts']:
+                slots_by_reason.setdefault(notes[booking.booking_date], set()).add(
+                    (booking.booking_date, booking.time_slot)
+                )
+            for reason, closed_slots in slots_by_reason.items():
+                result['cancelled_count'] += cancel_bookings_for_closed_slots(closed_slots, reason)
+
+    logger.info(
+        f"Imported closures for {len(result['dates'])} dates: {result['closed_slots']} slots closed, "
+        f"{len(result['conflicts'])} conflicting bookings, {result['cancelled_count']} cancelled"
+    )
+    return result
@@ -0,0 +1,263 @@
+"""
+View decorators for Canine Compadre
+"""
+
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+logger = logging.getLogger(__name__)
+
+# Longest Idempotency-Key accepted
+MAX_IDEMPOTENCY_KEY_LENGTH = 100
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """
+    Conditional GET for async views whose ETag/Last-Modified need the async ORM or cache
+
+    Works like django.views.decorators.http.condition, except etag_func and
+    last_modified_func are awaited instead of being called synchronously.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs) if etag_func else None
+            last_modified = None
+            if last_modified_func:
+                modified = await last_modified_func(request, *args, **kwargs)
+                if modified:
+                    last_modified = int(modified.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+
+        return _wrapped_view
+
+    return decorator
+
+
+def request_fingerprint(request):
+    """SHA-256 of a POST's form fields, ignoring the CSRF token and the idempotency key"""
+    fields = sorted(
+        (name, values) for name, values in request.POST.lists()
+        if name not in ('csrfmiddlewaretoken', 'idempotency_key')
+    )
+    return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+
+def claim_idempotency_key(key, endpoint, request_hash):
+    """
+    Record that a request with this key has started
+
+    The claim only holds for IDEMPOTENCY_PROCESSING_LEASE, so a key whose
+    request died mid-way (a killed worker or a timeout) can be claimed again
+    instead of blocking the customer until the key expires.
+
+    Returns:
+        tuple: (claim, existing) - the new IdempotencyKey if this request
+        claimed the key, otherwise the record already holding it
+    """
+    from .models import IdempotencyKey
+
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_PROCESSING_LEASE', 60))
+    # Expired keys and abandoned claims are cleared as new ones arrive
+    IdempotencyKey.objects.filter(expires_at__lte=now).delete()
+
+    while True:
+        try:
+            with transaction.atomic():
+                claim = IdempotencyKey.objects.create(
+                    key=key,
+                    endpoint=endpoint,
+                    request_hash=request_hash,
+                    expires_at=now + lease
+                )
+            return claim, None
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(key=key, endpoint=endpoint).first()
+            if existing is not None:
+                return None, existing
+            # The first request failed and released the key meanwhile - try again
+
+
+def is_replayable(response):
+    """Whether a response records a completed booking, so a retry should get it back"""
+    if response.status_code >= 300 or not response.get('Content-Type', '').startswith('application/json'):
+        return False
+    try:
+        return json.loads(response.content).get('success') is True
+    except (ValueError, AttributeError):
+        return False
+
+
+def idempotent(view_func):
+    """
+    Make a JSON POST view safe to retry with an Idempotency-Key
+
+    The key comes from the Idempotency-Key header or an idempotency_key form
+    field; requests without one run as normal. The first request with a key
+    runs the view, and if it succeeds its JSON response is stored. A retry
+    with the same key gets that response back without running the view
+    again, so a retried booking doesn't book, email or reserve twice. While
+    the first request is still running a retry gets 409, and reusing a key
+    for a different form gets 422. Failed responses aren't stored - the view
+    answers unexpected errors with success: false as well as validation
+    errors - so the client can simply try again.
+    """
+
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        from .models import IdempotencyKey
+
+        key = (request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key') or '').strip()
+        if not key:
+            return view_func(request, *args, **kwargs)
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return JsonResponse({
+                'success': False,
+                'message': f'Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters'
+            }, status=400)
+
+        endpoint = request.path
+        request_hash = request_fingerprint(request)
+        claim, existing = claim_idempotency_key(key, endpoint, request_hash)
+        if existing is not None:
+            if existing.request_hash != request_hash:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'This Idempotency-Key was already used for a different request'
+                }, status=422)
+            if existing.status != 'complete':
+                response = JsonResponse({
+                    'success': False,
+                    'message': 'This request is still being processed. Please wait a moment and try again.'
+                }, status=409)
+                response.headers['Retry-After'] = str(max(1, int((existing.expires_at - timezone.now()).total_seconds())))
+                return response
+
+            logger.info(f"Replaying response for idempotency key {key} on {endpoint}")
+            response = HttpResponse(
+                existing.response_body,
+                status=existing.response_status,
+                content_type='application/json'
+            )
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        # Filtered on this claim's pk, so a request that outlived its lease
+        # can't touch a later claim of the same key
+        own_claim = IdempotencyKey.objects.filter(pk=claim.pk)
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            own_claim.delete()
+            raise
+
+        if is_replayable(response):
+            ttl = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+            own_claim.update(
+                status='complete',
+                response_status=response.status_code,
+                response_body=response.content.decode(response.charset),
+                expires_at=timezone.now() + ttl
+            )
+        else:
+            own_claim.delete()
+        return response
+
+    return _wrapped_view
+
+
+def client_ip(request):
+    """
+    The address of the client that made a request
+
+    Behind reverse proxies REMOTE_ADDR is the last proxy's address, so every
+    visitor would share it. With TRUSTED_PROXY_COUNT proxies in front, the
+    client is the address that many entries from the right of
+    X-Forwarded-For - entries further left are supplied by the client and
+    can't be trusted.
+    """
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if address.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def throttle(scope, limit, period, key=None):
+    """
+    Limit how often a view can be called, answering 429 once the limit is reached
+
+    Calls are counted in the shared cache in fixed windows of period seconds,
+    per client IP (see client_ip) and, if key is given, per key(request) as
+    well - e.g. the email being looked up, so moving between addresses
+    doesn't get round the limit. Each window's counter is created with
+    cache.add and counted with cache.incr, so concurrent calls don't
+    overwrite each other's counts on backends whose incr is atomic.
+
+    Args:
+        scope: Name the counts are kept under
+        limit: Calls allowed per period
+        period: Window length in seconds
+        key: Optional callable returning a second value to count by
+    """
+
+    def count_call(cache_key, timeout):
+        cache.add(cache_key, 0, timeout)
+        try:
+            return cache.incr(cache_key)
+        except ValueError:
+            # The counter expired between add and incr - this call starts the next one
+            cache.add(cache_key, 1, timeout)
+            return 1
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            buckets = [f"ip:{client_ip(request)}"]
+            value = key(request) if key else None
+            if value:
+                buckets.append(f"key:{hashlib.sha256(value.encode()).hexdigest()}")
+
+            now = time.time()
+            window = int(now // period)
+            retry_after = int((window + 1) * period - now) + 1
+            for bucket in buckets:
+                count = count_call(f"throttle:{scope}:{bucket}:{window}", retry_after)
+                if count > limit:
+                    logger.warning(f"Throttled {scope} for {bucket}")
+                    response = JsonResponse({
+                        'success': False,
+                        'error': 'Too many requests. Please try again later.'
+                    }, status=429)
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response
+
+            return view_func(request, *args, **kwargs)
+
+        return _wrapped_view
+
+    return decorator
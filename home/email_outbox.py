@@ -0,0 +1,71 @@
+"""
+Background email delivery from the outbox
+
+EmailService and the cancellation notices queue rendered EmailOutbox rows
+instead of sending. The send_outbox command runs this worker, which claims
+due messages through the shared WorkQueue (see home.queue) and sends each
+batch over one mail connection.
+"""
+
+import logging
+from django.core.mail import get_connection
+from django.utils import timezone
+
+from .models import EmailOutbox
+from .queue import BATCH_SIZE, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+
+def mark_sent(messages):
+    """Record that the given outbox rows were delivered"""
+    messages.update(status='sent', sent_at=timezone.now(), last_error='')
+
+
+outbox = WorkQueue(EmailOutbox, on_success=mark_sent)
+
+
+def send_messages(messages, connection):
+    """
+    Send claimed messages over one connection
+
+    Returns:
+        dict: Error message keyed by the id of each message that failed
+    """
+    errors = {}
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not connect to the mail server: {str(e)}")
+        return {message.pk: str(e) for message in messages}
+
+    try:
+        for message in messages:
+            try:
+                if not connection.send_messages([message.to_message(connection)]):
+                    errors[message.pk] = "Mail server did not accept the message"
+            except Exception as e:
+                errors[message.pk] = str(e)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return errors
+
+
+def process_pending(limit=BATCH_SIZE, connection=None):
+    """
+    Claim and send one batch of due emails
+
+    Args:
+        limit: Most messages to claim
+        connection: Mail connection to use - the default backend if not given
+
+    Returns:
+        tuple: (sent, failed) message counts
+    """
+    return outbox.process(
+        lambda messages: send_messages(messages, connection or get_connection(fail_silently=False)),
+        limit
+    )
@@ -1,9 +1,8 @@
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
 import logging
-import time
 
 logger = logging.getLogger(__name__)
 
@@ -11,41 +10,42 @@ class EmailService:
     """Service for sending booking confirmation and notification emails"""
 
     @staticmethod
-    def send_email_with_retry(subject, message, from_email, recipient_list, html_content=None, max_retries=3):
-        """Send email with retry logic for better reliability"""
-        for attempt in range(max_retries):
-            try:
-                if html_content:
-                    msg = EmailMultiAlternatives(
-                        subject=subject,
-                        body=message,
-                        from_email=from_email,
-                        to=recipient_list,
-                        reply_to=[from_email]
-                    )
-                    msg.attach_alternative(html_content, "text/html")
-                    msg.send()
-                else:
-                    send_mail(
-                        subject=subject,
-                        message=message,
-                        from_email=from_email,
-                        recipient_list=recipient_list,
-                        fail_silently=False
-                    )
-
-                logger.info(f"Email sent successfully on attempt {attempt + 1}")
-                return True
-
-            except Exception as e:
-                logger.warning(f"Email sending attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # exponential backoff
-                else:
-                    logger.error(f"Email sending failed after {max_retries} attempts: {str(e)}")
-                    return False
-
-        return False
+    def queue_email(subject, message, from_email, recipient_list, html_content=None, dedupe_key=None):
+        """
+        Queue an email in the outbox for the send_outbox worker to deliver
+
+        Nothing talks to the mail provider here, so a slow provider can't hold
+        up the request or the transaction it's queued in.
+
+        Args:
+            dedupe_key: Identifies the email - it is only queued once per key
+
+        Returns:
+            bool: Whether the email was queued (False if the key was already used)
+        """
+        from .models import EmailOutbox
+
+        if html_content:
+            msg = EmailMultiAlternatives(
+                subject=subject,
+                body=message,
+                from_email=from_email,
+                to=recipient_list,
+                reply_to=[from_email]
+            )
+            msg.attach_alternative(html_content, "text/html")
+        else:
+            msg = EmailMessage(
+                subject=subject,
+                body=message,
+                from_email=from_email,
+                to=recipient_list
+            )
+
+        queued = EmailOutbox.enqueue([(msg, dedupe_key)]) > 0
+        if not queued:
+            logger.info(f"Email {dedupe_key} already queued - skipped")
+        return queued
 
     @staticmethod
     def send_group_walk_confirmation(booking):
@@ -73,15 +73,16 @@ class EmailService:
                 html_content = None
                 text_content = EmailService._create_group_walk_text_email(booking, dog_names)
 
-            EmailService.send_email_with_retry(
+            EmailService.queue_email(
                 subject,
                 text_content,
                 settings.BUSINESS_EMAIL,
                 [booking.customer_email],
-                html_content=html_content
+                html_content=html_content,
+                dedupe_key=f'group_walk_confirmation:{booking.id}'
             )
 
-            logger.info(f"Group walk confirmation email sent to {booking.customer_email} for booking {booking.id}")
+            logger.info(f"Group walk confirmation email queued for {booking.customer_email} for booking {booking.id}")
             return True
 
         except Exception as e:
@@ -113,15 +114,16 @@ class EmailService:
                 html_content = None
                 text_content = EmailService._create_individual_walk_request_text_email(booking, dog_names)
 
-            EmailService.send_email_with_retry(
+            EmailService.queue_email(
                 subject,
                 text_content,
                 settings.BUSINESS_EMAIL,
                 [booking.customer_email],
-                html_content=html_content
+                html_content=html_content,
+                dedupe_key=f'individual_walk_request:{booking.id}'
             )
 
-            logger.info(f"Individual walk request confirmation email sent to {booking.customer_email} for booking {booking.id}")
+            logger.info(f"Individual walk request confirmation email queued for {booking.customer_email} for booking {booking.id}")
             return True
 
         except Exception as e:
@@ -158,15 +160,16 @@ class EmailService:
                 html_content = None
                 text_content = EmailService._create_individual_walk_response_text_email(booking, dog_names)
 
-            EmailService.send_email_with_retry(
+            EmailService.queue_email(
                 subject,
                 text_content,
                 settings.BUSINESS_EMAIL,
                 [booking.customer_email],
-                html_content=html_content
+                html_content=html_content,
+                dedupe_key=f'individual_walk_response:{booking.id}:{booking.status}'
             )
 
-            logger.info(f"Individual walk response email sent to {booking.customer_email} for booking {booking.id}")
+            logger.info(f"Individual walk response email queued for {booking.customer_email} for booking {booking.id}")
             return True
 
         except Exception as e:
@@ -198,7 +201,7 @@ Booking Details:
 - Dogs: {dogs_text} ({booking.number_of_dogs} dog{'s' if booking.number_of_dogs > 1 else ''})
 - Status: {booking.get_status_display()}
 
-Calendar Event: {"Created" if booking.calendar_event_id else "Failed to create"}
+Calendar Event: {"Created" if booking.calendar_event_id else "Queued"}
 
 View in admin: {settings.SITE_URL}/admin/
                 """.strip()
@@ -232,14 +235,15 @@ View in admin: {settings.SITE_URL}/admin/
                 logger.warning(f"Unknown booking type for admin notification: {booking_type}")
                 return False
 
-            EmailService.send_email_with_retry(
+            EmailService.queue_email(
                 subject,
                 message,
                 settings.BUSINESS_EMAIL,
-                [admin_email]
+                [admin_email],
+                dedupe_key=f'admin_notification:{booking_type}:{booking.id}'
             )
 
-            logger.info(f"Admin notification email sent for {booking_type} booking {booking.id}")
+            logger.info(f"Admin notification email queued for {booking_type} booking {booking.id}")
             return True
 
         except Exception as e:
@@ -293,15 +297,16 @@ View in admin: {settings.SITE_URL}/admin/
                 html_content = None
                 text_content = EmailService._create_multi_booking_text_email(sorted_bookings, dog_names)
 
-            EmailService.send_email_with_retry(
+            EmailService.queue_email(
                 subject,
                 text_content,
                 settings.BUSINESS_EMAIL,
                 [first_booking.customer_email],
-                html_content=html_content
+                html_content=html_content,
+                dedupe_key=f'multi_booking_confirmation:{first_booking.batch_id or first_booking.id}'
             )
 
-            logger.info(f"Multi-booking confirmation email sent to {first_booking.customer_email} for {total_bookings} bookings")
+            logger.info(f"Multi-booking confirmation email queued for {first_booking.customer_email} for {total_bookings} bookings")
             return True
 
         except Exception as e:
@@ -333,7 +338,7 @@ View in admin: {settings.SITE_URL}/admin/
     📅 Date: {booking.booking_date.strftime('%A, %B %d, %Y')}
     ⏰ Time: {booking.get_time_slot_display()}
     🐕 Dogs: {dogs_text} ({booking.number_of_dogs} dogs)
-    📅 Calendar Event: {'✅ Created' if booking.calendar_event_id else '❌ Failed'}
+    📅 Calendar Event: {'✅ Created' if booking.calendar_event_id else '⏳ Queued'}
     🆔 Batch ID: {booking.batch_id}
     """
 
@@ -367,7 +372,7 @@ View in admin: {settings.SITE_URL}/admin/
 
     💳 BATCH ID: {first_booking.batch_id}
 
-    📅 Calendar Events: {sum(1 for b in bookings if b.calendar_event_id)}/{total_bookings} created successfully
+    📅 Calendar Events: {sum(1 for b in bookings if b.calendar_event_id)}/{total_bookings} created, the rest are queued
 
     View in admin: {settings.SITE_URL}/admin/
 
@@ -375,14 +380,15 @@ View in admin: {settings.SITE_URL}/admin/
     Canine Compadre Multi-Booking System
             """.strip()
 
-            EmailService.send_email_with_retry(
+            EmailService.queue_email(
                 subject,
                 message,
                 settings.BUSINESS_EMAIL,
-                [admin_email]
+                [admin_email],
+                dedupe_key=f'admin_multi_booking_notification:{first_booking.batch_id or first_booking.id}'
             )
 
-            logger.info(f"Admin multi-booking notification sent for {total_bookings} bookings")
+            logger.info(f"Admin multi-booking notification queued for {total_bookings} bookings")
             return True
 
         except Exception as e:
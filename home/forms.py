@@ -1,7 +1,7 @@
 from django import forms
-from django.forms import inlineformset_factory
 from django.core.exceptions import ValidationError
-from .models import GroupWalk, IndividualWalk, Dog
+from . import slot_catalogue
+from .models import AvailabilityRule, GroupWalk, IndividualWalk, DogProfile
 from datetime import date, timedelta
 
 # Allowed postcode areas within 10 miles of Croyde, North Devon
@@ -29,13 +29,16 @@ class GroupWalkForm(forms.ModelForm):
             'number_of_dogs': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'id': 'num-dogs'}),
         }
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, booking_settings=None, check_capacity=True, **kwargs):
         super().__init__(*args, **kwargs)
         
-        # Get max dogs from settings
+        # Get max dogs from settings - validate_group_walk_cart passes them in so they're read once
         from .models import BookingSettings
-        settings = BookingSettings.get_settings()
-        max_dogs = settings.max_dogs_per_booking
+        self.booking_settings = booking_settings or BookingSettings.get_settings()
+        max_dogs = self.booking_settings.max_dogs_per_booking
+        
+        # validate_group_walk_cart checks capacity for the whole cart at once
+        self.check_capacity = check_capacity
         
         # Make date and time_slot readonly - they'll be set via JavaScript from calendar
         self.fields['booking_date'].widget.attrs['readonly'] = True
@@ -50,7 +53,7 @@ class GroupWalkForm(forms.ModelForm):
         # Updated help text with dynamic max
         self.fields['number_of_dogs'].help_text = f"Maximum {max_dogs} dogs per individual booking (group walk session limited to {max_dogs} dogs total)"
         self.fields['booking_date'].help_text = "Select from available dates in the calendar"
-        self.fields['time_slot'].help_text = "Available slots: 09:30 AM - 11:30 AM, 2:00 PM - 4:00 PM, or 6:00 PM - 8:00 PM"
+        self.fields['time_slot'].help_text = f"Available slots: {', '.join(slot.label for slot in slot_catalogue.SLOTS)}"
         self.fields['customer_postcode'].help_text = f"We serve: {', '.join(ALLOWED_POSTCODE_AREAS)} (within 10 miles of Croyde, North Devon)"
     
     def clean_booking_date(self):
@@ -86,25 +89,19 @@ class GroupWalkForm(forms.ModelForm):
         time_slot = cleaned_data.get('time_slot')
         number_of_dogs = cleaned_data.get('number_of_dogs')
         
-        if booking_date and time_slot and number_of_dogs:
-            # Get max capacity from settings
-            from .models import BookingSettings
-            settings = BookingSettings.get_settings()
-            max_capacity = settings.max_dogs_per_booking
+        if self.check_capacity and booking_date and time_slot and number_of_dogs:
+            from .availability import check_slots
             
-            # Check if there are enough spots available
-            existing_bookings = GroupWalk.objects.filter(
-                booking_date=booking_date,
-                time_slot=time_slot,
-                status='confirmed'
-            )
+            # Same capacity as the calendar - overrides, rules and the weekend/evening settings
+            check = check_slots([(booking_date, time_slot)], booking_settings=self.booking_settings)[0]
+            if 'max_capacity' not in check:
+                raise ValidationError(check['message'])
+            available_spots = check['available_spots']
             
             # Exclude current instance if editing
-            if self.instance and self.instance.pk:
-                existing_bookings = existing_bookings.exclude(pk=self.instance.pk)
-            
-            total_booked = sum(booking.number_of_dogs for booking in existing_bookings)
-            available_spots = max_capacity - total_booked
+            if (self.instance and self.instance.pk and self.instance.status == 'confirmed'
+                    and self.instance.booking_date == booking_date and self.instance.time_slot == time_slot):
+                available_spots += self.instance.number_of_dogs
             
             if number_of_dogs > available_spots:
                 raise ValidationError(
@@ -113,6 +110,86 @@ class GroupWalkForm(forms.ModelForm):
         
         return cleaned_data
 
+# GroupWalkForm fields that change from slot to slot in a cart
+SLOT_FIELDS = {'booking_date', 'time_slot', '__all__'}
+
+
+def validate_group_walk_cart(customer_data, selected_slots):
+    """
+    Validate every slot of a group walk booking in one pass
+
+    Booking settings are read once, and the slot overrides (with their slot
+    managers), closure rules and occupancy for the whole cart are loaded with
+    one query each by check_slots, so the query count doesn't grow with the
+    number of slots. Dogs booked on the same slot twice in one cart count
+    against it together.
+
+    Args:
+        customer_data: Customer and number_of_dogs form data shared by every slot
+        selected_slots: Slot dicts from the booking calendar, with 'date' and 'timeSlot'
+
+    Returns:
+        tuple: (bookings, failures) - an unsaved GroupWalk for each slot, and
+        (slot_data, errors) for each slot that failed, errors keyed by field
+        like form.errors. Customer field errors are reported on the first slot only.
+    """
+    from .availability import check_slots
+    from .models import BookingSettings
+
+    booking_settings = BookingSettings.get_settings()
+
+    bookings = []
+    failures = []
+    for index, slot_data in enumerate(selected_slots):
+        form = GroupWalkForm(
+            {**customer_data, 'booking_date': slot_data['date'], 'time_slot': slot_data['timeSlot']},
+            booking_settings=booking_settings,
+            check_capacity=False
+        )
+        if form.is_valid():
+            booking = form.save(commit=False)
+            try:
+                booking.validate_booking(booking_settings)
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                bookings.append((slot_data, booking))
+                continue
+
+        errors = {
+            field_name: [str(error) for error in field_errors]
+            for field_name, field_errors in form.errors.items()
+            if index == 0 or field_name in SLOT_FIELDS
+        }
+        if errors:
+            failures.append((slot_data, errors))
+
+    if failures:
+        return [booking for slot_data, booking in bookings], failures
+
+    # One capacity check for the whole cart
+    checks = check_slots(
+        [(booking.booking_date, booking.time_slot) for slot_data, booking in bookings],
+        booking_settings=booking_settings
+    )
+    requested = {}
+    for (slot_data, booking), check in zip(bookings, checks):
+        if 'max_capacity' not in check:
+            # Closed on this date
+            failures.append((slot_data, {'__all__': [check['message']]}))
+            continue
+
+        key = (booking.booking_date, booking.time_slot)
+        available_spots = check['available_spots'] - requested.get(key, 0)
+        if booking.number_of_dogs > available_spots:
+            failures.append((slot_data, {'__all__': [
+                f"Not enough space available. Only {max(0, available_spots)} spots remaining for this time slot."
+            ]}))
+            continue
+        requested[key] = requested.get(key, 0) + booking.number_of_dogs
+
+    return [booking for slot_data, booking in bookings], failures
+
 
 
 class IndividualWalkForm(forms.ModelForm):
@@ -177,24 +254,17 @@ class IndividualWalkForm(forms.ModelForm):
         if preferred_date and preferred_date <= date.today():
             raise ValidationError("Cannot request walks for past dates.")
         
-        # NEW: Check if date is marked unavailable
+        # NEW: Check if date is marked unavailable, by date or by a recurring rule
         if preferred_date:
-            from .models import GroupWalkSlotManager
+            from .availability import get_date_closure
             
-            try:
-                slot_manager = GroupWalkSlotManager.objects.get(date=preferred_date)
-                # If all slots are unavailable, block the request
-                if (not slot_manager.morning_slot_available and 
-                    not slot_manager.afternoon_slot_available and 
-                    not slot_manager.evening_slot_available):
-                    raise ValidationError(
-                        f"Sorry, {preferred_date.strftime('%B %d, %Y')} is not available for walks. "
-                        f"Reason: {slot_manager.notes or 'Date marked unavailable'}. "
-                        f"Please choose a different date."
-                    )
-            except GroupWalkSlotManager.DoesNotExist:
-                # Date is available (no slot manager = available)
-                pass
+            reason = get_date_closure(preferred_date)
+            if reason is not None:
+                raise ValidationError(
+                    f"Sorry, {preferred_date.strftime('%B %d, %Y')} is not available for walks. "
+                    f"Reason: {reason}. "
+                    f"Please choose a different date."
+                )
         
         return preferred_date
     
@@ -283,7 +353,7 @@ class IndividualWalkForm(forms.ModelForm):
 
 class DogForm(forms.ModelForm):
     class Meta:
-        model = Dog
+        model = DogProfile
         fields = ['name', 'breed', 'age', 'allergies', 'special_instructions', 
                  'good_with_other_dogs', 'behavioral_notes', 'vet_name', 'vet_phone', 'vet_address']
         widgets = {
@@ -350,27 +420,22 @@ class DogForm(forms.ModelForm):
         return vet_address
 
 
-# Create formsets for handling multiple dogs
-GroupWalkDogFormSet = inlineformset_factory(
-    GroupWalk, 
-    Dog, 
-    form=DogForm,
+# Create formsets for handling multiple dogs - the dogs are saved as the
+# customer's DogProfiles and linked to the booking, so these aren't inline formsets
+GroupWalkDogFormSet = forms.formset_factory(
+    DogForm,
     extra=1,  # Start with 1 empty form
     can_delete=False,  # Don't allow deletion on initial booking
     min_num=1,  # At least 1 dog required
     validate_min=True,
-    fields=['name', 'breed', 'age', 'allergies', 'special_instructions', 'good_with_other_dogs', 'behavioral_notes', 'vet_name', 'vet_phone', 'vet_address']
 )
 
-IndividualWalkDogFormSet = inlineformset_factory(
-    IndividualWalk, 
-    Dog, 
-    form=DogForm,
+IndividualWalkDogFormSet = forms.formset_factory(
+    DogForm,
     extra=1,  # Start with 1 empty form
     can_delete=False,  # Don't allow deletion on initial booking
     min_num=1,  # At least 1 dog required
     validate_min=True,
-    fields=['name', 'breed', 'age', 'allergies', 'special_instructions', 'good_with_other_dogs', 'behavioral_notes', 'vet_name', 'vet_phone', 'vet_address']
 )
 
 
@@ -425,6 +490,85 @@ class AdminResponseForm(forms.ModelForm):
         return confirmed_time
 
 
+class AvailabilityRuleForm(forms.ModelForm):
+    """Admin form for recurring closures - edits the comma separated rule fields as checkboxes"""
+
+    weekdays = forms.TypedMultipleChoiceField(
+        required=False,
+        coerce=int,
+        choices=AvailabilityRule.WEEKDAY_CHOICES,
+        widget=forms.CheckboxSelectMultiple,
+        help_text="Leave empty for every day of the week"
+    )
+    months = forms.TypedMultipleChoiceField(
+        required=False,
+        coerce=int,
+        choices=AvailabilityRule.MONTH_CHOICES,
+        widget=forms.CheckboxSelectMultiple,
+        help_text="Leave empty for every month"
+    )
+    time_slots = forms.MultipleChoiceField(
+        required=False,
+        choices=GroupWalk.TIME_SLOT_CHOICES,
+        widget=forms.CheckboxSelectMultiple,
+        help_text="Leave empty to close every slot"
+    )
+
+    class Meta:
+        model = AvailabilityRule
+        fields = ['name', 'weekdays', 'months', 'time_slots', 'start_date', 'end_date', 'is_active']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        rule = self.instance
+        if rule.pk:
+            self.initial['weekdays'] = [int(part) for part in rule.weekdays.split(',') if part]
+            self.initial['months'] = [int(part) for part in rule.months.split(',') if part]
+            self.initial['time_slots'] = [part for part in rule.time_slots.split(',') if part]
+
+    def clean_weekdays(self):
+        return ','.join(str(weekday) for weekday in sorted(self.cleaned_data['weekdays']))
+
+    def clean_months(self):
+        return ','.join(str(month) for month in sorted(self.cleaned_data['months']))
+
+    def clean_time_slots(self):
+        selected = set(self.cleaned_data['time_slots'])
+        return ','.join(slot_id for slot_id in slot_catalogue.SLOT_IDS if slot_id in selected)
+
+
+class ClosureImportForm(forms.Form):
+    """Admin upload of a holiday/closure calendar - see closure_import for the file formats"""
+
+    closure_file = forms.FileField(
+        label="Calendar file",
+        help_text="ICS export from your calendar app, or a CSV with date (or start_date/end_date), slots and reason columns"
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        initial=True,
+        label="Preview only",
+        help_text="Show the dates and conflicting bookings without changing anything"
+    )
+    cancel_bookings = forms.BooleanField(
+        required=False,
+        label="Cancel conflicting bookings",
+        help_text="Cancel bookings on the closed slots and email the customers"
+    )
+
+    def clean_closure_file(self):
+        from .closure_import import parse_closures
+
+        closure_file = self.cleaned_data['closure_file']
+        try:
+            self.cleaned_data['closures'], self.cleaned_data['warnings'] = parse_closures(
+                closure_file.name, closure_file.read()
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValidationError(f"Could not read the file: {str(e)}")
+        return closure_file
+
+
 class GroupWalkSearchForm(forms.Form):
     """Form for searching/filtering group walk bookings"""
     
@@ -0,0 +1,147 @@
+"""
+Compare throughput of the public availability endpoints under WSGI and ASGI workers
+"""
+
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+ENDPOINTS = [
+    '/api/availability/?days=180&format=compact',
+    '/api/availability/?num_dogs=2',
+    '/api/unavailable-dates/',
+    '/api/booking-settings/',
+    '/health/',
+]
+
+SERVERS = {
+    'wsgi': ['CanineCompadre.wsgi:application'],
+    'asgi': ['CanineCompadre.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark the availability endpoints under sync gunicorn workers and the uvicorn ASGI worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint")
+        parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients")
+        parser.add_argument('--workers', type=int, default=2, help="Gunicorn workers per server")
+        parser.add_argument('--port', type=int, default=8765, help="Port to run each server on")
+        parser.add_argument(
+            '--streams',
+            type=int,
+            default=0,
+            help="Availability streams to hold open during the run, simulating slow clients",
+        )
+        parser.add_argument(
+            '--only',
+            choices=sorted(SERVERS),
+            help="Only benchmark one server type",
+        )
+
+    def handle(self, *args, **options):
+        server_types = [options['only']] if options['only'] else sorted(SERVERS, reverse=True)
+        results = {}
+
+        for server_type in server_types:
+            self.stdout.write(f"Starting {server_type} server...")
+            server = self.start_server(server_type, options['port'], options['workers'])
+            try:
+                base_url = f"http://127.0.0.1:{options['port']}"
+                self.wait_until_ready(base_url)
+                stop_streams = self.open_streams(base_url, options['streams'])
+                try:
+                    results[server_type] = {
+                        path: self.run_load(base_url + path, options['requests'], options['concurrency'])
+                        for path in ENDPOINTS
+                    }
+                finally:
+                    stop_streams.set()
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        self.report(results)
+
+    def start_server(self, server_type, port, workers):
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[server_type],
+            '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers),
+            '--log-level', 'warning',
+        ]
+        return subprocess.Popen(command)
+
+    def wait_until_ready(self, base_url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(base_url + '/health/', timeout=2):
+                    return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.5)
+        raise CommandError(f"Server at {base_url} did not start within {timeout} seconds")
+
+    def open_streams(self, base_url, count):
+        """Hold count availability streams open until the returned event is set"""
+        stop = threading.Event()
+
+        def hold():
+            try:
+                with urllib.request.urlopen(base_url + '/api/availability/stream/', timeout=5) as response:
+                    while not stop.is_set():
+                        response.readline()
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                pass
+
+        for _ in range(count):
+            threading.Thread(target=hold, daemon=True).start()
+        # Give the streams time to connect before the load starts
+        time.sleep(1 if count else 0)
+        return stop
+
+    def run_load(self, url, total_requests, concurrency):
+        """Fire total_requests GETs at url from concurrency clients"""
+
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                    ok = response.status == 200
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(fetch, range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, ok in samples)
+        return {
+            'throughput': total_requests / elapsed,
+            'p50': statistics.median(latencies) * 1000,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            'errors': sum(1 for latency, ok in samples if not ok),
+        }
+
+    def report(self, results):
+        self.stdout.write('')
+        self.stdout.write(f"{'endpoint':<46}{'server':<8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+        for path in ENDPOINTS:
+            for server_type, endpoint_results in results.items():
+                stats = endpoint_results[path]
+                self.stdout.write(
+                    f"{path:<46}{server_type:<8}{stats['throughput']:>9.1f}"
+                    f"{stats['p50']:>9.1f}{stats['p95']:>9.1f}{stats['errors']:>8}"
+                )
+        self.stdout.write(self.style.SUCCESS("Benchmark complete."))
@@ -0,0 +1,64 @@
+"""
+Import holiday and closure dates from an ICS or CSV file
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.closure_import import import_closures, parse_closures
+
+
+class Command(BaseCommand):
+    help = "Close group walk slots for the events in an ICS calendar or CSV file and report conflicting bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="ICS or CSV file to import")
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report what would be closed and which bookings conflict without changing anything",
+        )
+        parser.add_argument(
+            '--cancel-bookings',
+            action='store_true',
+            help="Cancel conflicting bookings and email the customers",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as closure_file:
+                closures, warnings = parse_closures(options['path'], closure_file.read())
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {str(e)}")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for warning in warnings:
+            self.stdout.write(self.style.WARNING(warning))
+
+        result = import_closures(
+            closures,
+            cancel_bookings=options['cancel_bookings'],
+            dry_run=options['dry_run']
+        )
+
+        if result['skipped_dates']:
+            self.stdout.write(f"Skipped {len(result['skipped_dates'])} date(s) that are today or in the past.")
+
+        for booking in result['conflicts']:
+            self.stdout.write(
+                f"Conflict: booking #{booking.id} {booking.customer_name} "
+                f"({booking.number_of_dogs} dog{'s' if booking.number_of_dogs > 1 else ''}) "
+                f"on {booking.booking_date} {booking.time_slot}"
+            )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run: {len(result['dates'])} date(s) would be closed, "
+                f"{len(result['conflicts'])} conflicting booking(s)."
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Closed {result['closed_slots']} slot(s) across {len(result['dates'])} date(s). "
+            f"{len(result['conflicts'])} conflicting booking(s), {result['cancelled_count']} cancelled."
+        ))
@@ -0,0 +1,34 @@
+"""
+Rebuild and verify the SlotOccupancy table from confirmed GroupWalk bookings
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.models import SlotOccupancy
+
+
+class Command(BaseCommand):
+    help = "Verify SlotOccupancy against confirmed group walk bookings and repair any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only report drift without repairing it (exits with an error if drift is found)",
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        drift = SlotOccupancy.rebuild(repair=not check_only)
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Slot occupancy matches group walk bookings."))
+            return
+
+        for check_date, time_slot, stored_dogs, actual_dogs in drift:
+            self.stdout.write(f"{check_date} {time_slot}: stored {stored_dogs}, actual {actual_dogs}")
+
+        if check_only:
+            raise CommandError(f"{len(drift)} slot(s) have drifted. Run without --check to repair.")
+
+        self.stdout.write(self.style.SUCCESS(f"Repaired {len(drift)} slot(s)."))
@@ -0,0 +1,16 @@
+"""
+Deliver the emails queued in the outbox
+"""
+
+from home.email_outbox import process_pending
+from home.queue import QueueWorkerCommand
+
+
+class Command(QueueWorkerCommand):
+    help = "Send the emails queued by the site, retrying failures with backoff"
+    default_interval = 5
+    batch_message = "Sent {succeeded} email(s), {failed} failed"
+    summary_message = "Outbox run finished: {succeeded} sent, {failed} failed"
+
+    def process(self, batch_size):
+        return process_pending(batch_size)
@@ -0,0 +1,16 @@
+"""
+Work through queued Google Calendar changes for bookings
+"""
+
+from home.calendar_sync import process_pending
+from home.queue import QueueWorkerCommand
+
+
+class Command(QueueWorkerCommand):
+    help = "Create, update and delete booking calendar events queued by the site"
+    default_interval = 10
+    batch_message = "Synced {succeeded} calendar task(s), {failed} failed"
+    summary_message = "Calendar sync finished: {succeeded} succeeded, {failed} failed"
+
+    def process(self, batch_size):
+        return process_pending(batch_size)
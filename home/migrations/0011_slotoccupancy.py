@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:53
+
+from django.db import migrations, models
+
+
+def populate_slot_occupancy(apps, schema_editor):
+    """Fill SlotOccupancy from existing confirmed group walk bookings"""
+    GroupWalk = apps.get_model('home', 'GroupWalk')
+    SlotOccupancy = apps.get_model('home', 'SlotOccupancy')
+
+    rows = GroupWalk.objects.filter(status='confirmed').order_by().values(
+        'booking_date', 'time_slot'
+    ).annotate(total=models.Sum('number_of_dogs'))
+
+    SlotOccupancy.objects.bulk_create([
+        SlotOccupancy(date=row['booking_date'], time_slot=row['time_slot'], booked_dogs=row['total'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0010_alter_groupwalk_number_of_dogs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time_slot', models.CharField(choices=[('09:30-11:30', '09:30 AM - 11:30 PM'), ('14:00-16:00', '2:00 PM - 4:00 PM'), ('18:00-20:00', '6:00 PM - 8:00 PM')], max_length=30)),
+                ('booked_dogs', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Slot Occupancy',
+                'verbose_name_plural': 'Slot Occupancy',
+                'ordering': ['date', 'time_slot'],
+                'unique_together': {('date', 'time_slot')},
+            },
+        ),
+        migrations.RunPython(populate_slot_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:12
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Slot manager columns for each time slot, and the capacity they defaulted to
+SLOT_COLUMNS = {
+    '09:30-11:30': ('morning_slot_available', 'morning_slot_capacity'),
+    '14:00-16:00': ('afternoon_slot_available', 'afternoon_slot_capacity'),
+    '18:00-20:00': ('evening_slot_available', 'evening_slot_capacity'),
+}
+DEFAULT_CAPACITY = 4
+
+
+def copy_slot_columns(apps, schema_editor):
+    """Create an override for every slot manager column that differs from the default"""
+    GroupWalkSlotManager = apps.get_model('home', 'GroupWalkSlotManager')
+    SlotOverride = apps.get_model('home', 'SlotOverride')
+
+    overrides = []
+    for slot_manager in GroupWalkSlotManager.objects.all():
+        for time_slot, (available_field, capacity_field) in SLOT_COLUMNS.items():
+            is_available = getattr(slot_manager, available_field)
+            capacity = getattr(slot_manager, capacity_field)
+            if is_available and capacity == DEFAULT_CAPACITY:
+                continue
+            overrides.append(SlotOverride(
+                slot_manager=slot_manager,
+                time_slot=time_slot,
+                is_available=is_available,
+                capacity=None if capacity == DEFAULT_CAPACITY else capacity,
+            ))
+
+    SlotOverride.objects.bulk_create(overrides)
+
+
+def restore_slot_columns(apps, schema_editor):
+    """Write overrides back to the slot manager columns"""
+    GroupWalkSlotManager = apps.get_model('home', 'GroupWalkSlotManager')
+    SlotOverride = apps.get_model('home', 'SlotOverride')
+
+    for override in SlotOverride.objects.filter(time_slot__in=SLOT_COLUMNS):
+        available_field, capacity_field = SLOT_COLUMNS[override.time_slot]
+        GroupWalkSlotManager.objects.filter(pk=override.slot_manager_id).update(**{
+            available_field: override.is_available,
+            capacity_field: DEFAULT_CAPACITY if override.capacity is None else override.capacity,
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0011_slotoccupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_slot', models.CharField(choices=[('09:30-11:30', '09:30 AM - 11:30 PM'), ('14:00-16:00', '2:00 PM - 4:00 PM'), ('18:00-20:00', '6:00 PM - 8:00 PM')], max_length=30)),
+                ('is_available', models.BooleanField(default=True, help_text='Whether this slot can be booked on this date')),
+                ('capacity', models.IntegerField(blank=True, help_text='Maximum dogs for this slot (0-6) - leave blank for the usual capacity', null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(6)])),
+                ('slot_manager', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_overrides', to='home.groupwalkslotmanager')),
+            ],
+            options={
+                'verbose_name': 'Slot Override',
+                'verbose_name_plural': 'Slot Overrides',
+                'ordering': ['slot_manager__date', 'time_slot'],
+                'unique_together': {('slot_manager', 'time_slot')},
+            },
+        ),
+        migrations.RunPython(copy_slot_columns, restore_slot_columns),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0012_slotoverride'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='groupwalkslotmanager',
+            name='afternoon_slot_available',
+        ),
+        migrations.RemoveField(
+            model_name='groupwalkslotmanager',
+            name='afternoon_slot_capacity',
+        ),
+        migrations.RemoveField(
+            model_name='groupwalkslotmanager',
+            name='evening_slot_available',
+        ),
+        migrations.RemoveField(
+            model_name='groupwalkslotmanager',
+            name='evening_slot_capacity',
+        ),
+        migrations.RemoveField(
+            model_name='groupwalkslotmanager',
+            name='morning_slot_available',
+        ),
+        migrations.RemoveField(
+            model_name='groupwalkslotmanager',
+            name='morning_slot_capacity',
+        ),
+    ]
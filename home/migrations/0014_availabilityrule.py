@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_remove_groupwalkslotmanager_slot_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text="Shown to customers as the reason, e.g. 'Closed on Mondays'", max_length=100)),
+                ('weekdays', models.CharField(blank=True, help_text='Days of the week the rule applies to (0 = Monday, comma separated) - blank for every day', max_length=20)),
+                ('months', models.CharField(blank=True, help_text='Months the rule applies to (1 = January, comma separated) - blank for every month', max_length=40)),
+                ('time_slots', models.CharField(blank=True, help_text='Time slots closed by the rule (comma separated) - blank for every slot', max_length=200)),
+                ('start_date', models.DateField(blank=True, help_text='First date the rule applies - blank for no limit', null=True)),
+                ('end_date', models.DateField(blank=True, help_text='Last date the rule applies - blank for no limit', null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Availability Rule',
+                'verbose_name_plural': 'Availability Rules',
+                'ordering': ['name'],
+            },
+        ),
+    ]
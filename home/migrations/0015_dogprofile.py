@@ -0,0 +1,159 @@
+# Generated by Django 5.2.4 on 2026-10-17 11:02
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def match_key(name):
+    return ' '.join((name or '').split()).casefold()
+
+
+DETAIL_FIELDS = [
+    'name', 'breed', 'age', 'allergies', 'special_instructions', 'good_with_other_dogs',
+    'behavioral_notes', 'vet_name', 'vet_phone', 'vet_address',
+]
+
+
+def dogs_to_profiles(apps, schema_editor):
+    """
+    Collapse the per-booking Dog copies into one DogProfile per owner and dog
+
+    Dogs are matched on the booking's customer email (lowercased) and the dog's
+    name ignoring case and spacing. Rows are read oldest first so the profile
+    ends up with the most recent details. Dogs with no booking keep a profile
+    each, with no owner.
+    """
+    Dog = apps.get_model('home', 'Dog')
+    DogProfile = apps.get_model('home', 'DogProfile')
+    GroupWalk = apps.get_model('home', 'GroupWalk')
+    IndividualWalk = apps.get_model('home', 'IndividualWalk')
+
+    profiles = {}
+    group_links = set()
+    individual_links = set()
+    dogs = Dog.objects.select_related('group_walk', 'individual_walk').order_by('created_at', 'id')
+    for dog in dogs.iterator(chunk_size=2000):
+        booking = dog.group_walk or dog.individual_walk
+        if booking:
+            key = (booking.customer_email.strip().lower(), match_key(dog.name))
+        else:
+            key = ('', dog.id)
+
+        profile = profiles.get(key)
+        if profile is None:
+            profile = profiles[key] = DogProfile(
+                owner_email=key[0],
+                owner_name=booking.customer_name if booking else '',
+                created_at=dog.created_at,
+            )
+        for field in DETAIL_FIELDS:
+            setattr(profile, field, getattr(dog, field))
+        if booking:
+            profile.owner_name = booking.customer_name
+        profile.updated_at = dog.created_at
+
+        if dog.group_walk_id:
+            group_links.add((dog.group_walk_id, key))
+        if dog.individual_walk_id:
+            individual_links.add((dog.individual_walk_id, key))
+
+    if not profiles:
+        return
+
+    created = DogProfile.objects.bulk_create(profiles.values(), batch_size=500)
+    if created[0].pk is None:
+        # No primary keys back from the bulk insert - read them back in insertion order
+        for profile, pk in zip(created, DogProfile.objects.order_by('id').values_list('id', flat=True)):
+            profile.pk = pk
+    # auto_now_add/auto_now stamped the migration time - keep when the dog was first booked
+    DogProfile.objects.bulk_update(created, ['created_at', 'updated_at'], batch_size=500)
+
+    GroupWalk.dogs.through.objects.bulk_create([
+        GroupWalk.dogs.through(groupwalk_id=booking_id, dogprofile_id=profiles[key].pk)
+        for booking_id, key in group_links
+    ], batch_size=1000)
+    IndividualWalk.dogs.through.objects.bulk_create([
+        IndividualWalk.dogs.through(individualwalk_id=booking_id, dogprofile_id=profiles[key].pk)
+        for booking_id, key in individual_links
+    ], batch_size=1000)
+
+
+def profiles_to_dogs(apps, schema_editor):
+    """Give every booking its own Dog copy of each linked profile again"""
+    Dog = apps.get_model('home', 'Dog')
+    GroupWalk = apps.get_model('home', 'GroupWalk')
+    IndividualWalk = apps.get_model('home', 'IndividualWalk')
+
+    dogs = []
+    for link in GroupWalk.dogs.through.objects.select_related('dogprofile').iterator(chunk_size=2000):
+        dogs.append(Dog(
+            group_walk_id=link.groupwalk_id,
+            **{field: getattr(link.dogprofile, field) for field in DETAIL_FIELDS}
+        ))
+    for link in IndividualWalk.dogs.through.objects.select_related('dogprofile').iterator(chunk_size=2000):
+        dogs.append(Dog(
+            individual_walk_id=link.individualwalk_id,
+            **{field: getattr(link.dogprofile, field) for field in DETAIL_FIELDS}
+        ))
+    Dog.objects.bulk_create(dogs, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0014_availabilityrule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DogProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner_email', models.EmailField(db_index=True, help_text='Stored lowercase so bookings find the same profile', max_length=254)),
+                ('owner_name', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=50)),
+                ('breed', models.CharField(max_length=100)),
+                ('age', models.IntegerField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(30)])),
+                ('allergies', models.TextField(blank=True, help_text='Any allergies or health concerns', null=True)),
+                ('special_instructions', models.TextField(blank=True, help_text='Special care instructions', null=True)),
+                ('good_with_other_dogs', models.BooleanField(default=True, help_text='Important for group walks - uncheck if your dog has issues with other dogs')),
+                ('behavioral_notes', models.TextField(blank=True, help_text='Any behavioral concerns, triggers, or special handling requirements', null=True)),
+                ('vet_name', models.CharField(help_text='Name of your vet practice', max_length=100)),
+                ('vet_phone', models.CharField(help_text='Vet practice phone number', max_length=20)),
+                ('vet_address', models.TextField(help_text='Vet practice address')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Dog',
+                'verbose_name_plural': 'Dogs',
+                'ordering': ['name'],
+            },
+        ),
+        # Free the 'dogs' name on the bookings for the new many-to-many fields
+        migrations.AlterField(
+            model_name='dog',
+            name='group_walk',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='legacy_dogs', to='home.groupwalk'),
+        ),
+        migrations.AlterField(
+            model_name='dog',
+            name='individual_walk',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='legacy_dogs', to='home.individualwalk'),
+        ),
+        migrations.AddField(
+            model_name='groupwalk',
+            name='dogs',
+            field=models.ManyToManyField(blank=True, related_name='group_walks', to='home.dogprofile'),
+        ),
+        migrations.AddField(
+            model_name='individualwalk',
+            name='dogs',
+            field=models.ManyToManyField(blank=True, related_name='individual_walks', to='home.dogprofile'),
+        ),
+        migrations.RunPython(dogs_to_profiles, profiles_to_dogs),
+        migrations.DeleteModel(
+            name='Dog',
+        ),
+    ]
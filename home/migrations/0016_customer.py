@@ -0,0 +1,95 @@
+# Generated by Django 5.2.4 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BOOKING_FIELDS = ['id', 'customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_postcode', 'created_at']
+
+
+def backfill_customers(apps, schema_editor):
+    """
+    Create a Customer for every email in the existing bookings and link the bookings
+
+    Emails are matched stripped and lowercase. Bookings are read oldest first
+    so each customer ends up with their most recent contact details.
+    """
+    Customer = apps.get_model('home', 'Customer')
+    booking_models = [apps.get_model('home', 'GroupWalk'), apps.get_model('home', 'IndividualWalk')]
+
+    rows = []
+    for model in booking_models:
+        rows.extend((row, model) for row in model.objects.values(*BOOKING_FIELDS).iterator(chunk_size=2000))
+    rows.sort(key=lambda item: (item[0]['created_at'], item[0]['id']))
+
+    customers = {}
+    links = []
+    for row, model in rows:
+        email = (row['customer_email'] or '').strip().lower()
+        if not email:
+            continue
+        customer = customers.get(email)
+        if customer is None:
+            customer = customers[email] = Customer(email=email, created_at=row['created_at'])
+        customer.name = row['customer_name']
+        customer.phone = row['customer_phone']
+        customer.address = row['customer_address']
+        customer.postcode = row['customer_postcode']
+        customer.updated_at = row['created_at']
+        links.append((model, row['id'], email))
+
+    if not customers:
+        return
+
+    created = Customer.objects.bulk_create(customers.values(), batch_size=500)
+    if created[0].pk is None:
+        # No primary keys back from the bulk insert - read them back by email
+        ids = dict(Customer.objects.values_list('email', 'id'))
+        for customer in created:
+            customer.pk = ids[customer.email]
+    # auto_now_add/auto_now stamped the migration time - keep when they first booked
+    Customer.objects.bulk_update(created, ['created_at', 'updated_at'], batch_size=500)
+
+    for model in booking_models:
+        model.objects.bulk_update(
+            [model(pk=booking_id, customer_id=customers[email].pk) for link_model, booking_id, email in links if link_model is model],
+            ['customer'],
+            batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0015_dogprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('phone', models.CharField(max_length=15)),
+                ('address', models.TextField()),
+                ('postcode', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='groupwalk',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_bookings', to='home.customer'),
+        ),
+        migrations.AddField(
+            model_name='individualwalk',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_bookings', to='home.customer'),
+        ),
+        migrations.RunPython(backfill_customers, migrations.RunPython.noop),
+    ]
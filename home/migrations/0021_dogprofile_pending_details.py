@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0020_availabilityversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dogprofile',
+            name='pending_details',
+            field=models.JSONField(blank=True, help_text='Details from a booking waiting for staff to review - the profile keeps its own until applied', null=True),
+        ),
+    ]
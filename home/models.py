@@ -1,14 +1,136 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, ExpressionWrapper, F, OuterRef, Q, Subquery, Value, When, prefetch_related_objects
+from django.db.models.functions import Coalesce, Greatest, NullIf
+from django.utils.functional import cached_property
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from datetime import date, timedelta
 import logging
-from django.db.models.signals import post_delete
+from contextlib import contextmanager
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from . import availability_rules, slot_catalogue
+from .availability_cache import discard_pending_bump, schedule_version_bump
 
 logger = logging.getLogger(__name__)
 
+
+@contextmanager
+def write_transaction():
+    """
+    transaction.atomic() for the booking write paths, which read and then write
+
+    On SQLite a transaction normally starts DEFERRED and only asks for the
+    write lock at its first write. If another booking took the lock in the
+    meantime SQLite can't wait for it, and the booking fails with "database
+    is locked". So the outermost block begins IMMEDIATE and queues for the
+    write lock up front. Every other transaction keeps the default, and
+    other databases are unaffected. If the outermost block rolls back, the
+    availability version bump it queued is dropped with it.
+    """
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+
+    try:
+        if connection.vendor != 'sqlite':
+            with transaction.atomic():
+                yield
+            return
+
+        # Connecting resets transaction_mode from the settings, so connect first
+        connection.ensure_connection()
+        mode = connection.transaction_mode
+        connection.transaction_mode = 'IMMEDIATE'
+        try:
+            with transaction.atomic():
+                connection.transaction_mode = mode
+                yield
+        finally:
+            connection.transaction_mode = mode
+    except BaseException:
+        # Rolled back, so nothing it changed is waiting to be bumped
+        discard_pending_bump(connection.alias)
+        raise
+
+class Customer(models.Model):
+    """A customer, found by email - every booking they make links here"""
+
+    # Stored stripped and lowercase, so the unique index finds the customer whatever case they type
+    email = models.EmailField(unique=True)
+    name = models.CharField(max_length=100)
+    phone = models.CharField(max_length=15)
+    address = models.TextField()
+    postcode = models.CharField(max_length=20)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} <{self.email}>"
+
+    @staticmethod
+    def normalize_email(email):
+        return (email or '').strip().lower()
+
+    @staticmethod
+    def normalize_postcode(postcode):
+        return ''.join((postcode or '').split()).upper()
+
+    @classmethod
+    def from_booking(cls, booking):
+        """
+        Get the customer for a booking's email, creating them from the booking if new
+
+        Anyone can book with any email, so a booking never changes a stored
+        customer's contact details - otherwise it could take over their
+        postcode and with it the returning customer lookup. The details the
+        booking was made with stay on the booking itself; staff update the
+        customer in the admin.
+
+        Returns:
+            Customer: The existing or newly created customer
+        """
+        customer, created = cls.objects.get_or_create(
+            email=cls.normalize_email(booking.customer_email),
+            defaults={
+                'name': booking.customer_name,
+                'phone': booking.customer_phone,
+                'address': booking.customer_address,
+                'postcode': booking.customer_postcode,
+            }
+        )
+        return customer
+
+    @classmethod
+    def find_returning(cls, email, postcode):
+        """
+        Find a customer by email, but only if the postcode matches too
+
+        Returns:
+            Customer: The customer, or None if there's no match on both
+        """
+        customer = cls.objects.filter(email=cls.normalize_email(email)).first()
+        if customer is None or cls.normalize_postcode(customer.postcode) != cls.normalize_postcode(postcode):
+            return None
+        return customer
+
+    def bookings(self):
+        """All of the customer's group and individual walks, newest first"""
+        bookings = list(self.groupwalk_bookings.all()) + list(self.individualwalk_bookings.all())
+        return sorted(bookings, key=lambda booking: booking.created_at, reverse=True)
+
+    @property
+    def dogs(self):
+        return DogProfile.objects.filter(owner_email=self.email)
+
+
 class BaseBooking(models.Model):
     """Abstract base model for common booking fields."""
 
@@ -22,6 +144,15 @@ class BaseBooking(models.Model):
         help_text="We serve within 10 miles of Croyde, North Devon (EX31-EX34 postcodes)"
     )
 
+    # Returning customers are found through here rather than by scanning customer_email
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='%(class)s_bookings'
+    )
+
     # Booking Details
     number_of_dogs = models.IntegerField(validators=[MinValueValidator(1)])
 
@@ -31,6 +162,10 @@ class BaseBooking(models.Model):
 
     class Meta:
         abstract = True
+
+    def link_customer(self):
+        """Link the booking to the Customer for its email, creating them if new"""
+        self.customer = Customer.from_booking(self)
     
     def clean_postcode(self):
         """Validate postcode is in service area"""
@@ -91,13 +226,15 @@ class BookingSettings(models.Model):
         settings, created = cls.objects.get_or_create(pk=1)
         return settings 
 
+    @classmethod
+    async def aget_settings(cls):
+        """ Async version of get_settings """
+        settings, created = await cls.objects.aget_or_create(pk=1)
+        return settings
+
 class GroupWalk(BaseBooking):
-    # UPDATED TIME SLOT CHOICES - New times as requested
-    TIME_SLOT_CHOICES = [
-        ('09:30-11:30', '09:30 AM - 11:30 PM'),
-        ('14:00-16:00', '2:00 PM - 4:00 PM'),
-        ('18:00-20:00', '6:00 PM - 8:00 PM'),  # NEW EVENING SLOT
-    ]
+    # Time slots are defined once in the slot catalogue
+    TIME_SLOT_CHOICES = slot_catalogue.TIME_SLOT_CHOICES
 
     STATUS_CHOICES = [
         ('confirmed', 'Confirmed'),
@@ -115,6 +252,9 @@ class GroupWalk(BaseBooking):
     # Google Calendar Event ID (for integration)
     calendar_event_id = models.CharField(max_length=255, blank=True, null=True)
 
+    # The customer's dogs on this walk
+    dogs = models.ManyToManyField('DogProfile', related_name='group_walks', blank=True)
+
     # Simple batch ID to group multiple bookings
     batch_id = models.CharField(
         max_length=50,
@@ -123,6 +263,9 @@ class GroupWalk(BaseBooking):
         help_text="Groups multiple bookings made together" 
     )
 
+    # Set once reserve_slot has counted this unsaved booking's dogs
+    slot_reserved = False
+
     class Meta:
         ordering = ['-booking_date', 'time_slot']
         verbose_name = "Group Walk Booking"
@@ -131,9 +274,11 @@ class GroupWalk(BaseBooking):
     def __str__(self):
         return f"{self.customer_name} - Group Walk - {self.booking_date} {self.get_time_slot_display()}"
     
-    def save(self, *args, **kwargs):
+    def validate_booking(self, booking_settings=None):
+        """Check the booking against the site-wide booking settings and date rules"""
         # Get booking settings for validation
-        booking_settings = BookingSettings.get_settings()
+        if booking_settings is None:
+            booking_settings = BookingSettings.get_settings()
 
         # Validate number of dogs against settings
         if self.number_of_dogs > booking_settings.max_dogs_per_booking:
@@ -144,87 +289,207 @@ class GroupWalk(BaseBooking):
         # Validate booking date
         if self.booking_date and self.booking_date <= date.today():
             raise ValidationError("Cannot book walks for past dates.")
+
+    def save(self, *args, **kwargs):
+        self.validate_booking()
         
-        # Auto-confirm group walks if there's space
-        if not self.pk:
-            available_spots = self.get_available_spots_for_slot()
-            if self.number_of_dogs <= available_spots:
+        # Only track occupancy when a field that affects it may have changed
+        update_fields = kwargs.get('update_fields')
+        tracks_occupancy = update_fields is None or bool(
+            {'booking_date', 'time_slot', 'status', 'number_of_dogs'} & set(update_fields)
+        )
+
+        with write_transaction():
+            if not self.pk:
+                # Auto-confirm group walks if there's space - the reservation already counts the dogs
+                if not self.slot_reserved:
+                    self.reserve_slot()
                 self.status = 'confirmed'
+                if not self.customer_id:
+                    self.link_customer()
+                super().save(*args, **kwargs)
             else:
-                raise ValidationError(
-                    f"Not enough space available. Only {available_spots} spots remaining "
-                    f"for {self.get_time_slot_display()} on {self.booking_date}. "
-                    f"You're trying to book {self.number_of_dogs} dog{'s' if self.number_of_dogs > 1 else ''}."
-                )
-        
-        super().save(*args, **kwargs)
+                previous = None
+                if tracks_occupancy:
+                    previous = GroupWalk.objects.filter(pk=self.pk).values(
+                        'booking_date', 'time_slot', 'status', 'number_of_dogs'
+                    ).first()
+
+                super().save(*args, **kwargs)
+                if tracks_occupancy:
+                    self.sync_slot_occupancy(previous)
         
         # Create calendar event after saving if this is a new confirmed booking
         #if not kwargs.get('update_fields') and self.status == 'confirmed' and not self.calendar_event_id:
         #    self.create_calendar_event()
     
+    @classmethod
+    def create_many(cls, bookings, dog_details):
+        """
+        Insert new bookings and link them to the customer's dogs with one bulk_create each
+
+        The bookings share one customer, so every booking links to the same
+        DogProfile rows - found or created once by DogProfile.for_owner. The
+        dogs are cached on each booking, so booking.dogs.all() in emails,
+        calendar events and the response doesn't query again.
+
+        Args:
+            bookings: Unsaved GroupWalk bookings for one customer - any not yet
+                reserved with reserve_slot are reserved here
+            dog_details: Dict of DogProfile field values for each dog
+
+        Returns:
+            list: The saved bookings
+
+        Raises:
+            ValidationError: If a booking breaks the booking rules or its slot is full
+        """
+        booking_settings = BookingSettings.get_settings()
+
+        with write_transaction():
+            for booking in bookings:
+                booking.validate_booking(booking_settings)
+                booking.status = 'confirmed'
+            cls.reserve_slots([booking for booking in bookings if not booking.slot_reserved])
+
+            # One customer made every booking
+            customer = Customer.from_booking(bookings[0])
+            for booking in bookings:
+                if not booking.customer_id:
+                    booking.customer = customer
+
+            if connection.features.can_return_rows_from_bulk_insert:
+                cls.objects.bulk_create(bookings)
+            else:
+                # No primary keys back from a bulk insert - the dogs need them
+                for booking in bookings:
+                    super(GroupWalk, booking).save()
+
+            # Two dogs given the same name are the same profile
+            dogs = list(dict.fromkeys(
+                DogProfile.for_owner(bookings[0].customer_email, bookings[0].customer_name, dog_details)
+            ))
+            cls.dogs.through.objects.bulk_create([
+                cls.dogs.through(groupwalk_id=booking.pk, dogprofile_id=dog.pk)
+                for booking in bookings
+                for dog in dogs
+            ])
+
+        # One query loads the dogs for every booking, for the confirmation emails
+        prefetch_related_objects(bookings, 'dogs')
+        return bookings
+
+    def reserve_slot(self):
+        """
+        Reserve this booking's dogs on its slot with a single conditional UPDATE
+
+        The reservation is its own statement, so it can be made and committed
+        before a long booking transaction - call release_slot if the booking
+        is then abandoned. save() reserves automatically unless this was done.
+
+        Raises:
+            ValidationError: If the slot doesn't have room for the dogs
+        """
+        GroupWalk.reserve_slots([self])
+
+    @classmethod
+    def reserve_slots(cls, bookings):
+        """
+        Reserve the dogs for several unsaved bookings in one short transaction
+
+        Capacities are loaded once for all the slots, and either every
+        reservation is made or none are.
+
+        Raises:
+            ValidationError: If any slot doesn't have room for its dogs
+        """
+        from .availability import slot_capacity
+
+        slots = [(booking.booking_date, booking.time_slot) for booking in bookings]
+        overrides = SlotOverride.for_slots(slots)
+        rules = AvailabilityRule.load()
+
+        with write_transaction():
+            for booking in bookings:
+                capacity = slot_capacity(booking.booking_date, booking.time_slot, overrides, rules) or 0
+                if not SlotOccupancy.reserve(booking.booking_date, booking.time_slot, booking.number_of_dogs, capacity):
+                    available_spots = max(0, capacity - SlotOccupancy.booked_for(booking.booking_date, booking.time_slot))
+                    raise ValidationError(
+                        f"Not enough space available. Only {available_spots} spots remaining "
+                        f"for {booking.get_time_slot_display()} on {booking.booking_date}. "
+                        f"You're trying to book {booking.number_of_dogs} dog{'s' if booking.number_of_dogs > 1 else ''}."
+                    )
+
+        for booking in bookings:
+            booking.slot_reserved = True
+
+    def release_slot(self):
+        """Give back a reservation made with reserve_slot for a booking that was never saved"""
+        if self.slot_reserved:
+            SlotOccupancy.release(self.booking_date, self.time_slot, self.number_of_dogs)
+            self.slot_reserved = False
+
+    def sync_slot_occupancy(self, previous=None):
+        """Apply the change in this booking's confirmed dogs to SlotOccupancy"""
+        deltas = {}
+        if previous and previous['status'] == 'confirmed':
+            key = (previous['booking_date'], previous['time_slot'])
+            deltas[key] = deltas.get(key, 0) - previous['number_of_dogs']
+        if self.status == 'confirmed':
+            key = (self.booking_date, self.time_slot)
+            deltas[key] = deltas.get(key, 0) + self.number_of_dogs
+
+        for (booking_date, time_slot), delta in deltas.items():
+            if delta < 0:
+                # Cancelled, completed, moved away or fewer dogs
+                SlotOccupancy.release(booking_date, time_slot, -delta)
+            elif delta:
+                SlotOccupancy.adjust(booking_date, time_slot, delta)
+
+        # A moved booking also frees up its old slot
+        if deltas:
+            schedule_version_bump(deltas.keys())
+
+    def get_slot_capacity(self):
+        """Get the dog capacity of this booking's date/time slot (0 when the slot is closed)"""
+        from .availability import slot_capacity
+
+        slot = (self.booking_date, self.time_slot)
+        max_capacity = slot_capacity(
+            self.booking_date, self.time_slot, SlotOverride.for_slots([slot]), AvailabilityRule.load()
+        )
+        return max_capacity or 0
+
     def get_available_spots_for_slot(self):
-        """Get available spots for this specific date/time slot"""
-        total_booked = GroupWalk.objects.filter(
-            booking_date=self.booking_date,
-            time_slot=self.time_slot,
-            status='confirmed',
-        ).exclude(pk=self.pk if self.pk else None).aggregate(
-            total=models.Sum('number_of_dogs')
-        )['total'] or 0
-
-        return 4 - total_booked
+        """Get available spots for this specific date/time slot (0 when the slot is closed)"""
+        max_capacity = self.get_slot_capacity()
+        if not max_capacity:
+            return 0
+
+        total_booked = SlotOccupancy.booked_for(self.booking_date, self.time_slot)
+
+        # Don't count this booking against itself
+        if self.pk and self.status == 'confirmed':
+            total_booked -= self.number_of_dogs
+
+        return max_capacity - total_booked
     
     def create_calendar_event(self):
-        """Create Google Calendar event for this booking"""
-        try:
-            from .calendar_service import GoogleCalendarService
-            calendar_service = GoogleCalendarService()
-            event_id = calendar_service.create_group_walk_event(self)
-            
-            if event_id:
-                self.calendar_event_id = event_id
-                GroupWalk.objects.filter(pk=self.pk).update(calendar_event_id=event_id)
-                logger.info(f"Calendar event created for group walk booking {self.pk}: {event_id}")
-            else:
-                logger.warning(f"Failed to create calendar event for group walk booking {self.pk}")
-                
-        except Exception as e:
-            logger.error(f"Error creating calendar event for group walk booking {self.pk}: {str(e)}")
+        """Queue creation of the Google Calendar event for this booking"""
+        if not self.calendar_event_id:
+            CalendarSyncTask.enqueue([self], 'create')
     
     def update_calendar_event(self):
-        """Update existing calendar event"""
+        """Queue an update of the existing calendar event"""
         if self.calendar_event_id:
-            try:
-                from .calendar_service import GoogleCalendarService
-                calendar_service = GoogleCalendarService()
-                updated_event_id = calendar_service.update_event(self.calendar_event_id, self)
-                
-                if updated_event_id:
-                    logger.info(f"Calendar event updated for group walk booking {self.pk}: {updated_event_id}")
-                else:
-                    logger.warning(f"Failed to update calendar event for group walk booking {self.pk}")
-                    
-            except Exception as e:
-                logger.error(f"Error updating calendar event for group walk booking {self.pk}: {str(e)}")
+            CalendarSyncTask.enqueue([self], 'update')
     
     def delete_calendar_event(self):
-        """Delete calendar event when booking is cancelled"""
+        """Queue deletion of the calendar event when booking is cancelled"""
         if self.calendar_event_id:
-            try:
-                from .calendar_service import GoogleCalendarService
-                calendar_service = GoogleCalendarService()
-                deleted = calendar_service.delete_event(self.calendar_event_id)
-                
-                if deleted:
-                    self.calendar_event_id = None
-                    GroupWalk.objects.filter(pk=self.pk).update(calendar_event_id=None)
-                    logger.info(f"Calendar event deleted for group walk booking {self.pk}")
-                else:
-                    logger.warning(f"Failed to delete calendar event for group walk booking {self.pk}")
-                    
-            except Exception as e:
-                logger.error(f"Error deleting calendar event for group walk booking {self.pk}: {str(e)}")
+            CalendarSyncTask.enqueue([self], 'delete')
+            self.calendar_event_id = None
+            GroupWalk.objects.filter(pk=self.pk).update(calendar_event_id=None)
     
     def cancel(self, reason=""):
         """Cancel the booking and remove calendar event"""
@@ -234,68 +499,10 @@ class GroupWalk(BaseBooking):
         logger.info(f"Group walk booking {self.pk} cancelled. Reason: {reason}")
     
     @classmethod
-    def get_available_slots(cls, days_ahead=180, required_dogs=1):
-        """Get all available slots for the next x days that can accommodate required_dogs"""
-        available_slots = []
-        start_date = date.today() + timedelta(days=1)  # Start from tomorrow
-
-        # Get booking settings
-        booking_settings = BookingSettings.get_settings()
-
-        for i in range(days_ahead):
-            check_date = start_date + timedelta(days=i)
-
-            if not booking_settings.allow_weekend_bookings and check_date.weekday() >= 5:
-                continue
-            
-            # Skip if this date has slot manager restrictions
-            slot_manager = GroupWalkSlotManager.objects.filter(date=check_date).first()
-
-            for time_slot, time_display in cls.TIME_SLOT_CHOICES:
-                # Filter out evening slot if disabled in settings
-                if not booking_settings.allow_evening_slot and time_slot == '18:00-20:00':
-                    continue
-
-                # Check if slot is available via slot manager
-                if slot_manager:
-                    if time_slot == '09:30-11:30' and not slot_manager.morning_slot_available:
-                        continue
-                    if time_slot == '14:00-16:00' and not slot_manager.afternoon_slot_available:
-                        continue
-                    if time_slot == '18:00-20:00' and not slot_manager.evening_slot_available:
-                        continue
-                    
-                    # Use custom capacity if set
-                    if time_slot == '09:30-11:30':
-                        max_capacity = slot_manager.morning_slot_capacity
-                    elif time_slot == '14:00-16:00':
-                        max_capacity = slot_manager.afternoon_slot_capacity
-                    else:  # evening slot
-                        max_capacity = slot_manager.evening_slot_capacity
-                else:
-                    max_capacity = booking_settings.max_dogs_per_booking
-
-                # Calculate current bookings
-                total_booked = cls.objects.filter(
-                    booking_date=check_date,
-                    time_slot=time_slot,
-                    status='confirmed'
-                ).aggregate(total=models.Sum('number_of_dogs'))['total'] or 0
-
-                available_spots = max_capacity - total_booked
-
-                # Only include if can accommodate the required number of dogs
-                if available_spots >= required_dogs:
-                    available_slots.append({
-                        'date': check_date,
-                        'time_slot': time_slot,
-                        'time_display': time_display,
-                        'available_spots': available_spots,
-                        'can_book': True,
-                        'is_full': False,
-                    })
-                
-        return available_slots
+    def get_available_slots(cls, days_ahead=180, required_dogs=1, start_date=None):
+        """Get all available slots for x days from start_date (default tomorrow) that can accommodate required_dogs"""
+        from .availability import get_available_slots
+        return get_available_slots(days_ahead=days_ahead, required_dogs=required_dogs, start_date=start_date)
 
     @classmethod
     def get_batch_bookings(cls, batch_id):
@@ -317,11 +524,7 @@ class GroupWalk(BaseBooking):
     @property
     def total_dogs_in_slot(self):
         """Get total number of dogs booked for this time slot"""
-        return GroupWalk.objects.filter(
-            booking_date=self.booking_date,
-            time_slot=self.time_slot,
-            status='confirmed'
-        ).aggregate(total=models.Sum('number_of_dogs'))['total'] or 0
+        return SlotOccupancy.booked_for(self.booking_date, self.time_slot)
     
     @property
     def dog_names(self):
@@ -359,6 +562,9 @@ class IndividualWalk(BaseBooking):
     confirmed_date = models.DateField(blank=True, null=True)
     confirmed_time = models.CharField(max_length=100, blank=True, null=True)
 
+    # The customer's dogs on this walk
+    dogs = models.ManyToManyField('DogProfile', related_name='individual_walks', blank=True)
+
     # Google Calendar Event ID (for approved bookings)
     calendar_event_id = models.CharField(max_length=255, blank=True, null=True)
 
@@ -379,15 +585,18 @@ class IndividualWalk(BaseBooking):
         if self.pk:
             old_instance = IndividualWalk.objects.get(pk=self.pk)
             old_status = old_instance.status
+        elif not self.customer_id:
+            self.link_customer()
         
-        super().save(*args, **kwargs)
-        
-        # Handle status changes
-        if old_status != self.status:
-            if self.status == 'approved' and not self.calendar_event_id:
-                self.create_calendar_event()
-            elif self.status in ['rejected', 'cancelled'] and self.calendar_event_id:
-                self.delete_calendar_event()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Handle status changes - the calendar work is queued with the save
+            if old_status != self.status:
+                if self.status == 'approved' and not self.calendar_event_id:
+                    self.create_calendar_event()
+                elif self.status in ['rejected', 'cancelled'] and self.calendar_event_id:
+                    self.delete_calendar_event()
     
     def approve(self, confirmed_date=None, confirmed_time=None, admin_response=""):
         """Approve the individual walk request."""
@@ -422,56 +631,21 @@ class IndividualWalk(BaseBooking):
             logger.error(f"Failed to send rejection email for individual walk {self.pk}: {str(e)}")
     
     def create_calendar_event(self):
-        """Create Google Calendar event for approved individual walk"""
-        if self.status == 'approved' and self.confirmed_date and self.confirmed_time:
-            try:
-                from .calendar_service import GoogleCalendarService
-                calendar_service = GoogleCalendarService()
-                event_id = calendar_service.create_individual_walk_event(self)
-                
-                if event_id:
-                    self.calendar_event_id = event_id
-                    IndividualWalk.objects.filter(pk=self.pk).update(calendar_event_id=event_id)
-                    logger.info(f"Calendar event created for individual walk {self.pk}: {event_id}")
-                else:
-                    logger.warning(f"Failed to create calendar event for individual walk {self.pk}")
-                    
-            except Exception as e:
-                logger.error(f"Error creating calendar event for individual walk {self.pk}: {str(e)}")
+        """Queue creation of the Google Calendar event for an approved individual walk"""
+        if self.status == 'approved' and self.confirmed_date and self.confirmed_time and not self.calendar_event_id:
+            CalendarSyncTask.enqueue([self], 'create')
     
     def update_calendar_event(self):
-        """Update existing calendar event"""
+        """Queue an update of the existing calendar event"""
         if self.calendar_event_id:
-            try:
-                from .calendar_service import GoogleCalendarService
-                calendar_service = GoogleCalendarService()
-                updated_event_id = calendar_service.update_event(self.calendar_event_id, self)
-                
-                if updated_event_id:
-                    logger.info(f"Calendar event updated for individual walk {self.pk}: {updated_event_id}")
-                else:
-                    logger.warning(f"Failed to update calendar event for individual walk {self.pk}")
-                    
-            except Exception as e:
-                logger.error(f"Error updating calendar event for individual walk {self.pk}: {str(e)}")
+            CalendarSyncTask.enqueue([self], 'update')
     
     def delete_calendar_event(self):
-        """Delete calendar event when booking is rejected/cancelled"""
+        """Queue deletion of the calendar event when booking is rejected/cancelled"""
         if self.calendar_event_id:
-            try:
-                from .calendar_service import GoogleCalendarService
-                calendar_service = GoogleCalendarService()
-                deleted = calendar_service.delete_event(self.calendar_event_id)
-                
-                if deleted:
-                    self.calendar_event_id = None
-                    IndividualWalk.objects.filter(pk=self.pk).update(calendar_event_id=None)
-                    logger.info(f"Calendar event deleted for individual walk {self.pk}")
-                else:
-                    logger.warning(f"Failed to delete calendar event for individual walk {self.pk}")
-                    
-            except Exception as e:
-                logger.error(f"Error deleting calendar event for individual walk {self.pk}: {str(e)}")
+            CalendarSyncTask.enqueue([self], 'delete')
+            self.calendar_event_id = None
+            IndividualWalk.objects.filter(pk=self.pk).update(calendar_event_id=None)
 
     def clean(self):
         """Validate that individual walk doesn't conflict with group walk times."""
@@ -546,39 +720,9 @@ class IndividualWalk(BaseBooking):
         return self.status == 'rejected'
 
 
-# Updated GroupWalkSlotManager to handle the new evening slot
 class GroupWalkSlotManager(models.Model):
-    """Admin model to manage group walk availability - UPDATED for 3 time slots"""
+    """Admin model to manage group walk availability for a date - per-slot changes live in SlotOverride"""
     date = models.DateField(unique=True)
-    morning_slot_available = models.BooleanField(
-        default=True, 
-        help_text="09:30 AM - 11:30 PM slot available"
-    )
-    afternoon_slot_available = models.BooleanField(
-        default=True, 
-        help_text="2:00 PM - 4:00 PM slot available"
-    )
-    evening_slot_available = models.BooleanField(
-        default=True, 
-        help_text="6:00 PM - 8:00 PM slot available"
-    )
-
-    # Override capacity for specific dates if needed
-    morning_slot_capacity = models.IntegerField(
-        default=4,
-        validators=[MinValueValidator(0), MaxValueValidator(6)],
-        help_text="Maximum dogs for morning slot (0-6)"
-    )
-    afternoon_slot_capacity = models.IntegerField(
-        default=4,
-        validators=[MinValueValidator(0), MaxValueValidator(6)],
-        help_text="Maximum dogs for afternoon slot (0-6)"
-    )
-    evening_slot_capacity = models.IntegerField(
-        default=4,
-        validators=[MinValueValidator(0), MaxValueValidator(6)],
-        help_text="Maximum dogs for evening slot (0-6)"
-    )
 
     notes = models.TextField(
         blank=True, 
@@ -604,107 +748,777 @@ class GroupWalkSlotManager(models.Model):
         # Validate date is not in the past
         if self.date and self.date < date.today():
             raise ValidationError("Cannot manage slots for past dates.")
-        
-        # Validate capacities
-        if self.morning_slot_capacity < 0:
-            raise ValidationError("Morning slot capacity cannot be negative.")
-        if self.afternoon_slot_capacity < 0:
-            raise ValidationError("Afternoon slot capacity cannot be negative.")
-        if self.evening_slot_capacity < 0:
-            raise ValidationError("Evening slot capacity cannot be negative.")
-    
-    @property
-    def morning_bookings_count(self):
-        """Get number of dogs booked for morning slot"""
-        return GroupWalk.objects.filter(
-            booking_date=self.date,
-            time_slot='09:30-11:30',
-            status='confirmed'
-        ).aggregate(total=models.Sum('number_of_dogs'))['total'] or 0
-    
-    @property
-    def afternoon_bookings_count(self):
-        """Get number of dogs booked for afternoon slot"""
-        return GroupWalk.objects.filter(
-            booking_date=self.date,
-            time_slot='14:00-16:00',
-            status='confirmed'
-        ).aggregate(total=models.Sum('number_of_dogs'))['total'] or 0
-    
-    @property
-    def evening_bookings_count(self):
-        """Get number of dogs booked for evening slot"""
-        return GroupWalk.objects.filter(
-            booking_date=self.date,
-            time_slot='18:00-20:00',
-            status='confirmed'
-        ).aggregate(total=models.Sum('number_of_dogs'))['total'] or 0
-    
-    @property
-    def morning_available_spots(self):
-        """Get available spots for morning slot"""
-        if not self.morning_slot_available:
-            return 0
-        return max(0, self.morning_slot_capacity - self.morning_bookings_count)
-    
+
+    @cached_property
+    def rules(self):
+        """Recurring closures in force - assign preloaded rules to avoid a query per slot manager"""
+        return AvailabilityRule.load()
+
+    @cached_property
+    def slot_states(self):
+        """(available, capacity) for every catalogue slot on this date, keyed by slot id"""
+        closed_by_rules = self.rules.closed_slots(self.date)
+        states = {
+            slot.id: (slot.id not in closed_by_rules, slot.default_capacity)
+            for slot in slot_catalogue.SLOTS
+        }
+        if self.pk:
+            for override in self.slot_overrides.all():
+                slot = slot_catalogue.get_slot(override.time_slot)
+                if slot:
+                    states[slot.id] = (override.is_available, override.effective_capacity)
+        return states
+
+    def is_slot_available(self, time_slot):
+        """Whether a slot is open on this date (reads with_booking_counts annotations when present)"""
+        slot = slot_catalogue.SLOTS_BY_ID[time_slot]
+        if hasattr(self, f'{slot.key}_available'):
+            return getattr(self, f'{slot.key}_available')
+        return self.slot_states[time_slot][0]
+
+    def slot_capacity(self, time_slot):
+        """Maximum dogs for a slot on this date (reads with_booking_counts annotations when present)"""
+        slot = slot_catalogue.SLOTS_BY_ID[time_slot]
+        if hasattr(self, f'{slot.key}_capacity'):
+            return getattr(self, f'{slot.key}_capacity')
+        return self.slot_states[time_slot][1]
+
     @property
-    def afternoon_available_spots(self):
-        """Get available spots for afternoon slot"""
-        if not self.afternoon_slot_available:
-            return 0
-        return max(0, self.afternoon_slot_capacity - self.afternoon_bookings_count)
-    
+    def unavailable_slots(self):
+        """Catalogue slots closed on this date"""
+        return [slot for slot in slot_catalogue.SLOTS if not self.is_slot_available(slot.id)]
+
     @property
-    def evening_available_spots(self):
-        """Get available spots for evening slot"""
-        if not self.evening_slot_available:
+    def is_fully_unavailable(self):
+        """Whether every slot is closed on this date"""
+        return len(self.unavailable_slots) == len(slot_catalogue.SLOTS)
+
+    def set_slots_available(self, time_slots, available):
+        """
+        Open or close slots on this date - see set_dates_available
+
+        Returns:
+            list: Slot ids whose availability actually changed
+        """
+        changed = GroupWalkSlotManager.set_dates_available([self.date], time_slots, available)
+
+        if changed:
+            self.__dict__.pop('slot_states', None)
+            if hasattr(self, '_prefetched_objects_cache'):
+                self._prefetched_objects_cache.pop('slot_overrides', None)
+        return [time_slot for check_date, time_slot in changed]
+
+    @classmethod
+    def set_dates_available(cls, dates, time_slots, available, notes=None):
+        """
+        Open or close the same slots across any number of dates in one transaction
+
+        Args:
+            dates: Dates to change
+            time_slots: Slot ids or keys to open or close on each date
+            available: True to open the slots, False to close them
+            notes: When closing, notes to store on every date
+
+        Returns:
+            list: (date, time_slot) pairs whose availability actually changed
+        """
+        time_slots = [slot.id for slot in slot_catalogue.resolve_slots(time_slots)]
+        return cls.set_slots_available_by_date(
+            {check_date: time_slots for check_date in dates},
+            available,
+            notes
+        )
+
+    @classmethod
+    def set_slots_available_by_date(cls, slots_by_date, available, notes=None):
+        """
+        Open or close slots across any number of dates in one transaction
+
+        Slot managers and overrides are written with bulk_create, bulk_update
+        and a single delete, so the query count doesn't grow with the number
+        of dates. Overrides that match what the catalogue and recurring rules
+        already give are removed so the table only holds real exceptions.
+
+        Args:
+            slots_by_date: Slot ids to open or close keyed by date
+            available: True to open the slots, False to close them
+            notes: When closing, notes to store on every date, or a dict of
+                notes keyed by date. When opening, notes are cleared from
+                dates left with every slot open.
+
+        Returns:
+            list: (date, time_slot) pairs whose availability actually changed
+        """
+        dates = sorted(slots_by_date)
+        if notes is not None and not isinstance(notes, dict):
+            notes = {check_date: notes for check_date in dates}
+        rules = AvailabilityRule.load()
+        now = timezone.now()
+
+        with transaction.atomic():
+            managers = {
+                slot_manager.date: slot_manager
+                for slot_manager in cls.objects.select_for_update().filter(date__in=dates)
+            }
+            overrides = {}
+            manager_dates = {slot_manager.pk: slot_manager.date for slot_manager in managers.values()}
+            for override in SlotOverride.objects.filter(slot_manager__in=list(managers.values())):
+                overrides[(manager_dates[override.slot_manager_id], override.time_slot)] = override
+
+            changed = []
+            to_create = []
+            to_update = []
+            to_delete = []
+            for check_date in dates:
+                for time_slot in slots_by_date[check_date]:
+                    closed_by_rule = rules.is_closed(check_date, time_slot)
+                    override = overrides.get((check_date, time_slot))
+                    current = override.is_available if override else not closed_by_rule
+                    if current == available:
+                        continue
+                    changed.append((check_date, time_slot))
+
+                    if override is None:
+                        to_create.append((check_date, time_slot))
+                    elif available != closed_by_rule and override.capacity is None:
+                        to_delete.append(override.pk)
+                        del overrides[(check_date, time_slot)]
+                    else:
+                        override.is_available = available
+                        to_update.append(override)
+
+            # Create the slot managers the new overrides hang off
+            needs_manager = {check_date for check_date, time_slot in to_create}
+            if not available and notes is not None:
+                needs_manager.update(notes)
+            missing_dates = sorted(needs_manager - set(managers))
+            if missing_dates:
+                cls.objects.bulk_create([
+                    cls(date=check_date, notes=notes.get(check_date) if not available and notes else None)
+                    for check_date in missing_dates
+                ])
+                managers.update(
+                    (slot_manager.date, slot_manager)
+                    for slot_manager in cls.objects.filter(date__in=missing_dates)
+                )
+
+            if to_create:
+                created = SlotOverride.objects.bulk_create([
+                    SlotOverride(slot_manager=managers[check_date], time_slot=time_slot, is_available=available)
+                    for check_date, time_slot in to_create
+                ])
+                for override in created:
+                    overrides[(override.slot_manager.date, override.time_slot)] = override
+            if to_update:
+                SlotOverride.objects.bulk_update(to_update, ['is_available'])
+            if to_delete:
+                # Queryset deletes skip the per-row version bump - it is scheduled below
+                SlotOverride.objects.filter(pk__in=to_delete).delete()
+
+            # Update notes on the existing slot managers
+            noted = []
+            for check_date, slot_manager in managers.items():
+                if check_date in missing_dates:
+                    continue
+                if not available and notes is not None:
+                    if check_date not in notes:
+                        continue
+                    slot_manager.notes = notes[check_date]
+                elif available and slot_manager.notes:
+                    still_closed = any(
+                        not overrides[(check_date, slot.id)].is_available
+                        if (check_date, slot.id) in overrides
+                        else rules.is_closed(check_date, slot.id)
+                        for slot in slot_catalogue.SLOTS
+                    )
+                    if still_closed:
+                        continue
+                    slot_manager.notes = ''
+                else:
+                    continue
+                slot_manager.updated_at = now
+                noted.append(slot_manager)
+            if noted:
+                cls.objects.bulk_update(noted, ['notes', 'updated_at'])
+
+            if changed:
+                schedule_version_bump(changed)
+
+        return changed
+
+    def bookings_count(self, time_slot):
+        """Get number of dogs booked for a slot (reads with_booking_counts annotations when present)"""
+        slot = slot_catalogue.SLOTS_BY_ID[time_slot]
+        if hasattr(self, f'{slot.key}_booked'):
+            return getattr(self, f'{slot.key}_booked')
+        return SlotOccupancy.booked_for(self.date, time_slot)
+
+    def available_spots(self, time_slot):
+        """Get available spots for a slot"""
+        if not self.is_slot_available(time_slot):
             return 0
-        return max(0, self.evening_slot_capacity - self.evening_bookings_count)
-    
+        return max(0, self.slot_capacity(time_slot) - self.bookings_count(time_slot))
+
     def is_fully_booked(self):
         """Check if all slots are fully booked"""
-        return (
-            (not self.morning_slot_available or self.morning_available_spots == 0) and
-            (not self.afternoon_slot_available or self.afternoon_available_spots == 0) and
-            (not self.evening_slot_available or self.evening_available_spots == 0)
+        if hasattr(self, 'fully_booked'):
+            return self.fully_booked
+        return all(
+            not self.is_slot_available(slot.id) or self.available_spots(slot.id) == 0
+            for slot in slot_catalogue.SLOTS
         )
-    
+
+    @classmethod
+    def with_booking_counts(cls, queryset=None):
+        """
+        Annotate slot managers with per-slot state and confirmed dogs in the same query
+
+        Runs one query for the recurring rules, which are folded into the
+        SQL. For each catalogue slot adds <key>_available, <key>_capacity and
+        <key>_booked (read by is_slot_available, slot_capacity and
+        bookings_count instead of a query each), plus open_capacity,
+        open_booked, utilization (percent of open capacity booked, None when
+        every slot is closed) and fully_booked.
+
+        Args:
+            queryset: Slot managers to annotate (defaults to all of them)
+
+        Returns:
+            QuerySet: The annotated slot managers
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        rules = AvailabilityRule.load()
+
+        slot_annotations = {}
+        for slot in slot_catalogue.SLOTS:
+            overrides = SlotOverride.objects.filter(slot_manager=OuterRef('pk'), time_slot=slot.id)
+            closed_by_rules = rules.closed_q(slot.id)
+            slot_annotations[f'{slot.key}_available'] = Coalesce(
+                Subquery(overrides.values('is_available')[:1]),
+                Value(True) if closed_by_rules is None else Case(
+                    When(closed_by_rules, then=Value(False)),
+                    default=Value(True),
+                    output_field=models.BooleanField()
+                )
+            )
+            slot_annotations[f'{slot.key}_capacity'] = Coalesce(
+                Subquery(overrides.values('capacity')[:1]),
+                Value(slot.default_capacity)
+            )
+            # SlotOccupancy already holds one grouped row per date and slot, so each
+            # count is a single indexed lookup rather than a sum over GroupWalk
+            slot_annotations[f'{slot.key}_booked'] = Coalesce(
+                Subquery(
+                    SlotOccupancy.objects.filter(
+                        date=OuterRef('date'),
+                        time_slot=slot.id
+                    ).values('booked_dogs')[:1]
+                ),
+                0
+            )
+        queryset = queryset.annotate(**slot_annotations)
+
+        def when_open(slot, value):
+            return Case(When(**{f'{slot.key}_available': True}, then=value), default=Value(0))
+
+        open_capacity = sum(
+            (when_open(slot, F(f'{slot.key}_capacity')) for slot in slot_catalogue.SLOTS),
+            Value(0)
+        )
+        open_booked = sum(
+            (when_open(slot, F(f'{slot.key}_booked')) for slot in slot_catalogue.SLOTS),
+            Value(0)
+        )
+        fully_booked = Q()
+        for slot in slot_catalogue.SLOTS:
+            fully_booked &= (
+                Q(**{f'{slot.key}_available': False})
+                | Q(**{f'{slot.key}_booked__gte': F(f'{slot.key}_capacity')})
+            )
+
+        return queryset.annotate(
+            open_capacity=ExpressionWrapper(open_capacity, output_field=models.IntegerField()),
+            open_booked=ExpressionWrapper(open_booked, output_field=models.IntegerField()),
+        ).annotate(
+            utilization=ExpressionWrapper(
+                F('open_booked') * 100.0 / NullIf(F('open_capacity'), 0),
+                output_field=models.FloatField()
+            ),
+            fully_booked=ExpressionWrapper(fully_booked, output_field=models.BooleanField()),
+        )
+
+    @classmethod
+    def with_closed_slots(cls, queryset=None):
+        """Annotate slot managers with closed_slots, the number of slots closed on the date"""
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.annotate(
+            closed_slots=models.Count(
+                'slot_overrides',
+                filter=Q(
+                    slot_overrides__is_available=False,
+                    slot_overrides__time_slot__in=slot_catalogue.SLOT_IDS
+                )
+            )
+        )
+
     @classmethod
     def get_or_create_for_date(cls, check_date):
         """Get or create slot manager for a specific date"""
-        slot_manager, created = cls.objects.get_or_create(
+        slot_manager, created = cls.objects.get_or_create(date=check_date)
+        return slot_manager, created
+
+
+class SlotOverride(models.Model):
+    """Availability or capacity of one slot on one date, where it differs from the slot catalogue"""
+    slot_manager = models.ForeignKey(
+        GroupWalkSlotManager,
+        on_delete=models.CASCADE,
+        related_name='slot_overrides'
+    )
+    time_slot = models.CharField(max_length=30, choices=GroupWalk.TIME_SLOT_CHOICES)
+    is_available = models.BooleanField(
+        default=True,
+        help_text="Whether this slot can be booked on this date"
+    )
+    capacity = models.IntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0), MaxValueValidator(6)],
+        help_text="Maximum dogs for this slot (0-6) - leave blank for the usual capacity"
+    )
+
+    class Meta:
+        ordering = ['slot_manager__date', 'time_slot']
+        unique_together = ['slot_manager', 'time_slot']
+        verbose_name = "Slot Override"
+        verbose_name_plural = "Slot Overrides"
+
+    def __str__(self):
+        state = 'available' if self.is_available else 'unavailable'
+        return f"{self.get_time_slot_display()}: {state}"
+
+    @property
+    def effective_capacity(self):
+        """Capacity override, or the catalogue default when none is set"""
+        if self.capacity is not None:
+            return self.capacity
+        return slot_catalogue.SLOTS_BY_ID[self.time_slot].default_capacity
+
+    @classmethod
+    def for_range(cls, start_date, end_date):
+        """Get (available, capacity) overrides for a date window keyed by (date, time_slot)"""
+        rows = cls.objects.filter(
+            slot_manager__date__range=(start_date, end_date)
+        ).values_list('slot_manager__date', 'time_slot', 'is_available', 'capacity')
+        return {(row_date, time_slot): (is_available, capacity) for row_date, time_slot, is_available, capacity in rows}
+
+    @classmethod
+    async def afor_range(cls, start_date, end_date):
+        """Async version of for_range"""
+        rows = cls.objects.filter(
+            slot_manager__date__range=(start_date, end_date)
+        ).values_list('slot_manager__date', 'time_slot', 'is_available', 'capacity')
+        return {
+            (row_date, time_slot): (is_available, capacity)
+            async for row_date, time_slot, is_available, capacity in rows
+        }
+
+    @classmethod
+    def for_slots(cls, slots):
+        """Get (available, capacity) overrides for (date, time_slot) pairs in a single query, keyed by pair"""
+        slots = set(slots)
+        rows = cls.objects.filter(
+            slot_manager__date__in={check_date for check_date, time_slot in slots}
+        ).values_list('slot_manager__date', 'time_slot', 'is_available', 'capacity')
+        return {
+            (row_date, time_slot): (is_available, capacity)
+            for row_date, time_slot, is_available, capacity in rows
+            if (row_date, time_slot) in slots
+        }
+
+    @classmethod
+    async def afor_slots(cls, slots):
+        """Async version of for_slots"""
+        slots = set(slots)
+        rows = cls.objects.filter(
+            slot_manager__date__in={check_date for check_date, time_slot in slots}
+        ).values_list('slot_manager__date', 'time_slot', 'is_available', 'capacity')
+        return {
+            (row_date, time_slot): (is_available, capacity)
+            async for row_date, time_slot, is_available, capacity in rows
+            if (row_date, time_slot) in slots
+        }
+
+
+class SlotOccupancy(models.Model):
+    """Confirmed dogs booked per group walk date and time slot, maintained alongside GroupWalk"""
+    date = models.DateField()
+    time_slot = models.CharField(max_length=30, choices=GroupWalk.TIME_SLOT_CHOICES)
+    booked_dogs = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'time_slot']
+        unique_together = ['date', 'time_slot']
+        verbose_name = "Slot Occupancy"
+        verbose_name_plural = "Slot Occupancy"
+
+    def __str__(self):
+        return f"{self.date} {self.get_time_slot_display()}: {self.booked_dogs} dogs"
+
+    @classmethod
+    def booked_for(cls, check_date, time_slot):
+        """Get number of confirmed dogs booked for a date and time slot"""
+        return cls.objects.filter(
             date=check_date,
-            defaults={
-                'morning_slot_available': True,
-                'afternoon_slot_available': True,
-                'evening_slot_available': True,
-                'morning_slot_capacity': 4,
-                'afternoon_slot_capacity': 4,
-                'evening_slot_capacity': 4,
-            }
+            time_slot=time_slot
+        ).values_list('booked_dogs', flat=True).first() or 0
+
+    @classmethod
+    def booked_for_range(cls, start_date, end_date):
+        """Get confirmed dog counts for a date window keyed by (date, time_slot)"""
+        rows = cls.objects.filter(
+            date__range=(start_date, end_date),
+            booked_dogs__gt=0
+        ).values_list('date', 'time_slot', 'booked_dogs')
+        return {(row_date, time_slot): booked_dogs for row_date, time_slot, booked_dogs in rows}
+
+    @classmethod
+    async def abooked_for_range(cls, start_date, end_date):
+        """Async version of booked_for_range"""
+        rows = cls.objects.filter(
+            date__range=(start_date, end_date),
+            booked_dogs__gt=0
+        ).values_list('date', 'time_slot', 'booked_dogs')
+        return {(row_date, time_slot): booked_dogs async for row_date, time_slot, booked_dogs in rows}
+
+    @classmethod
+    def booked_for_slots(cls, slots):
+        """Get confirmed dog counts for (date, time_slot) pairs in a single query, keyed by pair"""
+        slots = set(slots)
+        rows = cls.objects.filter(
+            date__in={check_date for check_date, time_slot in slots},
+            booked_dogs__gt=0
+        ).values_list('date', 'time_slot', 'booked_dogs')
+        return {
+            (row_date, time_slot): booked_dogs
+            for row_date, time_slot, booked_dogs in rows
+            if (row_date, time_slot) in slots
+        }
+
+    @classmethod
+    async def abooked_for_slots(cls, slots):
+        """Async version of booked_for_slots"""
+        slots = set(slots)
+        rows = cls.objects.filter(
+            date__in={check_date for check_date, time_slot in slots},
+            booked_dogs__gt=0
+        ).values_list('date', 'time_slot', 'booked_dogs')
+        return {
+            (row_date, time_slot): booked_dogs
+            async for row_date, time_slot, booked_dogs in rows
+            if (row_date, time_slot) in slots
+        }
+
+    @classmethod
+    def adjust(cls, check_date, time_slot, delta):
+        """Add delta dogs to a slot - call inside the transaction that changed the booking"""
+        updated = cls.objects.filter(
+            date=check_date,
+            time_slot=time_slot
+        ).update(booked_dogs=models.F('booked_dogs') + delta)
+
+        if not updated:
+            occupancy, created = cls.objects.get_or_create(
+                date=check_date,
+                time_slot=time_slot,
+                defaults={'booked_dogs': delta}
+            )
+            if not created:
+                cls.objects.filter(pk=occupancy.pk).update(booked_dogs=models.F('booked_dogs') + delta)
+
+    @classmethod
+    def reserve(cls, check_date, time_slot, dogs, capacity):
+        """
+        Add dogs to a slot only if they fit, as one compare-and-swap UPDATE
+
+        The capacity check and the increment are the same statement
+        (UPDATE ... SET booked_dogs = booked_dogs + dogs WHERE booked_dogs + dogs <= capacity),
+        so concurrent reservations can't both take the last spaces and no
+        lock is held beyond that one short write.
+
+        Args:
+            check_date: Date of the slot
+            time_slot: Slot id
+            dogs: Number of dogs to add
+            capacity: Most dogs the slot can take
+
+        Returns:
+            bool: True if the dogs were reserved, False if the slot is full
+        """
+        if dogs > capacity:
+            return False
+
+        slot = cls.objects.filter(date=check_date, time_slot=time_slot)
+        for attempt in range(2):
+            if slot.filter(booked_dogs__lte=capacity - dogs).update(booked_dogs=F('booked_dogs') + dogs):
+                schedule_version_bump([(check_date, time_slot)])
+                return True
+            if attempt or slot.exists():
+                return False
+            # First booking for the slot - create its counter and try again
+            cls.objects.get_or_create(date=check_date, time_slot=time_slot)
+        return False
+
+    @classmethod
+    def release(cls, check_date, time_slot, dogs):
+        """Give back dogs reserved on a slot - on cancel, completion, delete or an abandoned booking"""
+        # Never below zero, even if the same dogs are given back twice
+        cls.objects.filter(date=check_date, time_slot=time_slot).update(
+            booked_dogs=Greatest(F('booked_dogs') - dogs, Value(0))
         )
-        return slot_manager, created
+        schedule_version_bump([(check_date, time_slot)])
 
+    @classmethod
+    def adjust_many(cls, deltas):
+        """
+        Add dogs to many slots in a single UPDATE - call inside the transaction that changed the bookings
+
+        Args:
+            deltas: Change in confirmed dogs keyed by (date, time_slot). Only
+                existing rows are updated, so use adjust to add dogs to a new slot.
+        """
+        deltas = {slot: delta for slot, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        matches = Q()
+        for check_date, time_slot in deltas:
+            matches |= Q(date=check_date, time_slot=time_slot)
+
+        cls.objects.filter(matches).update(booked_dogs=Greatest(
+            F('booked_dogs') + Case(
+                *[
+                    When(date=check_date, time_slot=time_slot, then=Value(delta))
+                    for (check_date, time_slot), delta in deltas.items()
+                ],
+                default=Value(0),
+                output_field=models.IntegerField()
+            ),
+            Value(0)
+        ))
 
-# Rest of the models remain the same...
-class Dog(models.Model):
-    """Dog details - can belong to either group or individual walk"""
+    @classmethod
+    def rebuild(cls, repair=True):
+        """
+        Compare the table against confirmed GroupWalk bookings
+
+        Returns a list of (date, time_slot, stored, actual) for every slot that has
+        drifted. When repair is True the drifted rows are corrected.
+        """
+        with transaction.atomic():
+            actual = {
+                (row['booking_date'], row['time_slot']): row['total']
+                for row in GroupWalk.objects.filter(status='confirmed').order_by().values(
+                    'booking_date', 'time_slot'
+                ).annotate(total=models.Sum('number_of_dogs'))
+            }
+            stored = {
+                (occupancy.date, occupancy.time_slot): occupancy
+                for occupancy in cls.objects.select_for_update()
+            }
 
-    # Link to either type of booking 
-    group_walk = models.ForeignKey(
-        GroupWalk, 
-        on_delete=models.CASCADE, 
-        related_name='dogs', 
-        blank=True, 
-        null=True
+            drift = []
+            for key in sorted(set(actual) | set(stored)):
+                stored_dogs = stored[key].booked_dogs if key in stored else 0
+                actual_dogs = actual.get(key, 0)
+                if stored_dogs != actual_dogs:
+                    drift.append((key[0], key[1], stored_dogs, actual_dogs))
+
+            if repair and drift:
+                for check_date, time_slot, stored_dogs, actual_dogs in drift:
+                    cls.objects.update_or_create(
+                        date=check_date,
+                        time_slot=time_slot,
+                        defaults={'booked_dogs': actual_dogs}
+                    )
+                    logger.warning(
+                        f"Slot occupancy repaired for {check_date} {time_slot}: {stored_dogs} -> {actual_dogs}"
+                    )
+                schedule_version_bump([(check_date, time_slot) for check_date, time_slot, _, _ in drift])
+
+        return drift
+
+
+class AvailabilityVersion(models.Model):
+    """
+    Single-row counter behind the availability cache version
+
+    Bumped with an F() update so concurrent commits each get their own
+    version - a cache incr on the database cache is a read then a write, and
+    two bookings committing together could both land on the same number.
+    """
+    version = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Availability Version"
+        verbose_name_plural = "Availability Version"
+
+    def __str__(self):
+        return f"Availability version {self.version}"
+
+    @staticmethod
+    def seed():
+        # Seed from the clock so a recreated row can never reuse an old cache key
+        return int(timezone.now().timestamp() * 1000)
+
+    @classmethod
+    def current(cls):
+        """Get the current version, creating the row on first use"""
+        version = cls.objects.filter(pk=1).values_list('version', flat=True).first()
+        if version is None:
+            row, created = cls.objects.get_or_create(pk=1, defaults={'version': cls.seed()})
+            version = row.version
+        return version
+
+    @classmethod
+    async def acurrent(cls):
+        """Async version of current"""
+        version = await cls.objects.filter(pk=1).values_list('version', flat=True).afirst()
+        if version is None:
+            row, created = await cls.objects.aget_or_create(pk=1, defaults={'version': cls.seed()})
+            version = row.version
+        return version
+
+    @classmethod
+    def increment(cls):
+        """Move to the next version atomically and return it"""
+        with transaction.atomic():
+            if not cls.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now()):
+                cls.objects.get_or_create(pk=1, defaults={'version': cls.seed()})
+                cls.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now())
+            return cls.objects.filter(pk=1).values_list('version', flat=True).get()
+
+
+class AvailabilityRule(models.Model):
+    """Standing closure applied to every matching date, e.g. closed on Mondays or no evening walks in December"""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    MONTH_CHOICES = [(number, date(2000, number, 1).strftime('%B')) for number in range(1, 13)]
+
+    name = models.CharField(
+        max_length=100,
+        help_text="Shown to customers as the reason, e.g. 'Closed on Mondays'"
     )
-    individual_walk = models.ForeignKey(
-        IndividualWalk, 
-        on_delete=models.CASCADE, 
-        related_name='dogs', 
-        blank=True, 
-        null=True
+    weekdays = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text="Days of the week the rule applies to (0 = Monday, comma separated) - blank for every day"
     )
+    months = models.CharField(
+        max_length=40,
+        blank=True,
+        help_text="Months the rule applies to (1 = January, comma separated) - blank for every month"
+    )
+    time_slots = models.CharField(
+        max_length=200,
+        blank=True,
+        help_text="Time slots closed by the rule (comma separated) - blank for every slot"
+    )
+    start_date = models.DateField(null=True, blank=True, help_text="First date the rule applies - blank for no limit")
+    end_date = models.DateField(null=True, blank=True, help_text="Last date the rule applies - blank for no limit")
+    is_active = models.BooleanField(default=True)
+
+    # Tracking
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Availability Rule"
+        verbose_name_plural = "Availability Rules"
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        super().clean()
+
+        try:
+            self.weekday_set, self.month_set, self.slot_ids
+        except ValueError as e:
+            raise ValidationError(str(e))
+        finally:
+            for name in ('weekday_set', 'month_set', 'slot_ids'):
+                self.__dict__.pop(name, None)
+
+        if self.start_date and self.end_date and self.end_date < self.start_date:
+            raise ValidationError("End date cannot be before the start date.")
+
+    @cached_property
+    def weekday_set(self):
+        return availability_rules.parse_numbers(self.weekdays, availability_rules.ALL_WEEKDAYS)
+
+    @cached_property
+    def month_set(self):
+        return availability_rules.parse_numbers(self.months, availability_rules.ALL_MONTHS)
+
+    @cached_property
+    def slot_ids(self):
+        return availability_rules.parse_slots(self.time_slots)
+
+    def describe(self):
+        """Summarise when the rule applies, e.g. 'Mondays in December, evening'"""
+        parts = []
+        if self.weekday_set != availability_rules.ALL_WEEKDAYS:
+            names = dict(self.WEEKDAY_CHOICES)
+            parts.append(', '.join(f"{names[weekday]}s" for weekday in sorted(self.weekday_set)))
+        else:
+            parts.append('Every day')
+        if self.month_set != availability_rules.ALL_MONTHS:
+            names = dict(self.MONTH_CHOICES)
+            parts.append('in ' + ', '.join(names[month] for month in sorted(self.month_set)))
+        if self.start_date or self.end_date:
+            parts.append(f"({self.start_date or '...'} to {self.end_date or '...'})")
+        description = ' '.join(parts)
+
+        if self.slot_ids != set(slot_catalogue.SLOT_IDS):
+            description += ': ' + ', '.join(slot.key for slot in slot_catalogue.SLOTS if slot.id in self.slot_ids)
+        return description
+
+    @classmethod
+    def current(cls):
+        """Active rules that can still apply from today on"""
+        return cls.objects.filter(is_active=True).filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=date.today())
+        )
+
+    @classmethod
+    def load(cls):
+        """Compile the current rules with a single query"""
+        return availability_rules.ClosureRules(cls.current())
+
+    @classmethod
+    async def aload(cls):
+        """Async version of load"""
+        return availability_rules.ClosureRules([rule async for rule in cls.current()])
+
+
+class DogProfile(models.Model):
+    """A customer's dog - shared by every booking the dog comes on"""
+
+    # Owner - the customer who books for this dog
+    owner_email = models.EmailField(db_index=True, help_text="Stored lowercase so bookings find the same profile")
+    owner_name = models.CharField(max_length=100)
 
     # Dog details
     name = models.CharField(max_length=50)
@@ -747,20 +1561,34 @@ class Dog(models.Model):
         help_text="Vet practice address"
     )
 
+    # Vet, health or behaviour details a booking gave that differ from the profile
+    pending_details = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Details from a booking waiting for staff to review - the profile keeps its own until applied"
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Details a booking can update on an existing profile
+    DETAIL_FIELDS = ['breed', 'age']
+    # Details a booking can only propose - whoever books with the owner's email
+    # mustn't change what the walker relies on, so staff review them first
+    REVIEWED_FIELDS = [
+        'allergies', 'special_instructions', 'good_with_other_dogs',
+        'behavioral_notes', 'vet_name', 'vet_phone', 'vet_address',
+    ]
 
     class Meta:
         ordering = ['name']
+        verbose_name = "Dog"
+        verbose_name_plural = "Dogs"
 
     def __str__(self):
-        booking = self.group_walk or self.individual_walk
-        return f"{self.name} ({self.breed}) - {booking.customer_name if booking else 'No booking'}"
+        return f"{self.name} ({self.breed}) - {self.owner_name}"
 
     def clean(self):
-        # Ensure dog belongs to exactly one type of booking
-        if bool(self.group_walk) == bool(self.individual_walk):
-            raise ValidationError("Dog must belong to exactly one booking type.")
-        
         # Validate age
         if self.age is not None and (self.age < 0 or self.age > 30):
             raise ValidationError("Dog age must be between 0 and 30 years.")
@@ -772,21 +1600,88 @@ class Dog(models.Model):
             raise ValidationError("Vet phone number is required.")
         if not self.vet_address:
             raise ValidationError("Vet practice address is required.")
-    
-    @property
-    def booking(self):
-        """Get the associated booking (group or individual)"""
-        return self.group_walk or self.individual_walk
-    
-    @property
-    def booking_type(self):
-        """Get the type of booking this dog belongs to"""
-        if self.group_walk:
-            return 'group'
-        elif self.individual_walk:
-            return 'individual'
-        return None
-    
+
+    @staticmethod
+    def normalize_email(email):
+        return (email or '').strip().lower()
+
+    @staticmethod
+    def match_key(name):
+        """Dogs are matched to an owner's existing profiles by name, ignoring case and spacing"""
+        return ' '.join((name or '').split()).casefold()
+
+    @classmethod
+    def for_owner(cls, owner_email, owner_name, dog_details):
+        """
+        Get the owner's profiles for the dogs on a booking, creating them as needed
+
+        Uses one query to read the owner's profiles, then at most one
+        bulk_create and one bulk_update, so booking more walks for the same
+        dogs adds link rows rather than copies of the dogs.
+
+        A profile is shared by every booking made with the owner's email, and
+        anyone can book with any email, so a booking only updates the dog's
+        breed and age. Vet, health and behaviour details that differ are kept
+        in pending_details for staff to review, and the profile keeps its own.
+
+        Args:
+            owner_email: Customer email the profiles belong to
+            owner_name: Customer name, stored on new profiles
+            dog_details: Dict of DogProfile field values for each dog
+
+        Returns:
+            list: Profiles in the same order as dog_details
+        """
+        owner_email = cls.normalize_email(owner_email)
+        existing = {cls.match_key(profile.name): profile for profile in cls.objects.filter(owner_email=owner_email)}
+
+        profiles = []
+        to_create = []
+        to_update = {}
+        now = timezone.now()
+        for details in dog_details:
+            key = cls.match_key(details['name'])
+            profile = existing.get(key)
+            if profile is None:
+                profile = cls(owner_email=owner_email, owner_name=owner_name, **details)
+                existing[key] = profile
+                to_create.append(profile)
+            elif profile.pk:
+                changed = [field for field in cls.DETAIL_FIELDS if field in details and getattr(profile, field) != details[field]]
+                for field in changed:
+                    setattr(profile, field, details[field])
+
+                proposed = {
+                    field: details[field] for field in cls.REVIEWED_FIELDS
+                    if field in details and getattr(profile, field) != details[field]
+                }
+                pending = {**(profile.pending_details or {}), **proposed}
+                if proposed and pending != profile.pending_details:
+                    profile.pending_details = pending
+                    changed.append('pending_details')
+
+                if changed:
+                    profile.updated_at = now
+                    to_update[profile.pk] = profile
+            profiles.append(profile)
+
+        if to_create:
+            if connection.features.can_return_rows_from_bulk_insert:
+                cls.objects.bulk_create(to_create)
+            else:
+                for profile in to_create:
+                    profile.save()
+        if to_update:
+            cls.objects.bulk_update(list(to_update.values()), cls.DETAIL_FIELDS + ['pending_details', 'updated_at'])
+        return profiles
+
+    def apply_pending_details(self):
+        """Copy the details waiting for review onto the profile"""
+        for field, value in (self.pending_details or {}).items():
+            if field in self.REVIEWED_FIELDS:
+                setattr(self, field, value)
+        self.pending_details = None
+        self.save()
     @property
     def age_display(self):
         """Display age with appropriate unit"""
@@ -798,32 +1693,296 @@ class Dog(models.Model):
             return f"{self.age} years old"
 
 
+class CalendarSyncTask(models.Model):
+    """
+    Google Calendar work waiting for the sync_calendar worker
+
+    Bookings queue what needs doing to their calendar event here, in the same
+    transaction as the booking change, rather than calling Google while the
+    request is open. Finished tasks are deleted; tasks that keep failing are
+    left as 'failed' for an admin to look at and retry.
+    """
+
+    BOOKING_TYPE_CHOICES = [
+        ('group_walk', 'Group Walk'),
+        ('individual_walk', 'Individual Walk'),
+    ]
+
+    ACTION_CHOICES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ]
+
+    # Attempts before a task is given up on
+    MAX_ATTEMPTS = 8
+
+    booking_type = models.CharField(max_length=20, choices=BOOKING_TYPE_CHOICES)
+    # Not a foreign key - deleting an event has to outlive its booking
+    booking_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    event_id = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+        help_text="Calendar event to delete - create and update read the booking"
+    )
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+        verbose_name = "Calendar Sync Task"
+        verbose_name_plural = "Calendar Sync Tasks"
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.get_booking_type_display()} {self.booking_id} - {self.get_status_display()}"
+
+    @staticmethod
+    def booking_type_for(booking):
+        return 'individual_walk' if isinstance(booking, IndividualWalk) else 'group_walk'
+
+    @classmethod
+    def enqueue(cls, bookings, action):
+        """
+        Queue calendar work for bookings with one bulk insert
+
+        Call inside the transaction that changes the bookings, so the work is
+        only queued if the change commits.
+
+        Args:
+            bookings: Saved GroupWalk or IndividualWalk bookings
+            action: 'create', 'update' or 'delete' - a delete queues the
+                booking's current calendar_event_id
+
+        Returns:
+            list: The queued tasks
+        """
+        tasks = cls.objects.bulk_create([
+            cls(
+                booking_type=cls.booking_type_for(booking),
+                booking_id=booking.pk,
+                action=action,
+                event_id=booking.calendar_event_id if action == 'delete' else None,
+            )
+            for booking in bookings
+        ])
+        if tasks:
+            logger.info(f"Queued calendar {action} for {len(tasks)} booking(s)")
+        return tasks
+
+
+class EmailOutbox(models.Model):
+    """
+    A rendered email waiting for the send_outbox worker
+
+    Emails are queued here, in the transaction of the change they describe,
+    instead of talking to the mail provider during the request. Sent rows
+    are kept so their dedupe_key stops the same email being queued twice;
+    messages that keep failing are left as 'failed' for an admin to retry.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    # Attempts before a message is given up on
+    MAX_ATTEMPTS = 8
+
+    dedupe_key = models.CharField(
+        max_length=200,
+        unique=True,
+        blank=True,
+        null=True,
+        help_text="Identifies the email, e.g. 'group_walk_confirmation:42' - a second email with the same key is dropped"
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    recipients = models.TextField(help_text="Comma separated")
+    reply_to = models.TextField(blank=True, help_text="Comma separated")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+        verbose_name = "Outbox Email"
+        verbose_name_plural = "Email Outbox"
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipients} - {self.get_status_display()}"
+
+    @classmethod
+    def from_message(cls, message, dedupe_key=None):
+        """Build an unsaved outbox row from an EmailMessage or EmailMultiAlternatives"""
+        html_body = ''
+        for content, mimetype in getattr(message, 'alternatives', []):
+            if mimetype == 'text/html':
+                html_body = content
+        return cls(
+            dedupe_key=dedupe_key,
+            subject=message.subject,
+            body=message.body,
+            html_body=html_body,
+            from_email=message.from_email,
+            recipients=','.join(message.to),
+            reply_to=','.join(message.reply_to),
+        )
+
+    @classmethod
+    def enqueue(cls, messages):
+        """
+        Queue emails with one bulk insert
+
+        Emails whose dedupe_key is already in the outbox are skipped.
+
+        Args:
+            messages: (EmailMessage, dedupe_key) pairs - the key may be None
+
+        Returns:
+            int: Number of emails queued
+        """
+        rows = []
+        keys = set()
+        for message, dedupe_key in messages:
+            if dedupe_key:
+                # A repeated key within the batch is a duplicate too
+                if dedupe_key in keys:
+                    continue
+                keys.add(dedupe_key)
+            rows.append(cls.from_message(message, dedupe_key))
+
+        existing = set(cls.objects.filter(dedupe_key__in=keys).values_list('dedupe_key', flat=True)) if keys else set()
+        new_rows = [row for row in rows if not row.dedupe_key or row.dedupe_key not in existing]
+        # A key queued by a concurrent request since the check is skipped by the unique index
+        cls.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+        if new_rows:
+            logger.info(f"Queued {len(new_rows)} email(s)")
+        return len(new_rows)
+
+    def to_message(self, connection=None):
+        """Build the EmailMultiAlternatives to send"""
+        from django.core.mail import EmailMultiAlternatives
+
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=self.recipients.split(','),
+            reply_to=self.reply_to.split(',') if self.reply_to else None,
+            connection=connection,
+        )
+        if self.html_body:
+            message.attach_alternative(self.html_body, 'text/html')
+        return message
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a POST sent with an Idempotency-Key, replayed if the client retries
+
+    Written by the idempotent view decorator. A row is 'processing' while the
+    first request runs, for at most IDEMPOTENCY_PROCESSING_LEASE, and
+    'complete' once a successful response is stored, until
+    IDEMPOTENCY_KEY_TTL. Rows are removed once expires_at passes.
+    """
+
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('complete', 'Complete'),
+    ]
+
+    key = models.CharField(max_length=100)
+    endpoint = models.CharField(max_length=100, help_text="Path the key was used on")
+    request_hash = models.CharField(max_length=64, help_text="SHA-256 of the submitted form, to catch a key reused for different data")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='processing')
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['endpoint', 'key'], name='unique_idempotency_key_per_endpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} - {self.get_status_display()}"
+
+
+# Fields whose changes can alter availability for each model
+AVAILABILITY_FIELDS = {
+    'GroupWalk': {'booking_date', 'time_slot', 'status', 'number_of_dogs'},
+}
+
+@receiver(post_save, sender=GroupWalk)
+@receiver(post_save, sender=SlotOverride)
+@receiver(post_save, sender=AvailabilityRule)
+@receiver(post_save, sender=BookingSettings)
 @receiver(post_delete, sender=GroupWalk)
-def delete_group_walk_calendar_event(sender, instance, **kwargs):
-    """Delete calendar event when GroupWalk is deleted"""
-    if instance.calendar_event_id:
-        try:
-            from .calendar_service import GoogleCalendarService
-            calendar_service = GoogleCalendarService()
-            deleted = calendar_service.delete_event(instance.calendar_event_id)
-            if deleted:
-                logger.info(f"Calendar event deleted for group walk booking {instance.id}")
-            else:
-                logger.warning(f"Failed to delete calendar event for group walk booking {instance.id}")
-        except Exception as e:
-            logger.error(f"Error deleting calendar event for group walk booking {instance.id}: {str(e)}")
+@receiver(post_delete, sender=GroupWalkSlotManager)
+@receiver(post_delete, sender=SlotOverride)
+@receiver(post_delete, sender=AvailabilityRule)
+def invalidate_availability_cache(sender, instance, update_fields=None, **kwargs):
+    """Bump the availability version after a write that can change availability commits"""
+    watched_fields = AVAILABILITY_FIELDS.get(sender.__name__)
+    if update_fields and watched_fields and not (set(update_fields) & watched_fields):
+        return
+
+    # Bulk override deletes schedule their own bump (see set_dates_available)
+    if sender is SlotOverride and isinstance(kwargs.get('origin'), models.QuerySet):
+        return
+
+    # Record which slots changed for the availability change feed
+    if sender is GroupWalk:
+        changes = [(instance.booking_date, instance.time_slot)]
+    elif sender is GroupWalkSlotManager:
+        changes = [(instance.date, time_slot) for time_slot in slot_catalogue.SLOT_IDS]
+    elif sender is SlotOverride:
+        changes = [(instance.slot_manager.date, instance.time_slot)]
+    else:
+        changes = None
+    schedule_version_bump(changes)
+
+@receiver(post_delete, sender=GroupWalk)
+def release_group_walk_occupancy(sender, instance, **kwargs):
+    """Remove a deleted confirmed booking's dogs from SlotOccupancy (runs inside the delete transaction)"""
+    if instance.status == 'confirmed':
+        SlotOccupancy.release(instance.booking_date, instance.time_slot, instance.number_of_dogs)
 
+@receiver(post_delete, sender=GroupWalk)
 @receiver(post_delete, sender=IndividualWalk)
-def delete_individual_walk_calendar_event(sender, instance, **kwargs):
-    """Delete calendar event when IndividualWalk is deleted"""
+def delete_booking_calendar_event(sender, instance, **kwargs):
+    """Queue deletion of the calendar event when a booking is deleted"""
     if instance.calendar_event_id:
-        try:
-            from .calendar_service import GoogleCalendarService
-            calendar_service = GoogleCalendarService()
-            deleted = calendar_service.delete_event(instance.calendar_event_id)
-            if deleted:
-                logger.info(f"Calendar event deleted for individual walk booking {instance.id}")
-            else:
-                logger.warning(f"Failed to delete calendar event for individual walk booking {instance.id}")
-        except Exception as e:
-            logger.error(f"Error deleting calendar event for individual walk booking {instance.id}: {str(e)}")
\ No newline at end of file
+        CalendarSyncTask.enqueue([instance], 'delete')
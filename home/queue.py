@@ -0,0 +1,179 @@
+"""
+Lease-based work queues kept in the database
+
+CalendarSyncTask and EmailOutbox rows are queued in the transaction that
+creates the work, so no request waits on Google or the mail provider, and are
+drained by a worker command (sync_calendar and send_outbox). Both go through
+WorkQueue, which:
+
+- claims due rows by pushing their next attempt back by a lease, so two
+  workers never pick up the same row and a crashed run's rows come back once
+  the lease runs out
+- retries failures with exponential backoff and marks a row 'failed' after the
+  model's MAX_ATTEMPTS
+
+The models need status, attempts, next_attempt_at and last_error fields and a
+MAX_ATTEMPTS attribute.
+"""
+
+import logging
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Rows claimed per run
+BATCH_SIZE = 50
+
+# How long a claimed row is hidden from other workers
+LEASE = timedelta(minutes=5)
+
+# Backoff after the first failure, doubling each attempt up to MAX_RETRY_DELAY
+FIRST_RETRY_DELAY = timedelta(minutes=1)
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+
+def retry_delay(attempts):
+    """Delay before the next try of a row that has failed attempts times"""
+    return min(FIRST_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+class WorkQueue:
+    """
+    Claim, run and finish the due rows of one queue model
+
+    Args:
+        model: Queue model, e.g. EmailOutbox
+        on_success: Called with a queryset of the rows that succeeded - e.g.
+            to delete them or mark them sent
+    """
+
+    def __init__(self, model, on_success):
+        self.model = model
+        self.on_success = on_success
+
+    def claim(self, limit=BATCH_SIZE):
+        """
+        Claim the pending rows that are due
+
+        Returns:
+            list: Claimed rows, oldest first
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            items = list(
+                self.model.objects.select_for_update(skip_locked=True).filter(
+                    status='pending',
+                    next_attempt_at__lte=now
+                ).order_by('next_attempt_at', 'id')[:limit]
+            )
+            if items:
+                self.model.objects.filter(pk__in=[item.pk for item in items]).update(
+                    next_attempt_at=now + LEASE
+                )
+        return items
+
+    def finish(self, items, errors):
+        """Hand the rows that succeeded to on_success and schedule a retry, or give up, on the rest"""
+        now = timezone.now()
+        succeeded = [item.pk for item in items if item.pk not in errors]
+        if succeeded:
+            self.on_success(self.model.objects.filter(pk__in=succeeded))
+
+        # bulk_update doesn't touch auto_now fields itself
+        stamped = [field.name for field in self.model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+
+        failed = []
+        for item in items:
+            if item.pk not in errors:
+                continue
+            item.attempts += 1
+            item.last_error = errors[item.pk]
+            for name in stamped:
+                setattr(item, name, now)
+            if item.attempts >= self.model.MAX_ATTEMPTS:
+                item.status = 'failed'
+                logger.error(f"Giving up on {self.model._meta.verbose_name} {item.pk} ({item}): {item.last_error}")
+            else:
+                item.next_attempt_at = now + retry_delay(item.attempts)
+            failed.append(item)
+        if failed:
+            self.model.objects.bulk_update(failed, ['attempts', 'last_error', 'status', 'next_attempt_at', *stamped])
+
+    def process(self, run, limit=BATCH_SIZE):
+        """
+        Claim one batch of due rows, run it and record the outcome
+
+        Args:
+            run: Called with the claimed rows - returns an error message keyed
+                by the id of each row that failed
+            limit: Most rows to claim
+
+        Returns:
+            tuple: (succeeded, failed) row counts
+        """
+        items = self.claim(limit)
+        if not items:
+            return 0, 0
+
+        errors = run(items)
+        self.finish(items, errors)
+        return len(items) - len(errors), len(errors)
+
+
+class QueueWorkerCommand(BaseCommand):
+    """
+    Management command that drains a WorkQueue, polling until stopped
+
+    Subclasses set help, the messages and default_interval, and implement
+    process(batch_size) returning (succeeded, failed).
+    """
+
+    # Seconds to wait between polls when the queue is empty
+    default_interval = 10
+    # Formatted with succeeded and failed
+    batch_message = "Processed {succeeded} item(s), {failed} failed"
+    summary_message = "Queue run finished: {succeeded} succeeded, {failed} failed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process the work that is due now and exit instead of polling",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=self.default_interval,
+            help=f"Seconds to wait between polls when the queue is empty (default {self.default_interval})",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Most rows to claim at a time (default {BATCH_SIZE})",
+        )
+
+    def process(self, batch_size):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        total_succeeded = total_failed = 0
+        while True:
+            succeeded, failed = self.process(options['batch_size'])
+            total_succeeded += succeeded
+            total_failed += failed
+            if succeeded or failed:
+                self.stdout.write(self.batch_message.format(succeeded=succeeded, failed=failed))
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            self.summary_message.format(succeeded=total_succeeded, failed=total_failed)
+        ))
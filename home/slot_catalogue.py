@@ -0,0 +1,72 @@
+"""
+Catalogue of group walk time slots
+
+Every group walk slot is defined once here, as data. Model choices,
+availability, validation, the admin and calendar event timing all read the
+indexes built from SLOTS at import time, so looking a slot up is a dictionary
+hit and adding another walk to the day is one more entry in SLOTS.
+
+A slot's id is the value stored in GroupWalk.time_slot, so ids must never
+change once bookings exist. Per-date availability and capacity overrides live
+in the SlotOverride table.
+"""
+
+from collections import namedtuple
+from datetime import time
+
+Slot = namedtuple('Slot', [
+    'id',                # Stored in GroupWalk.time_slot / SlotOccupancy.time_slot
+    'key',               # Short name used by the admin tools, e.g. 'morning'
+    'label',             # Customer facing display
+    'abbreviation',      # Column heading in the admin changelist
+    'start',
+    'end',
+    'default_capacity',  # Dogs per walk when no override is set for the date
+    'calendar_color',    # Google Calendar colorId for booked walks
+    'setting',           # BookingSettings flag that must be on to offer the slot, or None
+])
+
+SLOTS = (
+    Slot('09:30-11:30', 'morning', '09:30 AM - 11:30 PM', 'M', time(9, 30), time(11, 30), 4, '2', None),
+    Slot('14:00-16:00', 'afternoon', '2:00 PM - 4:00 PM', 'A', time(14, 0), time(16, 0), 4, '2', None),
+    Slot('18:00-20:00', 'evening', '6:00 PM - 8:00 PM', 'E', time(18, 0), time(20, 0), 4, '2', 'allow_evening_slot'),
+)
+
+# Precomputed indexes
+SLOT_IDS = tuple(slot.id for slot in SLOTS)
+SLOTS_BY_ID = {slot.id: slot for slot in SLOTS}
+SLOTS_BY_KEY = {slot.key: slot for slot in SLOTS}
+SLOT_POSITIONS = {slot.id: index for index, slot in enumerate(SLOTS)}
+TIME_SLOT_CHOICES = [(slot.id, slot.label) for slot in SLOTS]
+
+
+def get_slot(time_slot):
+    """Get a slot by id, or None if it isn't in the catalogue"""
+    return SLOTS_BY_ID.get(time_slot)
+
+
+def resolve_slots(values):
+    """
+    Resolve slot ids or keys (e.g. 'morning') to catalogue slots
+
+    Args:
+        values: Iterable of slot ids or keys
+
+    Returns:
+        list: Matching slots in catalogue order
+
+    Raises:
+        ValueError: If a value matches no slot
+    """
+    wanted = set()
+    for value in values:
+        slot = SLOTS_BY_ID.get(value) or SLOTS_BY_KEY.get(value)
+        if slot is None:
+            raise ValueError(f"Unknown time slot: {value}")
+        wanted.add(slot.id)
+    return [slot for slot in SLOTS if slot.id in wanted]
+
+
+def is_offered(slot, booking_settings):
+    """Whether the site-wide booking settings allow a slot to be booked at all"""
+    return slot.setting is None or getattr(booking_settings, slot.setting)
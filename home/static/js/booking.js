@@ -27,6 +27,25 @@ function getCSRFToken() {
 }
 
 // Helper function for cookie parsing
+// Idempotency-Key of each booking submission still waiting for an answer, by endpoint
+const pendingIdempotencyKeys = {};
+
+function idempotencyKeyFor(endpoint, formData) {
+    // A retry of the same booking (after a timeout or dropped connection) reuses
+    // its key, so the server replays the first answer instead of booking twice
+    const fingerprint = JSON.stringify(
+        [...formData.entries()].filter(([name]) => name !== 'csrfmiddlewaretoken')
+    );
+    const pending = pendingIdempotencyKeys[endpoint];
+    if (pending && pending.fingerprint === fingerprint) return pending.key;
+
+    const key = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    pendingIdempotencyKeys[endpoint] = { key, fingerprint };
+    return key;
+}
+
 function getCookie(name) {
     let cookieValue = null;
     if (document.cookie && document.cookie !== '') {
@@ -59,9 +78,14 @@ function validatePostcode(postcode) {
 
 // GLOBAL VARIABLES (AVAILABLE EVERYWHERE)
 let availabilityData = [];
+let availabilityNextCursor = null;
+let availabilityLoadedUntil = null;
+let availabilitySlotCatalogue = [];
+let availabilityFeed = null;
 let selectedSlots = [];
 let currentBookingType = null;
 let isMultiBookingMode = false;
+let returningCustomerDogs = [];
 
 document.addEventListener('DOMContentLoaded', function() {
     
@@ -193,6 +217,8 @@ document.addEventListener('DOMContentLoaded', function() {
         selectedSlots = [];
         currentBookingType = null;
         availabilityData = [];
+        availabilityNextCursor = null;
+        closeAvailabilityFeed();
         isMultiBookingMode = false;
     }
     
@@ -226,6 +252,7 @@ document.addEventListener('DOMContentLoaded', function() {
         if (groupWalkForm) {
             groupWalkForm.removeEventListener('submit', handleGroupFormSubmit);
             groupWalkForm.addEventListener('submit', handleGroupFormSubmit);
+            addReturningCustomerLookup(groupWalkForm);
         }
         
         addRealTimeValidation();
@@ -362,17 +389,37 @@ document.addEventListener('DOMContentLoaded', function() {
         if (step) step.style.display = 'block';
     }
     
+    // Fetch one compact window of availability - the browser revalidates it with its ETag
+    async function fetchAvailabilityWindow(cursor) {
+        const params = new URLSearchParams(Object.assign({ format: 'compact' }, cursor));
+        const response = await fetch(`/api/availability/?${params.toString()}`);
+        
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        return response.json();
+    }
+    
     async function loadAvailabilityCalendar(numDogs) {
         try {
-            const response = await fetch(`/api/availability/?days=180&num_dogs=${numDogs}`);
-            
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
+            // Start with the first 30 days from tomorrow - later windows load on demand
+            const tomorrow = new Date();
+            tomorrow.setDate(tomorrow.getDate() + 1);
+            const start = [
+                tomorrow.getFullYear(),
+                String(tomorrow.getMonth() + 1).padStart(2, '0'),
+                String(tomorrow.getDate()).padStart(2, '0'),
+            ].join('-');
             
-            const data = await response.json();
-            availabilityData = data.availability || [];
+            const data = await fetchAvailabilityWindow({ start: start });
+            availabilityData = expandCapacityMatrix(data, numDogs);
+            availabilityNextCursor = data.next;
+            availabilityLoadedUntil = data.window.end;
+            availabilitySlotCatalogue = data.slots;
             renderCalendar();
+            updateCalendarDisplay();
+            subscribeToAvailabilityFeed();
         } catch (error) {
             console.error('Error loading availability:', error);
             const calendar = document.getElementById('availability-calendar');
@@ -390,6 +437,164 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    async function loadMoreAvailability() {
+        if (!availabilityNextCursor) return;
+        
+        const numDogsSelector = document.getElementById('num-dogs-selector');
+        const numDogs = numDogsSelector ? parseInt(numDogsSelector.value) : 1;
+        const loadMoreBtn = document.getElementById('load-more-availability');
+        if (loadMoreBtn) loadMoreBtn.disabled = true;
+        
+        try {
+            const data = await fetchAvailabilityWindow(availabilityNextCursor);
+            availabilityData = availabilityData.concat(expandCapacityMatrix(data, numDogs));
+            availabilityNextCursor = data.next;
+            availabilityLoadedUntil = data.window.end;
+            renderCalendar();
+            updateCalendarDisplay();
+        } catch (error) {
+            console.error('Error loading more availability:', error);
+            if (loadMoreBtn) loadMoreBtn.disabled = false;
+        }
+    }
+    
+    window.loadMoreAvailability = loadMoreAvailability;
+    
+    // Keep the calendar live - the server pushes [date, time_slot, remaining] deltas as bookings commit
+    function subscribeToAvailabilityFeed() {
+        if (availabilityFeed || typeof EventSource === 'undefined') return;
+        
+        availabilityFeed = new EventSource('/api/availability/stream/');
+        
+        availabilityFeed.addEventListener('availability', event => {
+            applyAvailabilityChanges(JSON.parse(event.data).changes);
+        });
+        
+        // Too much changed while disconnected - fetch the calendar again
+        availabilityFeed.addEventListener('reset', () => {
+            const numDogsSelector = document.getElementById('num-dogs-selector');
+            const numDogs = numDogsSelector ? parseInt(numDogsSelector.value) : 0;
+            if (numDogs > 0) loadAvailabilityCalendar(numDogs);
+        });
+    }
+    
+    function closeAvailabilityFeed() {
+        if (availabilityFeed) {
+            availabilityFeed.close();
+            availabilityFeed = null;
+        }
+    }
+    
+    window.closeAvailabilityFeed = closeAvailabilityFeed;
+    
+    function applyAvailabilityChanges(changes) {
+        const numDogsSelector = document.getElementById('num-dogs-selector');
+        const numDogs = numDogsSelector ? parseInt(numDogsSelector.value) : 1;
+        const lostSlots = [];
+        
+        changes.forEach(([date, timeSlot, remaining]) => {
+            // Ignore dates the calendar has not loaded yet
+            if (!availabilityLoadedUntil || date > availabilityLoadedUntil) return;
+            
+            const canBook = remaining !== null && remaining >= numDogs;
+            let day = availabilityData.find(d => d.date === date);
+            
+            if (!canBook) {
+                if (day) {
+                    day.slots = day.slots.filter(slot => slot.time_slot !== timeSlot);
+                    if (day.slots.length === 0) {
+                        availabilityData = availabilityData.filter(d => d !== day);
+                    }
+                }
+                if (selectedSlots.some(slot => slot.date === date && slot.timeSlot === timeSlot)) {
+                    lostSlots.push(`${date} ${timeSlot}`);
+                }
+                return;
+            }
+            
+            if (!day) {
+                const [year, month, dayOfMonth] = date.split('-').map(Number);
+                const slotDate = new Date(year, month - 1, dayOfMonth);
+                day = {
+                    date: date,
+                    date_display: slotDate.toLocaleDateString('en-US', { month: 'long', day: '2-digit', year: 'numeric' }),
+                    day_name: slotDate.toLocaleDateString('en-US', { weekday: 'long' }),
+                    slots: [],
+                };
+                availabilityData.push(day);
+                availabilityData.sort((a, b) => a.date.localeCompare(b.date));
+            }
+            
+            const existing = day.slots.find(slot => slot.time_slot === timeSlot);
+            if (existing) {
+                existing.available_spots = remaining;
+            } else {
+                const catalogueIndex = availabilitySlotCatalogue.findIndex(slot => slot.time_slot === timeSlot);
+                if (catalogueIndex < 0) return;
+                day.slots.push({
+                    time_slot: timeSlot,
+                    time_display: availabilitySlotCatalogue[catalogueIndex].time_display,
+                    available_spots: remaining,
+                    can_book: true,
+                    is_full: false,
+                    requested_dogs: numDogs,
+                });
+                day.slots.sort((a, b) =>
+                    availabilitySlotCatalogue.findIndex(slot => slot.time_slot === a.time_slot) -
+                    availabilitySlotCatalogue.findIndex(slot => slot.time_slot === b.time_slot)
+                );
+            }
+        });
+        
+        renderCalendar();
+        updateCalendarDisplay();
+        
+        if (lostSlots.length > 0) {
+            showGenericError('group-walk-form', `Sorry, these slots have just been booked by someone else: ${lostSlots.join(', ')}. Please choose different times.`);
+        }
+    }
+    
+    // Turn the compact capacity matrix into per-day slot lists for the given dog count
+    function expandCapacityMatrix(data, numDogs) {
+        const [year, month, day] = data.start.split('-').map(Number);
+        const days = [];
+        
+        (data.days || []).forEach((capacities, index) => {
+            const slotDate = new Date(year, month - 1, day + index);
+            const slots = [];
+            
+            capacities.forEach((availableSpots, slotIndex) => {
+                // null marks a blocked slot
+                if (availableSpots !== null && availableSpots >= numDogs) {
+                    slots.push({
+                        time_slot: data.slots[slotIndex].time_slot,
+                        time_display: data.slots[slotIndex].time_display,
+                        available_spots: availableSpots,
+                        can_book: true,
+                        is_full: false,
+                        requested_dogs: numDogs,
+                    });
+                }
+            });
+            
+            if (slots.length > 0) {
+                const isoDate = [
+                    slotDate.getFullYear(),
+                    String(slotDate.getMonth() + 1).padStart(2, '0'),
+                    String(slotDate.getDate()).padStart(2, '0'),
+                ].join('-');
+                days.push({
+                    date: isoDate,
+                    date_display: slotDate.toLocaleDateString('en-US', { month: 'long', day: '2-digit', year: 'numeric' }),
+                    day_name: slotDate.toLocaleDateString('en-US', { weekday: 'long' }),
+                    slots: slots,
+                });
+            }
+        });
+        
+        return days;
+    }
+    
     function renderCalendar() {
         const calendar = document.getElementById('availability-calendar');
         if (!calendar) return;
@@ -397,6 +602,14 @@ document.addEventListener('DOMContentLoaded', function() {
         const numDogsSelector = document.getElementById('num-dogs-selector');
         const numDogs = numDogsSelector ? parseInt(numDogsSelector.value) : 1;
         
+        const loadMoreHtml = availabilityNextCursor ? `
+            <div class="text-center mt-3">
+                <button type="button" class="btn btn-outline-primary" id="load-more-availability" onclick="window.loadMoreAvailability()">
+                    Show more dates
+                </button>
+            </div>
+        ` : '';
+        
         if (!availabilityData || availabilityData.length === 0) {
             calendar.innerHTML = `
                 <div class="alert alert-warning">
@@ -404,7 +617,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     <p>No available slots for ${numDogs} dog${numDogs > 1 ? 's' : ''} in the next 30 days.</p>
                     <p>Please try selecting fewer dogs or contact us directly at <strong>alex@caninecompadre.co.uk</strong></p>
                 </div>
-            `;
+            ` + loadMoreHtml;
             return;
         }
         
@@ -453,7 +666,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         
         html += '</div>';
-        calendar.innerHTML = html;
+        calendar.innerHTML = html + loadMoreHtml;
     }
     
     // UPDATED MULTI-BOOKING TOGGLE FUNCTION
@@ -625,12 +838,37 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Check every selected slot in one request - returns the slots that can no longer be booked
+    async function findUnavailableSlots(slots, numDogs) {
+        try {
+            const params = new URLSearchParams({ num_dogs: numDogs, slots: JSON.stringify(slots) });
+            const response = await fetch(`/api/check-slots/?${params.toString()}`);
+            if (!response.ok) return [];
+            
+            const result = await response.json();
+            return slots.filter((slot, index) => !result.slots[index].can_book);
+        } catch (error) {
+            // The booking endpoint validates again, so a failed pre-check is not fatal
+            console.error('Error checking selected slots:', error);
+            return [];
+        }
+    }
+    
     async function submitGroupWalkForm() {
         if (selectedSlots.length === 0) {
             showGenericError('group-walk-form', 'Please select at least one time slot.');
             return;
         }
         
+        const numDogsInput = document.getElementById('num-dogs-selector');
+        const selectedNumDogs = numDogsInput ? parseInt(numDogsInput.value) : 1;
+        const unavailableSlots = await findUnavailableSlots(selectedSlots, selectedNumDogs);
+        if (unavailableSlots.length > 0) {
+            const slotList = unavailableSlots.map(slot => `${slot.dateDisplay} ${slot.timeDisplay}`).join(', ');
+            showGenericError('group-walk-form', `Sorry, these slots are no longer available: ${slotList}. Please choose different times.`);
+            return;
+        }
+        
         const formData = new FormData();
         const form = document.getElementById('group-walk-form');
         if (!form) return;
@@ -679,8 +917,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: formData,
                 headers: {
                     'X-Requested-With': 'XMLHttpRequest',
+                    'Idempotency-Key': idempotencyKeyFor('/book/group/', formData),
                 }
             });
+            // Keep the key while the booking is still processing or hit a server
+            // error, so trying again can't book twice
+            if (response.status !== 409 && response.status < 500) {
+                delete pendingIdempotencyKeys['/book/group/'];
+            }
 
             if (!response.ok) {
                 throw new Error(`Server error: ${response.status} ${response.statusText}`);
@@ -689,6 +933,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
 
             if (result.success) {
+                closeAvailabilityFeed();
                 if (bookingMainContent) {
                     bookingMainContent.innerHTML = result.html;
                 }
@@ -729,9 +974,70 @@ document.addEventListener('DOMContentLoaded', function() {
             if (dogForm) container.appendChild(dogForm);
         }
 
+        fillReturningCustomerDogs(container);
         addRealTimeValidation();
     }
 
+    // ===========================================
+    // RETURNING CUSTOMER PREFILL
+    // ===========================================
+
+    function addReturningCustomerLookup(form) {
+        const emailField = form.querySelector('[name="customer_email"]');
+        const postcodeField = form.querySelector('[name="customer_postcode"]');
+        if (!emailField || !postcodeField || emailField.hasAttribute('data-returning-lookup')) return;
+        emailField.setAttribute('data-returning-lookup', 'true');
+
+        returningCustomerDogs = [];
+        [emailField, postcodeField].forEach(field => {
+            field.addEventListener('change', function() {
+                lookupReturningCustomer(form, emailField.value.trim(), postcodeField.value.trim());
+            });
+        });
+    }
+
+    async function lookupReturningCustomer(form, email, postcode) {
+        // Both must match a previous booking before anything is filled in
+        if (!validateEmail(email) || !validatePostcode(postcode)) return;
+
+        const formData = new FormData();
+        formData.append('email', email);
+        formData.append('postcode', postcode);
+        formData.append('csrfmiddlewaretoken', getCSRFToken());
+
+        try {
+            const response = await fetch('/api/returning-customer/', {
+                method: 'POST',
+                body: formData,
+                headers: { 'X-Requested-With': 'XMLHttpRequest' }
+            });
+            const data = await response.json();
+            if (!data.success || !data.found) return;
+
+            returningCustomerDogs = data.dogs || [];
+            fillReturningCustomerDogs(form);
+        } catch (error) {
+            console.error('Error looking up returning customer:', error);
+        }
+    }
+
+    function fillReturningCustomerDogs(container) {
+        returningCustomerDogs.forEach((dog, index) => {
+            const nameField = container.querySelector(`[name="dog_${index}_name"]`);
+            if (!nameField || nameField.value) return;
+
+            Object.entries(dog).forEach(([key, value]) => {
+                const field = container.querySelector(`[name="dog_${index}_${key}"]`);
+                if (!field) return;
+                if (field.type === 'checkbox') {
+                    field.checked = value;
+                } else {
+                    field.value = value;
+                }
+            });
+        });
+    }
+
     // function createDogForm(index) {
     //     const template = document.getElementById('dog-form-template');
     //     if (!template) {
@@ -1389,6 +1695,7 @@ document.addEventListener('DOMContentLoaded', function() {
         if (individualForm) {
             individualForm.removeEventListener('submit', handleIndividualFormSubmit);
             individualForm.addEventListener('submit', handleIndividualFormSubmit);
+            addReturningCustomerLookup(individualForm);
         }
         
         addRealTimeValidation();
@@ -1580,8 +1887,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: formData,
                 headers: {
                     'X-Requested-With': 'XMLHttpRequest',
+                    'Idempotency-Key': idempotencyKeyFor('/book/individual/', formData),
                 }
             });
+            // Keep the key while the booking is still processing or hit a server
+            // error, so trying again can't book twice
+            if (response.status !== 409 && response.status < 500) {
+                delete pendingIdempotencyKeys['/book/individual/'];
+            }
 
             if (!response.ok) {
                 throw new Error(`Server error: ${response.status} ${response.statusText}`);
@@ -1910,6 +2223,8 @@ document.addEventListener('DOMContentLoaded', function() {
         selectedSlots = [];
         currentBookingType = null;
         availabilityData = [];
+        availabilityNextCursor = null;
+        closeAvailabilityFeed();
         isMultiBookingMode = false;
         
         document.querySelectorAll('.error-message').forEach(el => el.remove());
@@ -1,3 +1,1565 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.core import mail
+from django.db import connection, transaction
+from django.core.exceptions import ValidationError
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    availability_cache, availability_feed, availability_grid, calendar_sync, closure_import, email_outbox, slot_catalogue
+)
+from .availability import (
+    BOOKING_HORIZON_DAYS, acheck_slots, aload_capacity_matrix, check_slots, find_nearest_slots, get_available_slots,
+    get_booking_window, load_capacity_matrix
+)
+from .forms import GroupWalkForm, validate_group_walk_cart
+from .models import AvailabilityRule, AvailabilityVersion, BookingSettings, CalendarSyncTask, Customer, DogProfile, EmailOutbox, GroupWalk, GroupWalkSlotManager, IdempotencyKey, SlotOccupancy, SlotOverride, write_transaction
+from .utils import cancel_bookings_for_closed_slots
+from .views import MAX_BULK_SLOTS
+
+
+def next_weekday(days_ahead=7):
+    """A weekday far enough ahead to be bookable"""
+    booking_date = date.today() + timedelta(days=days_ahead)
+    while booking_date.weekday() >= 5:
+        booking_date += timedelta(days=1)
+    return booking_date
+
+
+def run_in_parallel(target, count):
+    """Run target(index) on count threads released together, collecting what each returns"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        try:
+            barrier.wait()
+            results[index] = target(index)
+        except Exception as e:
+            results[index] = e
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def use_temporary_grid(test_case):
+    """Give a test its own availability grid file, so it never reads or writes the machine's shared grid"""
+    directory = test_case.enterContext(tempfile.TemporaryDirectory())
+    test_case.enterContext(override_settings(AVAILABILITY_GRID_PATH=os.path.join(directory, 'availability.grid')))
+    test_case.enterContext(mock.patch.object(availability_grid, '_grid', None))
+
+
+def group_booking_post(index, booking_date, time_slot):
+    """Form data for a one-dog group walk booking"""
+    return {
+        'customer_name': f'Customer {index}',
+        'customer_email': f'customer{index}@example.com',
+        'customer_phone': '07123456789',
+        'customer_address': '1 Beach Road',
+        'customer_postcode': 'EX33 1AA',
+        'number_of_dogs': '1',
+        'booking_date': booking_date.isoformat(),
+        'time_slot': time_slot,
+        'dog_0_name': f'Dog {index}',
+        'dog_0_breed': 'Collie',
+        'dog_0_age': '3',
+        'dog_0_vet_name': 'Vet',
+        'dog_0_vet_phone': '01271000000',
+        'dog_0_vet_address': 'Braunton',
+    }
+
+
+def book_group_walk(booking_date, time_slot, number_of_dogs=1, index=0):
+    """Save a confirmed group walk booking"""
+    booking = GroupWalk(
+        customer_name=f'Customer {index}',
+        customer_email=f'customer{index}@example.com',
+        customer_phone='07123456789',
+        customer_address='1 Beach Road',
+        customer_postcode='EX33 1AA',
+        booking_date=booking_date,
+        time_slot=time_slot,
+        number_of_dogs=number_of_dogs,
+    )
+    booking.save()
+    return booking
+
+
+class CapacityEngineTests(TestCase):
+    """Availability is built from a fixed number of queries, however long the window"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.morning, self.afternoon, self.evening = (slot.id for slot in slot_catalogue.SLOTS)
+        BookingSettings.get_settings()
+
+    def available(self, required_dogs, days_ahead=1):
+        slots = get_available_slots(days_ahead=days_ahead, required_dogs=required_dogs, start_date=self.booking_date)
+        return [(slot['time_slot'], slot['available_spots']) for slot in slots]
+
+    def test_queries_do_not_grow_with_the_window(self):
+        with CaptureQueriesContext(connection) as short_window:
+            self.available(1, days_ahead=7)
+        with CaptureQueriesContext(connection) as long_window:
+            slots = get_available_slots(days_ahead=90, start_date=self.booking_date)
+
+        self.assertEqual(len(long_window), len(short_window))
+        self.assertEqual(len(slots), 90 * len(slot_catalogue.SLOTS))
+
+    def test_full_and_closed_slots_are_left_out(self):
+        book_group_walk(self.booking_date, self.morning, number_of_dogs=3)
+        GroupWalkSlotManager.set_dates_available([self.booking_date], ['afternoon'], False)
+
+        self.assertEqual(self.available(1), [(self.morning, 1), (self.evening, 4)])
+        self.assertEqual(self.available(2), [(self.evening, 4)])
+
+
+class SlotOccupancyTests(TestCase):
+    """SlotOccupancy follows bookings as they change, and rebuild finds any drift"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.morning, self.afternoon = (slot.id for slot in slot_catalogue.SLOTS[:2])
+
+    def test_moving_a_booking_moves_its_dogs(self):
+        booking = book_group_walk(self.booking_date, self.morning, number_of_dogs=2)
+
+        booking.time_slot = self.afternoon
+        booking.number_of_dogs = 3
+        booking.save()
+
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, self.morning), 0)
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, self.afternoon), 3)
+        self.assertEqual(SlotOccupancy.rebuild(repair=False), [])
+
+    def test_rebuild_reports_and_repairs_drift(self):
+        book_group_walk(self.booking_date, self.morning, number_of_dogs=2)
+        SlotOccupancy.objects.filter(date=self.booking_date, time_slot=self.morning).update(booked_dogs=4)
+        SlotOccupancy.objects.create(date=self.booking_date, time_slot=self.afternoon, booked_dogs=1)
+
+        drift = [(self.booking_date, self.morning, 4, 2), (self.booking_date, self.afternoon, 1, 0)]
+        self.assertEqual(SlotOccupancy.rebuild(repair=False), drift)
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, self.morning), 4)
+
+        self.assertEqual(SlotOccupancy.rebuild(), drift)
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, self.morning), 2)
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, self.afternoon), 0)
+        self.assertEqual(SlotOccupancy.rebuild(repair=False), [])
+
+
+class AvailabilityInvalidationTests(TransactionTestCase):
+    """A committed write moves the availability version, so cached payloads and ETags change"""
+
+    def setUp(self):
+        use_temporary_grid(self)
+        self.booking_date = next_weekday()
+        self.morning, self.afternoon = (slot.id for slot in slot_catalogue.SLOTS[:2])
+        BookingSettings.get_settings()
+
+    def test_booking_invalidates_cached_payloads(self):
+        compute = mock.Mock(side_effect=lambda: {'computed': compute.call_count})
+        first = availability_cache.get_or_compute('test', ('window',), compute)
+        etag = availability_cache.etag_for('test', ('window',))
+        self.assertEqual(availability_cache.get_or_compute('test', ('window',), compute), first)
+
+        book_group_walk(self.booking_date, self.morning)
+
+        self.assertEqual(availability_cache.get_or_compute('test', ('window',), compute), {'computed': 2})
+        self.assertNotEqual(availability_cache.etag_for('test', ('window',)), etag)
+
+    def test_one_bump_per_transaction_records_the_changed_slots(self):
+        start = availability_cache.get_version()
+
+        with transaction.atomic():
+            book_group_walk(self.booking_date, self.morning)
+            book_group_walk(self.booking_date, self.afternoon, index=1)
+            self.assertEqual(availability_cache.get_version(), start)
+
+        self.assertEqual(availability_cache.get_version(), start + 1)
+        self.assertEqual(
+            sorted(availability_cache.get_changes(start + 1)),
+            [(self.booking_date, self.morning), (self.booking_date, self.afternoon)]
+        )
+
+    def test_rolled_back_writes_keep_the_version(self):
+        start = availability_cache.get_version()
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            book_group_walk(self.booking_date, self.morning)
+            raise RuntimeError('booking abandoned')
+
+        self.assertEqual(availability_cache.get_version(), start)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    """The public availability endpoints answer a matching If-None-Match with 304 until availability changes"""
+
+    def setUp(self):
+        use_temporary_grid(self)
+        self.booking_date = next_weekday()
+        BookingSettings.get_settings()
+
+    def test_calendar_is_revalidated_after_a_booking(self):
+        url = reverse('get_availability_calendar')
+        first = self.client.get(url, {'days': 14})
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first.headers)
+
+        cached = self.client.get(url, {'days': 14}, headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+        # Other parameters are a different payload
+        other = self.client.get(url, {'days': 14, 'num_dogs': 2}, headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(other.status_code, 200)
+
+        book_group_walk(self.booking_date, slot_catalogue.SLOTS[0].id)
+
+        changed = self.client.get(url, {'days': 14}, headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], first.headers['ETag'])
+        day = next(day for day in changed.json()['availability'] if day['date'] == self.booking_date.isoformat())
+        self.assertEqual(day['slots'][0]['available_spots'], slot_catalogue.SLOTS[0].default_capacity - 1)
+
+    def test_settings_and_unavailable_dates(self):
+        for name in ('get_bookings_settings', 'get_unavailable_dates'):
+            with self.subTest(name):
+                first = self.client.get(reverse(name))
+                self.assertEqual(first.status_code, 200)
+                cached = self.client.get(reverse(name), headers={'If-None-Match': first.headers['ETag']})
+                self.assertEqual(cached.status_code, 304)
+
+
+class CompactCalendarTests(TestCase):
+    """format=compact sends the slot list once and a row of remaining capacities per day"""
+
+    def setUp(self):
+        use_temporary_grid(self)
+        self.tomorrow = date.today() + timedelta(days=1)
+        self.morning, self.afternoon, self.evening = (slot.id for slot in slot_catalogue.SLOTS)
+
+    def test_matrix_of_remaining_capacity(self):
+        book_group_walk(self.tomorrow, self.morning)
+        GroupWalkSlotManager.set_dates_available([self.tomorrow], ['evening'], False)
+
+        payload = self.client.get(reverse('get_availability_calendar'), {'format': 'compact', 'days': 3}).json()
+
+        self.assertEqual(payload['format'], 'compact')
+        self.assertEqual(payload['start'], self.tomorrow.isoformat())
+        self.assertEqual([slot['time_slot'] for slot in payload['slots']], [self.morning, self.afternoon, self.evening])
+        self.assertEqual(payload['days'], [[3, 4, None], [4, 4, 4], [4, 4, 4]])
+
+        # The client filters by dog count itself
+        for_two_dogs = self.client.get(reverse('get_availability_calendar'), {'format': 'compact', 'days': 3, 'num_dogs': 2})
+        self.assertEqual(for_two_dogs.json(), payload)
+
+        # Without the shared grid the same payload is built from the database
+        with mock.patch.object(availability_grid, 'GRID_SUPPORTED', False), \
+                mock.patch.object(availability_grid, '_grid', None):
+            from_database = self.client.get(reverse('get_availability_calendar'), {'format': 'compact', 'days': 3})
+        self.assertEqual(from_database.json(), payload)
+
+
+class BookingWindowTests(TestCase):
+    """Availability can be fetched one window of the booking horizon at a time, with cursors to the next"""
+
+    def setUp(self):
+        self.first_date = date.today() + timedelta(days=1)
+        self.last_date = date.today() + timedelta(days=BOOKING_HORIZON_DAYS)
+
+    def test_default_and_last_windows(self):
+        window = get_booking_window()
+        self.assertEqual((window['start_date'], window['days'], window['previous']), (self.first_date, 30, None))
+        self.assertEqual(window['next'], {
+            'start': (self.first_date + timedelta(days=30)).isoformat(),
+            'end': (self.first_date + timedelta(days=59)).isoformat(),
+        })
+
+        last = get_booking_window(start=(self.last_date - timedelta(days=9)).isoformat())
+        self.assertEqual((last['end_date'], last['days'], last['next']), (self.last_date, 10, None))
+        self.assertEqual(last['previous']['end'], (self.last_date - timedelta(days=10)).isoformat())
+
+    def test_month_window(self):
+        month_start = (self.first_date.replace(day=1) + timedelta(days=45)).replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+
+        window = get_booking_window(month=month_start.strftime('%Y-%m'))
+        self.assertEqual(window['start_date'], month_start)
+        self.assertEqual(window['end_date'], next_month - timedelta(days=1))
+        self.assertEqual(window['previous'], {'month': (month_start - timedelta(days=1)).strftime('%Y-%m')})
+        self.assertEqual(window['next'], {'month': next_month.strftime('%Y-%m')})
+
+    def test_bad_windows_are_refused(self):
+        for params in (
+            {'start': self.first_date.isoformat(), 'end': date.today().isoformat()},
+            {'start': self.first_date.isoformat(), 'end': (self.first_date + timedelta(days=BOOKING_HORIZON_DAYS)).isoformat()},
+            {'start': (self.last_date + timedelta(days=1)).isoformat()},
+            {'month': 'soon'},
+        ):
+            with self.subTest(params):
+                with self.assertRaises(ValueError):
+                    get_booking_window(**params)
+
+                response = self.client.get(reverse('get_availability_calendar'), params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_calendar_returns_the_window_and_cursors(self):
+        use_temporary_grid(self)
+        start = self.first_date + timedelta(days=7)
+        end = start + timedelta(days=6)
+
+        payload = self.client.get(
+            reverse('get_availability_calendar'),
+            {'start': start.isoformat(), 'end': end.isoformat()}
+        ).json()
+
+        self.assertEqual(payload['window'], {'start': start.isoformat(), 'end': end.isoformat()})
+        self.assertEqual([day['date'] for day in payload['availability']], [
+            (start + timedelta(days=i)).isoformat() for i in range(7)
+        ])
+        self.assertEqual(payload['previous'], {
+            'start': self.first_date.isoformat(),
+            'end': (start - timedelta(days=1)).isoformat(),
+        })
+        self.assertEqual(payload['next']['start'], (end + timedelta(days=1)).isoformat())
+
+
+class BulkSlotCheckTests(TestCase):
+    """/api/check-slots/ answers a whole cart in one request, in the order given"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.morning, self.afternoon, self.evening = (slot.id for slot in slot_catalogue.SLOTS)
+
+    def check(self, slots, num_dogs=1):
+        return self.client.get(reverse('check_slots_availability'), {'slots': json.dumps(slots), 'num_dogs': num_dogs})
+
+    def test_results_for_each_slot(self):
+        book_group_walk(self.booking_date, self.afternoon, number_of_dogs=3)
+        GroupWalkSlotManager.set_dates_available([self.booking_date], ['evening'], False)
+
+        payload = self.check([
+            {'date': self.booking_date.isoformat(), 'timeSlot': self.afternoon},
+            {'date': self.booking_date.isoformat(), 'timeSlot': self.morning},
+            {'date': self.booking_date.isoformat(), 'timeSlot': self.evening},
+            {'date': date.today().isoformat(), 'timeSlot': self.morning},
+        ], num_dogs=2).json()
+
+        self.assertFalse(payload['can_book_all'])
+        self.assertEqual(
+            [(result['time_slot'], result['available_spots'], result['can_book']) for result in payload['slots']],
+            [(self.afternoon, 1, False), (self.morning, 4, True), (self.evening, 0, False), (self.morning, 0, False)]
+        )
+        self.assertEqual(payload['slots'][3]['message'], 'Cannot book walks for past dates')
+
+        self.assertTrue(self.check([{'date': self.booking_date.isoformat(), 'time_slot': self.morning}]).json()['can_book_all'])
+
+    def test_queries_do_not_grow_with_the_cart(self):
+        BookingSettings.get_settings()
+        slots = [(self.booking_date + timedelta(days=i), time_slot) for i in range(5) for time_slot in slot_catalogue.SLOT_IDS]
+
+        with CaptureQueriesContext(connection) as one_slot:
+            check_slots(slots[:1])
+        with CaptureQueriesContext(connection) as whole_cart:
+            results = check_slots(slots)
+
+        self.assertEqual(len(whole_cart), len(one_slot))
+        self.assertEqual(len(results), len(slots))
+
+    def test_bad_carts_are_refused(self):
+        url = reverse('check_slots_availability')
+        too_many = [{'date': self.booking_date.isoformat(), 'timeSlot': self.morning}] * (MAX_BULK_SLOTS + 1)
+
+        self.assertEqual(self.client.get(url, {'slots': 'not json'}).status_code, 400)
+        self.assertEqual(self.check([]).status_code, 400)
+        self.assertEqual(self.check([{'date': self.booking_date.isoformat()}]).status_code, 400)
+        self.assertEqual(self.check([{'date': 'tomorrow', 'timeSlot': self.morning}]).status_code, 400)
+        self.assertEqual(self.check(too_many).status_code, 400)
+
+        cart = [{'date': self.booking_date.isoformat(), 'timeSlot': self.morning}]
+        max_dogs = BookingSettings.get_settings().max_dogs_per_booking
+        self.assertEqual(self.check(cart, num_dogs=0).status_code, 400)
+        self.assertEqual(self.check(cart, num_dogs=max_dogs + 1).status_code, 400)
+        self.assertEqual(self.check(cart, num_dogs=max_dogs).status_code, 200)
+
+
+class AvailabilityFeedTests(TransactionTestCase):
+    """The SSE feed turns version bumps into remaining-capacity deltas for the booking calendar"""
+
+    def setUp(self):
+        use_temporary_grid(self)
+        self.booking_date = next_weekday()
+        self.morning, self.afternoon, self.evening = (slot.id for slot in slot_catalogue.SLOTS)
+        BookingSettings.get_settings()
+
+    def first_messages(self, count, last_event_id=None):
+        @async_to_sync
+        async def read():
+            stream = availability_feed.stream_events(last_event_id)
+            try:
+                return [await anext(stream) for _ in range(count)]
+            finally:
+                await stream.aclose()
+        return read()
+
+    def test_event_carries_the_remaining_capacity_of_changed_slots(self):
+        start = availability_cache.get_version()
+        book_group_walk(self.booking_date, self.morning, number_of_dogs=3)
+        GroupWalkSlotManager.set_dates_available([self.booking_date], ['afternoon'], False)
+
+        event = availability_feed.build_event(start, start + 2)
+
+        self.assertEqual(event, {
+            'version': start + 2,
+            'changes': [
+                [self.booking_date.isoformat(), self.morning, 1],
+                [self.booking_date.isoformat(), self.afternoon, None],
+            ],
+        })
+        self.assertEqual(
+            availability_feed.format_event(event).splitlines()[:2],
+            [f'id: {start + 2}', 'event: availability']
+        )
+
+    def test_client_resets_when_changes_are_unknown(self):
+        start = availability_cache.get_version()
+        # A settings change can affect every slot
+        BookingSettings.get_settings().save()
+
+        self.assertEqual(availability_feed.build_event(start, start + 1), {'version': start + 1, 'reset': True})
+        far_behind = start - availability_feed.MAX_CATCH_UP_VERSIONS - 1
+        self.assertTrue(availability_feed.build_event(far_behind, start + 1)['reset'])
+
+    def test_stream_catches_up_from_last_event_id(self):
+        start = availability_cache.get_version()
+
+        retry, ready = self.first_messages(2)
+        self.assertEqual(retry, f'retry: {availability_feed.RETRY_MS}\n\n')
+        self.assertTrue(ready.startswith(f'id: {start}\nevent: ready\n'))
+
+        book_group_walk(self.booking_date, self.morning)
+
+        retry, missed = self.first_messages(2, last_event_id=start)
+        self.assertIn('event: availability', missed)
+        self.assertIn(f'["{self.booking_date.isoformat()}","{self.morning}",3]', missed)
+
+    @override_settings(AVAILABILITY_FEED_POLL_INTERVAL=0.01)
+    def test_open_stream_hears_bookings_at_the_configured_interval(self):
+        @async_to_sync
+        async def read():
+            stream = availability_feed.stream_events()
+            try:
+                await anext(stream)
+                await anext(stream)
+                await sync_to_async(book_group_walk)(self.booking_date, self.morning)
+                return await asyncio.wait_for(anext(stream), timeout=5)
+            finally:
+                await stream.aclose()
+
+        self.assertIn(f'["{self.booking_date.isoformat()}","{self.morning}",3]', read())
+
+
+class AsyncReadPathTests(TestCase):
+    """The async availability reads give the same answers as the sync ones"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.morning, self.afternoon, self.evening = (slot.id for slot in slot_catalogue.SLOTS)
+        book_group_walk(self.booking_date, self.morning, number_of_dogs=2)
+        GroupWalkSlotManager.set_dates_available([self.booking_date], ['afternoon'], False)
+        GroupWalkSlotManager.set_dates_available([self.booking_date + timedelta(days=1)], slot_catalogue.SLOT_IDS, False)
+        AvailabilityRule.objects.create(name='No evenings', time_slots='evening')
+
+    def test_matrix_and_slot_checks_match_the_sync_versions(self):
+        matrix = async_to_sync(aload_capacity_matrix)(days_ahead=3, start_date=self.booking_date)
+        self.assertEqual(matrix, load_capacity_matrix(days_ahead=3, start_date=self.booking_date))
+        self.assertEqual(matrix[0][1], [2, None, None])
+
+        slots = [(self.booking_date, time_slot) for time_slot in slot_catalogue.SLOT_IDS]
+        self.assertEqual(async_to_sync(acheck_slots)(slots, 2), check_slots(slots, 2))
+
+    def test_async_endpoints(self):
+        check = self.client.get(reverse('check_slot_availability'), {
+            'date': self.booking_date.isoformat(), 'time_slot': self.morning, 'num_dogs': 3
+        }).json()
+        self.assertEqual((check['available_spots'], check['can_book']), (2, False))
+
+        # Nothing outside the catalogue or the booking limit reaches the cache
+        for time_slot, num_dogs in ((self.morning, 0), (self.morning, 5), ('00:00-23:59', 1)):
+            invalid = self.client.get(reverse('check_slot_availability'), {
+                'date': self.booking_date.isoformat(), 'time_slot': time_slot, 'num_dogs': num_dogs
+            })
+            self.assertEqual(invalid.status_code, 400)
+
+        unavailable = self.client.get(reverse('get_unavailable_dates')).json()
+        self.assertEqual(unavailable['unavailable_dates'], [(self.booking_date + timedelta(days=1)).isoformat()])
+
+        settings = self.client.get(reverse('get_bookings_settings')).json()
+        self.assertTrue(settings['settings']['allow_evening_slot'])
+
+
+class AvailabilityGridTests(TransactionTestCase):
+    """The shared grid serves the same capacity matrix as the database and follows every commit"""
+
+    def setUp(self):
+        use_temporary_grid(self)
+        self.tomorrow = date.today() + timedelta(days=1)
+        self.morning = slot_catalogue.SLOTS[0].id
+        BookingSettings.get_settings()
+
+    def read(self):
+        return availability_grid.read_matrix(self.tomorrow, 7)
+
+    def test_cells_pack_capacity_and_blocked_slots(self):
+        self.assertIsNone(availability_grid.decode_cell(availability_grid.encode_cell(None)))
+        self.assertEqual(availability_grid.decode_cell(availability_grid.encode_cell(3)), 3)
+        self.assertEqual(availability_grid.encode_cell(-1), 0)
+        self.assertEqual(availability_grid.encode_cell(500), availability_grid.CAPACITY_MASK)
+
+    def test_commits_update_the_grid(self):
+        GroupWalkSlotManager.set_dates_available([self.tomorrow + timedelta(days=1)], ['evening'], False)
+        version, matrix = self.read()
+        self.assertEqual(version, availability_cache.get_version())
+        self.assertEqual(matrix, load_capacity_matrix(days_ahead=7, start_date=self.tomorrow))
+
+        book_group_walk(self.tomorrow, self.morning, number_of_dogs=2)
+
+        version, matrix = self.read()
+        self.assertEqual(version, availability_cache.get_version())
+        self.assertEqual(matrix[0][1][0], slot_catalogue.SLOTS[0].default_capacity - 2)
+        self.assertEqual(matrix, load_capacity_matrix(days_ahead=7, start_date=self.tomorrow))
+
+    def test_missed_versions_rebuild_the_grid(self):
+        self.read()
+        # Written without a bump, then two versions this grid never saw
+        SlotOccupancy.objects.create(date=self.tomorrow, time_slot=self.morning, booked_dogs=3)
+        AvailabilityVersion.increment()
+        version = AvailabilityVersion.increment()
+
+        availability_grid.apply_changes(version, [])
+
+        grid_version, matrix = availability_grid.get_grid().read(self.tomorrow, 7)
+        self.assertEqual(grid_version, version)
+        self.assertEqual(matrix[0][1][0], slot_catalogue.SLOTS[0].default_capacity - 3)
+
+    def test_reads_wait_out_a_write(self):
+        self.read()
+        grid = availability_grid.get_grid()
+
+        sequence = grid.begin_write()
+        self.assertIsNone(grid.read(self.tomorrow, 7))
+        grid.end_write(sequence, grid.version(), self.tomorrow)
+        self.assertIsNotNone(grid.read(self.tomorrow, 7))
+
+    def test_etag_follows_versions_committed_elsewhere(self):
+        url = reverse('get_availability_calendar')
+        etag = self.client.get(url, {'days': 7}).headers['ETag']
+
+        # Committed by another machine, so this grid hasn't applied it
+        AvailabilityVersion.increment()
+        availability_grid.get_grid().last_version_check = 0
+
+        self.assertNotEqual(self.client.get(url, {'days': 7}).headers['ETag'], etag)
+
+    def test_grid_files_are_private_to_the_app(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, 'var', 'availability.grid')
+        availability_grid.AvailabilityGrid(path, slot_catalogue.SLOT_IDS, 7)
+
+        self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.stat(path + '.lock').st_mode & 0o777, 0o600)
+
+
+class NearestSlotTests(TestCase):
+    """find_nearest_slots ranks by days away, then time of day, then later date"""
+
+    def setUp(self):
+        self.wednesday = next_weekday(10)
+        while self.wednesday.weekday() != 2:
+            self.wednesday += timedelta(days=1)
+        self.tuesday = self.wednesday - timedelta(days=1)
+        self.thursday = self.wednesday + timedelta(days=1)
+        self.morning, self.afternoon, self.evening = (slot.id for slot in slot_catalogue.SLOTS)
+
+    def nearest(self, **kwargs):
+        slots = find_nearest_slots(self.wednesday, time_slot=self.afternoon, **kwargs)
+        return [(slot['date'], slot['time_slot']) for slot in slots]
+
+    def test_closest_slots_first(self):
+        self.assertEqual(self.nearest(limit=4), [
+            (self.wednesday, self.morning),
+            (self.wednesday, self.evening),
+            (self.thursday, self.afternoon),
+            (self.tuesday, self.afternoon),
+        ])
+
+    def test_full_and_closed_slots_are_skipped(self):
+        book_group_walk(self.wednesday, self.morning, number_of_dogs=3)
+        book_group_walk(self.thursday, self.afternoon, number_of_dogs=4)
+        GroupWalkSlotManager.set_dates_available([self.wednesday], ['evening'], False)
+
+        self.assertEqual(self.nearest(num_dogs=2, limit=3), [
+            (self.tuesday, self.afternoon),
+            (self.thursday, self.morning),
+            (self.thursday, self.evening),
+        ])
+        self.assertEqual(self.nearest(limit=1), [(self.wednesday, self.morning)])
+
+    def test_never_suggests_today_or_earlier(self):
+        tomorrow = date.today() + timedelta(days=1)
+        slots = find_nearest_slots(tomorrow, time_slot=self.morning, limit=20, max_distance=3)
+
+        self.assertEqual(len(slots), 11)
+        self.assertTrue(all(slot['date'] >= tomorrow for slot in slots))
+
+
+class SlotManagerChangelistTests(TestCase):
+    """with_booking_counts works out each date's bookings and utilization in the changelist query"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.closed_date = self.booking_date + timedelta(days=1)
+        self.morning, self.afternoon, self.evening = (slot.id for slot in slot_catalogue.SLOTS)
+
+        book_group_walk(self.booking_date, self.morning, number_of_dogs=4)
+        book_group_walk(self.booking_date, self.afternoon, index=1)
+        GroupWalkSlotManager.set_dates_available([self.booking_date], ['evening'], False)
+        SlotOverride.objects.create(
+            slot_manager=GroupWalkSlotManager.objects.get(date=self.booking_date),
+            time_slot=self.afternoon,
+            capacity=2
+        )
+        GroupWalkSlotManager.set_dates_available([self.closed_date], slot_catalogue.SLOT_IDS, False)
+
+    def test_annotations(self):
+        booked_date, closed_date = GroupWalkSlotManager.with_booking_counts().order_by('date')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [booked_date.available_spots(slot.id) for slot in slot_catalogue.SLOTS],
+                [0, 1, 0]
+            )
+            self.assertEqual((booked_date.open_capacity, booked_date.open_booked), (6, 5))
+            self.assertAlmostEqual(booked_date.utilization, 500 / 6)
+            self.assertFalse(booked_date.fully_booked)
+
+            self.assertTrue(closed_date.is_fully_unavailable)
+            self.assertIsNone(closed_date.utilization)
+            self.assertTrue(closed_date.fully_booked)
+
+    def test_changelist_queries_do_not_grow_with_the_dates(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:home_groupwalkslotmanager_changelist')
+
+        def changelist_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(queries)
+
+        two_dates = changelist_queries()
+        GroupWalkSlotManager.objects.bulk_create([
+            GroupWalkSlotManager(date=self.booking_date + timedelta(days=i)) for i in range(2, 12)
+        ])
+        self.assertEqual(changelist_queries(), two_dates)
+
+
+class SlotCatalogueTests(TestCase):
+    """Slots are looked up in the catalogue, and per-date SlotOverride rows win over it"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.slot_manager = GroupWalkSlotManager.objects.create(date=self.booking_date)
+        self.morning, self.afternoon, self.evening = slot_catalogue.SLOTS
+
+    def test_resolve_slots_by_id_or_key(self):
+        self.assertEqual(
+            slot_catalogue.resolve_slots(['evening', self.morning.id, 'morning']),
+            [self.morning, self.evening]
+        )
+        with self.assertRaises(ValueError):
+            slot_catalogue.resolve_slots(['midnight'])
+
+    def test_capacity_override(self):
+        override = SlotOverride.objects.create(slot_manager=self.slot_manager, time_slot=self.morning.id)
+        self.assertEqual(override.effective_capacity, self.morning.default_capacity)
+        override.capacity = 2
+        override.save()
+
+        with self.assertRaises(ValidationError):
+            book_group_walk(self.booking_date, self.morning.id, number_of_dogs=3)
+        book_group_walk(self.booking_date, self.morning.id, number_of_dogs=2)
+
+        morning, afternoon = check_slots([(self.booking_date, self.morning.id), (self.booking_date, self.afternoon.id)])
+        self.assertEqual((morning['max_capacity'], morning['available_spots']), (2, 0))
+        self.assertEqual(afternoon['max_capacity'], self.afternoon.default_capacity)
+
+    def test_override_reopens_a_slot_closed_by_a_rule(self):
+        AvailabilityRule.objects.create(name='No evenings', time_slots='evening')
+        SlotOverride.objects.create(slot_manager=self.slot_manager, time_slot=self.evening.id, is_available=True)
+        other_date = self.booking_date + timedelta(days=1)
+
+        reopened, closed = check_slots([(self.booking_date, self.evening.id), (other_date, self.evening.id)])
+        self.assertTrue(reopened['can_book'])
+        self.assertFalse(closed['can_book'])
+
+    def test_for_slots_only_returns_the_pairs_asked_for(self):
+        SlotOverride.objects.bulk_create([
+            SlotOverride(slot_manager=self.slot_manager, time_slot=self.morning.id, is_available=False),
+            SlotOverride(slot_manager=self.slot_manager, time_slot=self.afternoon.id, capacity=2),
+        ])
+
+        self.assertEqual(
+            SlotOverride.for_slots([(self.booking_date, self.afternoon.id), (self.booking_date, self.evening.id)]),
+            {(self.booking_date, self.afternoon.id): (True, 2)}
+        )
+
+
+class ClosureRuleTests(TestCase):
+    """Recurring closures apply the same way in memory and in the slot manager SQL"""
+
+    def setUp(self):
+        self.monday = next_weekday(14)
+        while self.monday.weekday() != 0:
+            self.monday += timedelta(days=1)
+        self.wednesday = self.monday + timedelta(days=2)
+        GroupWalkSlotManager.objects.bulk_create([
+            GroupWalkSlotManager(date=self.monday),
+            GroupWalkSlotManager(date=self.wednesday),
+        ])
+
+    def evening_available(self):
+        managers = GroupWalkSlotManager.with_booking_counts().order_by('date')
+        return [manager.evening_available for manager in managers]
+
+    def test_rule_limited_to_a_weekday(self):
+        AvailabilityRule.objects.create(name='No Monday evenings', weekdays='0', time_slots='evening')
+        rules = AvailabilityRule.load()
+
+        self.assertTrue(rules.is_closed(self.monday, '18:00-20:00'))
+        self.assertFalse(rules.is_closed(self.wednesday, '18:00-20:00'))
+        self.assertFalse(rules.is_closed(self.monday, '09:30-11:30'))
+        self.assertEqual(self.evening_available(), [False, True])
+
+    def test_rule_for_every_date(self):
+        AvailabilityRule.objects.create(name='No evenings', time_slots='evening')
+
+        self.assertTrue(AvailabilityRule.load().is_closed(self.wednesday, '18:00-20:00'))
+        self.assertEqual(self.evening_available(), [False, False])
+
+    def test_rule_for_every_date_with_a_limited_rule(self):
+        AvailabilityRule.objects.create(name='No evenings', time_slots='evening')
+        AvailabilityRule.objects.create(name='No Monday evenings', weekdays='0', time_slots='evening')
+
+        self.assertEqual(self.evening_available(), [False, False])
+        managers = GroupWalkSlotManager.with_booking_counts()
+        self.assertTrue(all(manager.morning_available for manager in managers))
+
+
+class DateRangeClosureTests(TestCase):
+    """Closing and reopening a range of dates is one transaction with a fixed number of queries"""
+
+    def setUp(self):
+        self.start = next_weekday()
+
+    def dates(self, count, offset=0):
+        return [self.start + timedelta(days=offset + i) for i in range(count)]
+
+    def test_queries_do_not_grow_with_the_range(self):
+        with CaptureQueriesContext(connection) as short_range:
+            GroupWalkSlotManager.set_dates_available(self.dates(2), slot_catalogue.SLOT_IDS, False, notes='Holiday')
+        with CaptureQueriesContext(connection) as long_range:
+            changed = GroupWalkSlotManager.set_dates_available(self.dates(14, offset=2), slot_catalogue.SLOT_IDS, False, notes='Holiday')
+
+        self.assertEqual(len(long_range), len(short_range))
+        self.assertEqual(len(changed), 14 * len(slot_catalogue.SLOTS))
+        self.assertEqual(SlotOverride.objects.count(), 16 * len(slot_catalogue.SLOTS))
+        # Closing again changes nothing
+        self.assertEqual(GroupWalkSlotManager.set_dates_available(self.dates(16), ['morning'], False), [])
+
+    def test_reopening_removes_the_overrides_and_notes(self):
+        GroupWalkSlotManager.set_dates_available(self.dates(3), slot_catalogue.SLOT_IDS, False, notes='Holiday')
+
+        GroupWalkSlotManager.set_dates_available(self.dates(3), ['morning'], True)
+        self.assertEqual(list(GroupWalkSlotManager.objects.values_list('notes', flat=True)), ['Holiday'] * 3)
+
+        changed = GroupWalkSlotManager.set_dates_available(self.dates(3), ['afternoon', 'evening'], True)
+        self.assertEqual(len(changed), 6)
+        self.assertFalse(SlotOverride.objects.exists())
+        self.assertEqual(list(GroupWalkSlotManager.objects.values_list('notes', flat=True)), [''] * 3)
+
+    def test_admin_range_closure_cancels_and_notifies_once_committed(self):
+        from django.contrib.auth.models import User
+
+        first, last = self.dates(5)[0], self.dates(5)[-1]
+        bookings = [
+            book_group_walk(first, slot_catalogue.SLOTS[0].id),
+            book_group_walk(last, slot_catalogue.SLOTS[1].id, index=1),
+            book_group_walk(last + timedelta(days=1), slot_catalogue.SLOTS[1].id, index=2),
+        ]
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('mark_dates_unavailable'),
+                json.dumps({'start': first.isoformat(), 'end': last.isoformat(), 'reason': 'Holiday'}),
+                content_type='application/json'
+            ).json()
+            self.assertEqual(EmailOutbox.objects.count(), 0)
+
+        self.assertTrue(response['success'])
+        self.assertEqual((response['cancelled_count'], response['changed_slots']), (2, 5 * len(slot_catalogue.SLOTS)))
+        self.assertEqual(
+            [booking.status for booking in GroupWalk.objects.filter(pk__in=[booking.pk for booking in bookings]).order_by('booking_date')],
+            ['cancelled', 'cancelled', 'confirmed']
+        )
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+class ClosureImportTests(TestCase):
+    """Holiday calendars exported as ICS or CSV become closed slots"""
+
+    def setUp(self):
+        self.start = next_weekday(14)
+        self.morning, self.afternoon, self.evening = slot_catalogue.SLOT_IDS
+
+    def ics(self, *events):
+        return '\r\n'.join(['BEGIN:VCALENDAR', 'VERSION:2.0', *events, 'END:VCALENDAR'])
+
+    def test_ics_events(self):
+        day = self.start.strftime('%Y%m%d')
+        closures, warnings = closure_import.parse_closures('holidays.ics', self.ics(
+            'BEGIN:VEVENT', 'SUMMARY:Christmas\\, family', '  visit', f'DTSTART;VALUE=DATE:{day}',
+            f'DTEND;VALUE=DATE:{(self.start + timedelta(days=2)).strftime("%Y%m%d")}', 'END:VEVENT',
+            'BEGIN:VEVENT', 'SUMMARY:Vet appointment', f'DTSTART:{day}T133000', f'DTEND:{day}T150000', 'END:VEVENT',
+            'BEGIN:VEVENT', 'SUMMARY:Called off', f'DTSTART:{day}T090000', 'STATUS:CANCELLED', 'END:VEVENT',
+            'BEGIN:VEVENT', 'SUMMARY:Team day', f'DTSTART;VALUE=DATE:{day}', 'RRULE:FREQ=WEEKLY', 'END:VEVENT',
+        ))
+
+        self.assertEqual([closure.reason for closure in closures], ['Christmas, family visit', 'Vet appointment', 'Team day'])
+        self.assertEqual((closures[0].start, closures[0].end), (self.start, self.start + timedelta(days=1)))
+        self.assertEqual(len(warnings), 1)
+
+        slots_by_date, notes = closure_import.expand_closures(closures[1:2])
+        self.assertEqual(slots_by_date, {self.start: {self.afternoon}})
+
+        with self.assertRaises(ValueError):
+            closure_import.parse_closures('holidays.ics', 'BEGIN:VEVENT')
+
+    def test_csv_rows(self):
+        closures, warnings = closure_import.parse_closures('closures.csv', (
+            'date,end_date,slots,reason\n'
+            f'{self.start.isoformat()},,morning;evening,Beach clean\n'
+            ',,,\n'
+            f'{self.start.strftime("%d/%m/%Y")},{(self.start + timedelta(days=3)).isoformat()},,\n'
+        ).encode('utf-8-sig'))
+
+        self.assertEqual(closures[0].slots, (self.morning, self.evening))
+        self.assertEqual(closures[0].reason, 'Beach clean')
+        self.assertEqual((closures[1].end, closures[1].slots), (self.start + timedelta(days=3), slot_catalogue.SLOT_IDS))
+        self.assertEqual(closures[1].reason, closure_import.DEFAULT_REASON)
+        self.assertEqual(warnings, ['Line 3: skipped, no date'])
+
+        for content in ('reason\nHoliday\n', 'date\nnext week\n', 'date,slots\n2030-01-01,midnight\n'):
+            with self.subTest(content):
+                with self.assertRaises(ValueError):
+                    closure_import.parse_closures('closures.csv', content)
+
+    def test_import_closes_slots_and_cancels_conflicts(self):
+        morning_booking = book_group_walk(self.start, self.morning)
+        afternoon_booking = book_group_walk(self.start, self.afternoon, index=1)
+        closures = [
+            closure_import.Closure(self.start, self.start, (self.morning,), 'Beach clean', None),
+            closure_import.Closure(date.today(), date.today(), slot_catalogue.SLOT_IDS, 'Too late', None),
+        ]
+
+        preview = closure_import.import_closures(closures, dry_run=True)
+        self.assertEqual(preview['conflicts'], [morning_booking])
+        self.assertEqual(preview['skipped_dates'], [date.today()])
+        self.assertFalse(SlotOverride.objects.exists())
+
+        result = closure_import.import_closures(closures, cancel_bookings=True)
+        self.assertEqual((result['dates'], result['closed_slots'], result['cancelled_count']), ([self.start], 1, 1))
+        self.assertFalse(SlotOverride.for_slots([(self.start, self.morning)])[(self.start, self.morning)][0])
+        self.assertEqual(GroupWalkSlotManager.objects.get(date=self.start).notes, 'Beach clean')
+
+        morning_booking.refresh_from_db()
+        afternoon_booking.refresh_from_db()
+        self.assertEqual((morning_booking.status, afternoon_booking.status), ('cancelled', 'confirmed'))
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Parallel bookings must never push a slot over capacity"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.slot = slot_catalogue.SLOTS[0]
+
+    def booking_post(self, index, time_slot):
+        return group_booking_post(index, self.booking_date, time_slot)
+
+    def assert_within_capacity(self, time_slot, capacity):
+        confirmed = GroupWalk.objects.filter(
+            booking_date=self.booking_date,
+            time_slot=time_slot,
+            status='confirmed'
+        )
+        booked_dogs = sum(booking.number_of_dogs for booking in confirmed)
+        self.assertLessEqual(booked_dogs, capacity)
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, time_slot), booked_dogs)
+        return booked_dogs
+
+    def test_parallel_posts_never_overbook_a_slot(self):
+        requests = self.slot.default_capacity * 3
+
+        def book(index):
+            response = Client().post(reverse('group_walking_booking'), self.booking_post(index, self.slot.id))
+            return response.json()['success']
+
+        results = run_in_parallel(book, requests)
+
+        booked_dogs = self.assert_within_capacity(self.slot.id, self.slot.default_capacity)
+        self.assertEqual(booked_dogs, self.slot.default_capacity)
+        self.assertEqual(results.count(True), self.slot.default_capacity)
+
+    def test_parallel_saves_fill_each_slot_exactly(self):
+        slots = slot_catalogue.SLOTS[:2]
+        requests = sum(slot.default_capacity for slot in slots) * 2
+
+        def book(index):
+            slot = slots[index % len(slots)]
+            GroupWalk(
+                customer_name=f'Customer {index}',
+                customer_email=f'customer{index}@example.com',
+                customer_phone='07123456789',
+                customer_address='1 Beach Road',
+                customer_postcode='EX33 1AA',
+                booking_date=self.booking_date,
+                time_slot=slot.id,
+                number_of_dogs=1,
+            ).save()
+            return True
+
+        results = run_in_parallel(book, requests)
+
+        for slot in slots:
+            self.assertEqual(self.assert_within_capacity(slot.id, slot.default_capacity), slot.default_capacity)
+        self.assertEqual(results.count(True), sum(slot.default_capacity for slot in slots))
+
+    def test_only_booking_transactions_take_the_write_lock_up_front(self):
+        def begins(queries):
+            return [query['sql'] for query in queries.captured_queries if query['sql'].startswith('BEGIN')]
+
+        with CaptureQueriesContext(connection) as booking:
+            book_group_walk(self.booking_date, self.slot.id)
+        with CaptureQueriesContext(connection) as other:
+            with transaction.atomic():
+                BookingSettings.get_settings().save()
+
+        if connection.vendor == 'sqlite':
+            self.assertIn('BEGIN IMMEDIATE', begins(booking))
+            self.assertNotIn('BEGIN IMMEDIATE', begins(other))
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, self.slot.id), 1)
+
+
+class SlotReservationTests(TestCase):
+    """reserve/release keep SlotOccupancy in step with confirmed bookings"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.slot = slot_catalogue.SLOTS[0]
+
+    def book(self, number_of_dogs):
+        booking = GroupWalk(
+            customer_name='Customer',
+            customer_email='customer@example.com',
+            customer_phone='07123456789',
+            customer_address='1 Beach Road',
+            customer_postcode='EX33 1AA',
+            booking_date=self.booking_date,
+            time_slot=self.slot.id,
+            number_of_dogs=number_of_dogs,
+        )
+        booking.save()
+        return booking
+
+    def booked(self):
+        return SlotOccupancy.booked_for(self.booking_date, self.slot.id)
+
+    def test_reserve_is_refused_when_the_dogs_do_not_fit(self):
+        self.assertTrue(SlotOccupancy.reserve(self.booking_date, self.slot.id, 3, capacity=4))
+        self.assertFalse(SlotOccupancy.reserve(self.booking_date, self.slot.id, 2, capacity=4))
+        self.assertTrue(SlotOccupancy.reserve(self.booking_date, self.slot.id, 1, capacity=4))
+        self.assertEqual(self.booked(), 4)
+
+    def test_cancel_complete_and_delete_release_the_dogs(self):
+        cancelled = self.book(2)
+        completed = self.book(1)
+        deleted = self.book(1)
+        self.assertEqual(self.booked(), 4)
+        with self.assertRaises(ValidationError):
+            self.book(1)
+
+        cancelled.cancel()
+        self.assertEqual(self.booked(), 2)
+
+        completed.status = 'completed'
+        completed.save()
+        self.assertEqual(self.booked(), 1)
+
+        deleted.delete()
+        self.assertEqual(self.booked(), 0)
+
+    def test_release_never_goes_below_zero(self):
+        self.book(1)
+        SlotOccupancy.release(self.booking_date, self.slot.id, 1)
+        SlotOccupancy.release(self.booking_date, self.slot.id, 1)
+        self.assertEqual(self.booked(), 0)
+
+    def test_failed_booking_rolls_back_its_reservation(self):
+        post = group_booking_post(1, self.booking_date, self.slot.id)
+        with mock.patch.object(DogProfile, 'for_owner', side_effect=RuntimeError('database went away')):
+            response = self.client.post(reverse('group_walking_booking'), post)
+
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(self.booked(), 0)
+        self.assertFalse(GroupWalk.objects.exists())
+
+
+class BulkBookingTests(TestCase):
+    """create_many inserts a multi-slot cart's bookings and dog links with one INSERT each"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.dog_details = [
+            {'name': name, 'breed': 'Collie', 'age': 3, 'vet_name': 'Vet', 'vet_phone': '01271000000', 'vet_address': 'Braunton'}
+            for name in ('Rex', 'Fido')
+        ]
+
+    def bookings(self, count):
+        return [
+            GroupWalk(
+                customer_name='Customer',
+                customer_email='customer@example.com',
+                customer_phone='07123456789',
+                customer_address='1 Beach Road',
+                customer_postcode='EX33 1AA',
+                booking_date=self.booking_date + timedelta(days=i // len(slot_catalogue.SLOTS)),
+                time_slot=slot_catalogue.SLOTS[i % len(slot_catalogue.SLOTS)].id,
+                number_of_dogs=len(self.dog_details),
+            )
+            for i in range(count)
+        ]
+
+    def test_one_insert_per_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            bookings = GroupWalk.create_many(self.bookings(5), self.dog_details)
+
+        inserts = [query['sql'].split('"')[1] for query in queries.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(inserts.count(GroupWalk._meta.db_table), 1)
+        self.assertEqual(inserts.count(GroupWalk.dogs.through._meta.db_table), 1)
+
+        self.assertTrue(all(booking.pk and booking.status == 'confirmed' for booking in bookings))
+        self.assertEqual(GroupWalk.dogs.through.objects.count(), 5 * len(self.dog_details))
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, slot_catalogue.SLOTS[0].id), len(self.dog_details))
+        with self.assertNumQueries(0):
+            self.assertEqual([dog.name for dog in bookings[-1].dogs.all()], ['Fido', 'Rex'])
+
+    def test_nothing_is_saved_when_a_slot_is_full(self):
+        book_group_walk(self.booking_date + timedelta(days=1), slot_catalogue.SLOTS[0].id, number_of_dogs=3)
+
+        with self.assertRaises(ValidationError):
+            GroupWalk.create_many(self.bookings(4), self.dog_details)
+
+        self.assertEqual(GroupWalk.objects.count(), 1)
+        self.assertEqual(SlotOccupancy.booked_for(self.booking_date, slot_catalogue.SLOTS[0].id), 0)
+        self.assertFalse(DogProfile.objects.exists())
+
+
+class DogProfileTests(TestCase):
+    """Bookings link to the customer's dog profiles instead of copying the dogs"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+
+    def book(self, email, dog_details):
+        bookings = [
+            GroupWalk(
+                customer_name='Customer',
+                customer_email=email,
+                customer_phone='07123456789',
+                customer_address='1 Beach Road',
+                customer_postcode='EX33 1AA',
+                booking_date=self.booking_date,
+                time_slot=slot.id,
+                number_of_dogs=len(dog_details),
+            )
+            for slot in slot_catalogue.SLOTS[:2]
+        ]
+        return GroupWalk.create_many(bookings, dog_details)
+
+    def dog(self, name, age=3):
+        return {'name': name, 'breed': 'Collie', 'age': age, 'vet_name': 'Vet', 'vet_phone': '01271000000', 'vet_address': 'Braunton'}
+
+    def test_repeat_bookings_reuse_and_update_the_profiles(self):
+        first = self.book('customer@example.com', [self.dog('Rex'), self.dog('Fido')])
+        second = self.book('Customer@Example.com ', [self.dog(' rex ', age=4)])
+
+        self.assertEqual(DogProfile.objects.count(), 2)
+        rex = DogProfile.objects.get(name='Rex')
+        self.assertEqual(rex.age, 4)
+        self.assertEqual(rex.owner_email, 'customer@example.com')
+        self.assertEqual(rex.group_walks.count(), len(first) + len(second))
+        self.assertEqual([dog.name for dog in second[0].dogs.all()], ['Rex'])
+
+    def test_other_customers_get_their_own_profiles(self):
+        self.book('customer@example.com', [self.dog('Rex')])
+        self.book('other@example.com', [self.dog('Rex')])
+
+        self.assertEqual(DogProfile.objects.filter(name='Rex').count(), 2)
+
+    def test_vet_and_health_changes_wait_for_review(self):
+        self.book('customer@example.com', [self.dog('Rex')])
+        changed = dict(self.dog('Rex'), vet_name='Other Vet', allergies='Chicken', good_with_other_dogs=False)
+        self.book('customer@example.com', [changed])
+        self.book('customer@example.com', [changed])
+
+        rex = DogProfile.objects.get()
+        self.assertEqual((rex.vet_name, rex.allergies, rex.good_with_other_dogs), ('Vet', None, True))
+        self.assertEqual(rex.pending_details, {'vet_name': 'Other Vet', 'allergies': 'Chicken', 'good_with_other_dogs': False})
+
+        rex.apply_pending_details()
+        rex.refresh_from_db()
+        self.assertEqual((rex.vet_name, rex.allergies, rex.good_with_other_dogs), ('Other Vet', 'Chicken', False))
+        self.assertIsNone(rex.pending_details)
+
+
+class CustomerTests(TestCase):
+    """Bookings link to one Customer per email, which the prefill lookup finds"""
+
+    def book(self, email, name='Customer', time_slot=None):
+        booking = GroupWalk(
+            customer_name=name,
+            customer_email=email,
+            customer_phone='07123456789',
+            customer_address='1 Beach Road',
+            customer_postcode='EX33 1AA',
+            booking_date=next_weekday(),
+            time_slot=time_slot or slot_catalogue.SLOTS[0].id,
+            number_of_dogs=1,
+        )
+        booking.save()
+        return booking
+
+    def test_bookings_share_a_customer_without_changing_their_details(self):
+        first = self.book('Customer@Example.com')
+        second = self.book(' customer@example.com', name='New Name', time_slot=slot_catalogue.SLOTS[1].id)
+
+        self.assertEqual(Customer.objects.count(), 1)
+        customer = Customer.objects.get()
+        self.assertEqual(customer.email, 'customer@example.com')
+        self.assertEqual(customer.name, 'Customer')
+        self.assertEqual({booking.pk for booking in customer.bookings()}, {first.pk, second.pk})
+        self.assertEqual(second.customer_name, 'New Name')
+
+    def test_lookup_needs_the_matching_postcode(self):
+        self.book('customer@example.com')
+        url = reverse('returning_customer_lookup')
+
+        DogProfile.for_owner('customer@example.com', 'Customer', [
+            {'name': 'Rex', 'breed': 'Collie', 'age': 3, 'vet_name': 'Vet', 'vet_phone': '01271000000', 'vet_address': 'Braunton'}
+        ])
+
+        found = self.client.post(url, {'email': 'CUSTOMER@example.com', 'postcode': 'ex331aa'}).json()
+        self.assertTrue(found['found'])
+        # Only what the dog forms need - no contact or vet details
+        self.assertNotIn('customer', found)
+        self.assertEqual(found['dogs'], [{'name': 'Rex', 'breed': 'Collie', 'age': 3}])
+
+        wrong_postcode = self.client.post(url, {'email': 'customer@example.com', 'postcode': 'EX34 9ZZ'}).json()
+        self.assertEqual(wrong_postcode, {'success': True, 'found': False})
+
+        # Booking with someone else's email doesn't move their postcode to the booker's
+        other = GroupWalk(
+            customer_name='Someone Else',
+            customer_email='customer@example.com',
+            customer_phone='07000000000',
+            customer_address='2 Other Road',
+            customer_postcode='EX34 9ZZ',
+            booking_date=next_weekday(),
+            time_slot=slot_catalogue.SLOTS[1].id,
+            number_of_dogs=1,
+        )
+        other.save()
+        self.assertFalse(self.client.post(url, {'email': 'customer@example.com', 'postcode': 'EX34 9ZZ'}).json()['found'])
+        self.assertTrue(self.client.post(url, {'email': 'customer@example.com', 'postcode': 'EX33 1AA'}).json()['found'])
+
+    def test_admin_email_search(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+
+        linked = self.book('customer@example.com')
+        unlinked = self.book('other@gmail.com', time_slot=slot_catalogue.SLOTS[1].id)
+        GroupWalk.objects.filter(pk=unlinked.pk).update(customer=None)
+        model_admin = site._registry[GroupWalk]
+        request = RequestFactory().get('/')
+
+        def search(term):
+            results, may_have_duplicates = model_admin.get_search_results(request, GroupWalk.objects.all(), term)
+            return {booking.pk for booking in results}
+
+        self.assertEqual(search('Customer@Example.com'), {linked.pk})
+        self.assertEqual(search('other@gmail.com'), {unlinked.pk})
+        self.assertEqual(search('@gmail.com'), {unlinked.pk})
+        self.assertEqual(search('@example.com'), {linked.pk})
+
+    def test_lookup_is_throttled_per_email(self):
+        self.book('customer@example.com')
+        url = reverse('returning_customer_lookup')
+
+        statuses = [
+            self.client.post(url, {'email': 'customer@example.com', 'postcode': f'EX3{index} 1AA'}, REMOTE_ADDR=f'10.0.0.{index}').status_code
+            for index in range(7)
+        ]
+        self.assertEqual(statuses, [200] * 5 + [429] * 2)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_lookup_is_throttled_per_forwarded_client(self):
+        url = reverse('returning_customer_lookup')
+
+        def lookup(index, client):
+            # Every request reaches the app from the proxy's address
+            return self.client.post(
+                url, {'email': f'customer{index}@example.com', 'postcode': 'EX33 1AA'},
+                REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'203.0.113.99, {client}'
+            ).status_code
+
+        statuses = [lookup(index, '198.51.100.1') for index in range(6)]
+        self.assertEqual(statuses, [200] * 5 + [429])
+        self.assertEqual(lookup(6, '198.51.100.2'), 200)
+
+
+class FakeCalendarService:
+    """Stands in for GoogleCalendarService, recording the calls the worker makes"""
+
+    def __init__(self, working=True):
+        self.service = object()
+        self.working = working
+        self.deleted = set()
+
+    def create_group_walk_event(self, booking):
+        return f'event-{booking.pk}' if self.working else None
+
+    def delete_events(self, event_ids):
+        if self.working:
+            self.deleted.update(event_ids)
+            return set(event_ids)
+        return set()
+
+
+class CalendarSyncTests(TestCase):
+    """Calendar changes are queued with the booking and carried out by the worker"""
+
+    def book(self):
+        booking = GroupWalk(
+            customer_name='Customer',
+            customer_email='customer@example.com',
+            customer_phone='07123456789',
+            customer_address='1 Beach Road',
+            customer_postcode='EX33 1AA',
+            booking_date=next_weekday(),
+            time_slot=slot_catalogue.SLOTS[0].id,
+            number_of_dogs=1,
+        )
+        booking.save()
+        booking.create_calendar_event()
+        return booking
+
+    def test_worker_creates_then_deletes_the_event(self):
+        booking = self.book()
+        calendar = FakeCalendarService()
+
+        self.assertEqual(calendar_sync.process_pending(calendar_service=calendar), (1, 0))
+        booking.refresh_from_db()
+        self.assertEqual(booking.calendar_event_id, f'event-{booking.pk}')
+        self.assertFalse(CalendarSyncTask.objects.exists())
+
+        booking.cancel()
+        self.assertEqual(calendar_sync.process_pending(calendar_service=calendar), (1, 0))
+        self.assertEqual(calendar.deleted, {f'event-{booking.pk}'})
+        booking.refresh_from_db()
+        self.assertIsNone(booking.calendar_event_id)
+
+    def test_event_for_a_booking_cancelled_meanwhile_is_deleted(self):
+        booking = self.book()
+        GroupWalk.objects.filter(pk=booking.pk).update(status='cancelled')
+        calendar = FakeCalendarService()
+
+        # Claimed while still confirmed, cancelled before the id is written back
+        tasks = calendar_sync.tasks_queue.claim()
+        calendar_sync.create_event(calendar, tasks[0], booking)
+
+        self.assertEqual(list(CalendarSyncTask.objects.filter(action='delete').values_list('event_id', flat=True)), [f'event-{booking.pk}'])
+
+    def test_failures_back_off_then_give_up(self):
+        self.book()
+        calendar = FakeCalendarService(working=False)
+
+        self.assertEqual(calendar_sync.process_pending(calendar_service=calendar), (0, 1))
+        task = CalendarSyncTask.objects.get()
+        self.assertEqual((task.status, task.attempts), ('pending', 1))
+        self.assertGreater(task.next_attempt_at, timezone.now())
+        self.assertEqual(calendar_sync.process_pending(calendar_service=calendar), (0, 0))
+
+        for attempt in range(CalendarSyncTask.MAX_ATTEMPTS - 1):
+            CalendarSyncTask.objects.update(next_attempt_at=timezone.now())
+            calendar_sync.process_pending(calendar_service=calendar)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('failed', CalendarSyncTask.MAX_ATTEMPTS))
+
+
+class BrokenConnection:
+    """A mail connection whose server never accepts anything"""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError("Mail server unavailable")
+
+
+class EmailOutboxTests(TestCase):
+    """Emails are queued in the outbox and delivered by the worker"""
+
+    def setUp(self):
+        self.booking = GroupWalk(
+            customer_name='Customer',
+            customer_email='customer@example.com',
+            customer_phone='07123456789',
+            customer_address='1 Beach Road',
+            customer_postcode='EX33 1AA',
+            booking_date=next_weekday(),
+            time_slot=slot_catalogue.SLOTS[0].id,
+            number_of_dogs=1,
+        )
+        self.booking.save()
+
+    def cancel(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_bookings_for_closed_slots([(self.booking.booking_date, self.booking.time_slot)], 'Flooding')
+
+    def test_cancellation_email_is_queued_once_and_sent_by_the_worker(self):
+        self.cancel()
+        self.assertEqual(len(mail.outbox), 0)
+        queued = EmailOutbox.objects.get()
+        self.assertEqual(queued.dedupe_key, f'cancellation:{self.booking.pk}')
+
+        # A repeat of the same notice is dropped
+        EmailOutbox.enqueue([(queued.to_message(), queued.dedupe_key)])
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+        self.assertEqual(email_outbox.process_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['customer@example.com'])
+        self.assertIn('Flooding', mail.outbox[0].body)
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+        self.assertEqual(email_outbox.process_pending(), (0, 0))
+
+    def test_failures_back_off_then_dead_letter(self):
+        self.cancel()
+
+        self.assertEqual(email_outbox.process_pending(connection=BrokenConnection()), (0, 1))
+        queued = EmailOutbox.objects.get()
+        self.assertEqual((queued.status, queued.attempts), ('pending', 1))
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+
+        for attempt in range(EmailOutbox.MAX_ATTEMPTS - 1):
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            email_outbox.process_pending(connection=BrokenConnection())
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', EmailOutbox.MAX_ATTEMPTS))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class IdempotencyKeyTests(TestCase):
+    """A retried booking POST with the same Idempotency-Key is answered from the first response"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        self.post = group_booking_post(1, self.booking_date, slot_catalogue.SLOTS[0].id)
+
+    def book(self, data, key='retry-key'):
+        return self.client.post(reverse('group_walking_booking'), data, headers={'Idempotency-Key': key})
+
+    def test_retry_replays_the_response_without_booking_again(self):
+        first = self.book(self.post)
+        self.assertTrue(first.json()['success'])
+
+        retry = self.book(self.post)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(GroupWalk.objects.count(), 1)
+
+        # The same key can't be reused for a different booking
+        other = dict(self.post, time_slot=slot_catalogue.SLOTS[1].id)
+        self.assertEqual(self.book(other).status_code, 422)
+        self.assertEqual(GroupWalk.objects.count(), 1)
+
+    def test_abandoned_claim_can_be_retried_after_its_lease(self):
+        # A request that died mid-way leaves its claim behind
+        from .decorators import claim_idempotency_key, request_fingerprint
+        from django.test import RequestFactory
+
+        request = RequestFactory().post(reverse('group_walking_booking'), self.post)
+        claim, existing = claim_idempotency_key('retry-key', request.path, request_fingerprint(request))
+        self.assertEqual(self.book(self.post).status_code, 409)
+
+        IdempotencyKey.objects.filter(pk=claim.pk).update(expires_at=timezone.now())
+        retry = self.book(self.post)
+        self.assertTrue(retry.json()['success'])
+        self.assertEqual(GroupWalk.objects.count(), 1)
+
+    def test_failed_bookings_are_not_replayed(self):
+        failed = self.book(dict(self.post, customer_postcode='ZZ1 1AA'))
+        self.assertFalse(failed.json()['success'])
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        # The same key is free for the corrected booking
+        self.assertTrue(self.book(self.post).json()['success'])
+
+    def test_expired_keys_are_cleared(self):
+        self.book(self.post)
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        self.book(group_booking_post(2, self.booking_date, slot_catalogue.SLOTS[1].id), key='new-key')
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new-key'])
+
+
+class CartValidationTests(TestCase):
+    """validate_group_walk_cart checks a whole multi-slot cart with a fixed number of queries"""
+
+    def setUp(self):
+        self.booking_date = next_weekday()
+        post = group_booking_post(1, self.booking_date, slot_catalogue.SLOTS[0].id)
+        self.customer_data = {field: post[field] for field in (
+            'customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_postcode', 'number_of_dogs'
+        )}
+        BookingSettings.get_settings()
+
+    def cart(self, slots):
+        return [{'date': self.booking_date.isoformat(), 'timeSlot': slot.id} for slot in slots]
+
+    def test_queries_do_not_grow_with_the_cart(self):
+        # Settings, slot overrides, rules and occupancy
+        with self.assertNumQueries(4):
+            bookings, failures = validate_group_walk_cart(self.customer_data, self.cart(slot_catalogue.SLOTS))
+
+        self.assertEqual(failures, [])
+        self.assertEqual([booking.time_slot for booking in bookings], [slot.id for slot in slot_catalogue.SLOTS])
+
+    def test_dogs_on_the_same_slot_count_together(self):
+        slot = slot_catalogue.SLOTS[0]
+        bookings, failures = validate_group_walk_cart(self.customer_data, self.cart([slot] * (slot.default_capacity + 1)))
+
+        self.assertEqual(len(failures), 1)
+        self.assertIn('Only 0 spots remaining', failures[0][1]['__all__'][0])
+
+    def test_capacity_comes_from_the_slot_and_the_settings(self):
+        morning, evening = slot_catalogue.SLOTS[0], slot_catalogue.SLOTS[2]
+        book_group_walk(self.booking_date, morning.id, number_of_dogs=2)
+        booking_settings = BookingSettings.get_settings()
+        booking_settings.max_dogs_per_booking = 2
+        booking_settings.allow_evening_slot = False
+        booking_settings.save()
+
+        def form(slot):
+            return GroupWalkForm({
+                **self.customer_data, 'number_of_dogs': '2',
+                'booking_date': self.booking_date.isoformat(), 'time_slot': slot.id,
+            })
+
+        # The slot's own capacity applies, not the per-booking dog limit
+        self.assertTrue(form(morning).is_valid(), form(morning).errors)
+        bookings, failures = validate_group_walk_cart(dict(self.customer_data, number_of_dogs='2'), self.cart([morning]))
+        self.assertEqual(failures, [])
+
+        # A slot switched off in the settings is refused everywhere
+        self.assertFalse(form(evening).is_valid())
+        bookings, failures = validate_group_walk_cart(self.customer_data, self.cart([evening]))
+        self.assertEqual(len(failures), 1)
+        check = self.client.get(reverse('check_slot_availability'), {
+            'date': self.booking_date.isoformat(), 'time_slot': evening.id
+        }).json()
+        self.assertFalse(check['can_book'])
+        bulk = self.client.get(reverse('check_slots_availability'), {'slots': json.dumps(self.cart([evening]))}).json()
+        self.assertFalse(bulk['can_book_all'])
+
+
+class AvailabilityVersionTests(TransactionTestCase):
+    """Every commit gets its own availability version, and cache reads never write"""
+
+    def setUp(self):
+        use_temporary_grid(self)
+
+    def test_parallel_bumps_each_get_a_version(self):
+        # Creating the settings row bumps the version itself
+        BookingSettings.get_settings()
+        start = availability_cache.get_version()
+
+        versions = run_in_parallel(lambda index: availability_cache.bump_version([]), 8)
+
+        self.assertEqual(sorted(versions), list(range(start + 1, start + 9)))
+        self.assertEqual(availability_cache.get_version(), start + 8)
+
+    def test_one_bump_per_commit_and_none_for_rollbacks(self):
+        BookingSettings.get_settings()
+        booking_date = next_weekday()
+        morning, afternoon = slot_catalogue.SLOT_IDS[:2]
+        start = availability_cache.get_version()
+
+        with self.assertRaises(ValidationError):
+            with write_transaction():
+                book_group_walk(booking_date, morning)
+                raise ValidationError('Abandoned')
+        self.assertEqual(availability_cache.get_version(), start)
+
+        with write_transaction():
+            book_group_walk(booking_date, afternoon)
+            book_group_walk(booking_date, afternoon, index=1)
+
+        # Only the committed slot changed, in a single version
+        version = availability_cache.get_version()
+        self.assertEqual(version, start + 1)
+        self.assertEqual(availability_cache.get_changes(version), [(booking_date, afternoon)])
+
+    def test_cache_hit_only_reads(self):
+        availability_cache.get_or_compute('test', (), lambda: {'open': True})
+        hits = availability_cache.STATS['hits']
+
+        with CaptureQueriesContext(connection) as queries:
+            payload = availability_cache.get_or_compute('test', (), lambda: self.fail('recomputed'))
+
+        self.assertEqual(payload, {'open': True})
+        self.assertEqual(availability_cache.STATS['hits'], hits + 1)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries.captured_queries))
@@ -12,12 +12,15 @@ urlpatterns = [
     # Calendar/availability endpoints (AJAX)
     path('api/availability/', views.get_availability_calendar, name='get_availability_calendar'),
     path('api/check-slot/', views.check_slot_availability, name='check_slot_availability'),
+    path('api/check-slots/', views.check_slots_availability, name='check_slots_availability'),
+    path('api/availability/stream/', views.availability_stream, name='availability_stream'),
 
     # API endpoints
     path('api/group-form/', views.api_group_form_template, name='api_group_form_template'),
     path('api/individual-form/', views.api_individual_form_template, name='api_individual_form_template'),
     path('api/unavailable-dates/', views.get_unavailable_dates, name='get_unavailable_dates'),
     path('api/booking-settings/', views.get_booking_settings, name='get_bookings_settings'),
+    path('api/returning-customer/', views.returning_customer_lookup, name='returning_customer_lookup'),
     
     # Admin views (separate pages for admin use)
     path('management/dashboard/', views.admin_dashboard, name='admin_dashboard'),
@@ -27,6 +30,8 @@ urlpatterns = [
     path('management/dates/', admin_views.manage_unavailable_dates, name='manage_unavailable_dates'),
     path('management/mark-date-unavailable/', admin_views.mark_date_unavailable, name='mark_date_unavailable'),
     path('management/mark-date-available/', admin_views.mark_date_available, name='mark_date_available'),
+    path('management/mark-dates-unavailable/', admin_views.mark_dates_unavailable, name='mark_dates_unavailable'),
+    path('management/mark-dates-available/', admin_views.mark_dates_available, name='mark_dates_available'),
     path('management/get-date-info/', admin_views.get_date_info, name='get_date_info'),
     
     # Utility endpoints
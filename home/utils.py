@@ -3,10 +3,13 @@ Utility functions for Canine Compadre booking system
 """
 
 import logging
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Q, prefetch_related_objects
 from django.template.loader import render_to_string
 from django.conf import settings
-from .models import GroupWalk
+from django.utils import timezone
+from .models import EmailOutbox, GroupWalk, write_transaction
 
 logger = logging.getLogger(__name__)
 
@@ -17,70 +20,151 @@ def cancel_bookings_for_unavailable_slots(date, cancelled_time_slots, reason="Da
     
     Args:
         date: The date to cancel bookings for
-        cancelled_time_slots: List of time slots to cancel (e.g., ['10:00-12:00', '14:00-16:00'])
+        cancelled_time_slots: List of time slots to cancel (e.g., ['09:30-11:30', '14:00-16:00'])
         reason: Reason for cancellation to include in emails
     
     Returns:
         int: Number of bookings cancelled
     """
-
-    # Find all confirmed bookings for the specified date and time slots
-    bookings_to_cancel = GroupWalk.objects.filter(
-        booking_date=date,
-        time_slot__in=cancelled_time_slots,
-        status='confirmed'
+    return cancel_bookings_for_closed_slots(
+        [(date, time_slot) for time_slot in cancelled_time_slots],
+        reason
     )
 
-    cancelled_count = 0
+def cancel_bookings_for_closed_slots(closed_slots, reason="Date marked unavailable"):
+    """
+    Cancel the confirmed bookings on any number of closed slots
+
+    The bookings are found with one query and cancelled with one UPDATE, and
+    their slot occupancy is adjusted in one more. Deleting their calendar
+    events is queued for the sync worker, and emails are handed to
+    dispatch_cancellation_notices once the transaction commits.
 
-    for booking in bookings_to_cancel:
-        try:
-            # Cancel the booking
+    Args:
+        closed_slots: (date, time_slot) pairs that were closed
+        reason: Reason for cancellation to include in emails
+
+    Returns:
+        int: Number of bookings cancelled
+    """
+    from .models import CalendarSyncTask, SlotOccupancy
+    from .availability_cache import schedule_version_bump
+
+    closed_slots = set(closed_slots)
+    if not closed_slots:
+        return 0
+
+    matches = Q()
+    for check_date, time_slot in closed_slots:
+        matches |= Q(booking_date=check_date, time_slot=time_slot)
+
+    with write_transaction():
+        bookings = list(
+            GroupWalk.objects.select_for_update().filter(matches, status='confirmed')
+        )
+        if not bookings:
+            return 0
+
+        CalendarSyncTask.enqueue([booking for booking in bookings if booking.calendar_event_id], 'delete')
+        GroupWalk.objects.filter(pk__in=[booking.pk for booking in bookings]).update(
+            status='cancelled',
+            calendar_event_id=None,
+            updated_at=timezone.now()
+        )
+
+        deltas = {}
+        for booking in bookings:
             booking.status = 'cancelled'
-            booking.save()
+            booking.calendar_event_id = None
+            key = (booking.booking_date, booking.time_slot)
+            deltas[key] = deltas.get(key, 0) - booking.number_of_dogs
+        SlotOccupancy.adjust_many(deltas)
+        schedule_version_bump(deltas.keys())
 
-            # Delete calendar event if it exists
-            if booking.calendar_event_id:
-                try:
-                    booking.delete_calendar_event()
-                except Exception as e:
-                    logger.error(f"Failed to delete calendar even for booking {booking.id}: {str(e)}")
-            
-            # Send cancellation email to customer
-            send_cancellation_email(booking, reason)
+        transaction.on_commit(lambda: dispatch_cancellation_notices(bookings, reason))
+
+    logger.info(f"Cancelled {len(bookings)} bookings across {len(deltas)} slots")
+    return len(bookings)
+
+def dispatch_cancellation_notices(bookings, reason):
+    """
+    Queue cancellation emails for a batch of cancelled bookings
 
-            cancelled_count += 1
-            logger.info(f"Cancelled booking {booking.id} for {booking.cusomter_name} on {date}")
+    Every email is added to the outbox with one insert.
 
+    Args:
+        bookings: Cancelled GroupWalk bookings
+        reason: Reason for cancellation to include in emails
+    """
+    prefetch_related_objects(bookings, 'dogs')
+
+    # Customers on the same slot with the same number of dogs get the same suggestions
+    shared_alternatives = {}
+    messages = []
+    for booking in bookings:
+        try:
+            alternatives = get_alternative_dates(
+                booking.booking_date,
+                num_dogs=booking.number_of_dogs,
+                time_slot=booking.time_slot,
+                shared_results=shared_alternatives
+            )
+            messages.append((booking, build_cancellation_email(booking, reason, alternatives)))
+            logger.info(f"Cancelled booking {booking.id} for {booking.customer_name} on {booking.booking_date}")
         except Exception as e:
-            logger.error(f"Error cancelling booking {booking.id}: {str(e)}")
+            logger.error(f"Error preparing cancellation email for booking {booking.id}: {str(e)}")
+
+    if not messages:
+        return
 
-    return cancelled_count
+    try:
+        queued = EmailOutbox.enqueue(
+            (message, cancellation_dedupe_key(booking)) for booking, message in messages
+        )
+        logger.info(f"Queued {queued} cancellation emails")
+    except Exception as e:
+        logger.error(
+            f"Failed to queue cancellation emails for bookings "
+            f"{', '.join(str(booking.id) for booking, message in messages)}: {str(e)}"
+        )
 
-def send_cancellation_email(booking, reason):
+def cancellation_dedupe_key(booking):
+    return f'cancellation:{booking.id}'
+
+def build_cancellation_email(booking, reason, alternatives=None):
     """
-    Send a professional cancellation email to the customer
-    
+    Build the cancellation email for a booking
+
     Args:
         booking: The GroupWalk booking that was cancelled
         reason: Reason for cancellation
+        alternatives: Optional list of suggested slots from get_alternative_dates
+
+    Returns:
+        EmailMessage: The unsent email
     """
 
-    try:
-        # Prepare email context
-        context = {
-            'booking': booking,
-            'reason': reason,
-            'business_email': settings.BUSINESS_EMAIL,
-            'site_url': settings.SITE_URL,
-            'dog_names': ', '.join([dog.name for dog in booking.dogs.all()]),
-        }
+    # Prepare email context
+    context = {
+        'booking': booking,
+        'reason': reason,
+        'business_email': settings.BUSINESS_EMAIL,
+        'site_url': settings.SITE_URL,
+        'dog_names': ', '.join([dog.name for dog in booking.dogs.all()]),
+    }
 
-        # Email subject
-        subject = f"Important: Your Group Walk Booking on {booking.booking_date.strftime('%B %d %Y')} has been Cancelled"
+    alternatives_text = ''
+    if alternatives:
+        alternatives_text = "\nSUGGESTED ALTERNATIVES:\n" + "\n".join(
+            f"• {slot['date'].strftime('%A, %B %d, %Y')} - {slot['time_display']}"
+            for slot in alternatives
+        ) + "\n"
 
-        # Email content
-        message = f"""Dear {booking.customer_name},
+    # Email subject
+    subject = f"Important: Your Group Walk Booking on {booking.booking_date.strftime('%B %d %Y')} has been Cancelled"
+
+    # Email content
+    message = f"""Dear {booking.customer_name},
 
 We sincerely apologize, but we need to cancel your group walk booking due to unforeseen circumstances.
 
@@ -94,7 +178,7 @@ REASON FOR CANCELLATION:
 {reason}
 
 We understand this is inconvenient and apologize for any disruption to your plans. To make this right, we'd like to offer you priority booking for an alternative date.
-
+{alternatives_text}
 NEXT STEPS:
 1. Visit our website to see available dates: {context['site_url']}
 2. Contact us directly at {context['business_email']} if you need assistance rebooking
@@ -111,55 +195,68 @@ Canine Compadre
 This is an automated message. If you have any questions, please contact us directly.
         """
 
-        # Send the eamil
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.customer_email],
-            fail_silently=False,
-        )
+    return EmailMessage(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[booking.customer_email],
+    )
 
-        logger.info(f"Cancellation email sent to {booking.customer_email} for booking {booking.id}")
+def send_cancellation_email(booking, reason, alternatives=None):
+    """
+    Queue a professional cancellation email to the customer
+    
+    Args:
+        booking: The GroupWalk booking that was cancelled
+        reason: Reason for cancellation
+        alternatives: Optional list of suggested slots from get_alternative_dates
+    """
+
+    try:
+        EmailOutbox.enqueue([(build_cancellation_email(booking, reason, alternatives), cancellation_dedupe_key(booking))])
+
+        logger.info(f"Cancellation email queued for {booking.customer_email} for booking {booking.id}")
         return True
         
     except Exception as e:
-        logger.error(f"Failed to send cancellation email for booking {booking.id}: {str(e)}")
+        logger.error(f"Failed to queue cancellation email for booking {booking.id}: {str(e)}")
         return False
 
-def get_alternative_dates(cancelled_date, num_dogs=1, days_ahead=14):
+def get_alternative_dates(cancelled_date, num_dogs=1, days_ahead=14, time_slot=None, shared_results=None):
     """
     Get suggested alternative dates for rebooking
     
     Args:
         cancelled_date: The date that was cancelled
         num_dogs: Number of dogs to accommodate
-        days_ahead: How many days ahead to look for alternatives
+        days_ahead: How many days either side of the cancelled date to look
+        time_slot: The cancelled time slot - alternatives closest to it rank first
+        shared_results: Optional dict reused across a batch of cancellations so
+            customers cancelled on the same date share one search
     
     Returns:
-        list: Available alternative slots
+        list: Up to 5 available alternative slots, closest first
     """
     
-    from datetime import timedelta
-    from .models import GroupWalk
+    from .availability import find_nearest_slots
     
-    # Get available slots starting from the day after cancellation
-    start_date = max(cancelled_date + timedelta(days=1), date.today() + timedelta(days=1))
+    key = (cancelled_date, time_slot, num_dogs, days_ahead)
+    if shared_results is not None and key in shared_results:
+        return shared_results[key]
     
     try:
-        alternative_slots = GroupWalk.get_available_slots(
-            days_ahead=days_ahead, 
-            required_dogs=num_dogs
+        alternative_slots = find_nearest_slots(
+            cancelled_date,
+            num_dogs=num_dogs,
+            time_slot=time_slot,
+            limit=5,
+            max_distance=days_ahead
         )
         
-        # Filter to only show dates after the cancelled date
-        filtered_slots = [
-            slot for slot in alternative_slots 
-            if slot['date'] >= start_date
-        ]
-        
-        return filtered_slots[:5]  # Return top 5 alternatives
-        
     except Exception as e:
         logger.error(f"Error getting alternative dates: {str(e)}")
         return []
+    
+    if shared_results is not None:
+        shared_results[key] = alternative_slots
+    return alternative_slots
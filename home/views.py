@@ -1,8 +1,9 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, Http404
+from django.http import JsonResponse, Http404, StreamingHttpResponse
 from django.contrib import messages
 from django.db import transaction
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
@@ -11,14 +12,22 @@ from django.template.loader import render_to_string
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from datetime import date, timedelta
+from asgiref.sync import sync_to_async
 import json
 import logging
 
-from .models import GroupWalk, IndividualWalk, Dog, GroupWalkSlotManager
+from .models import BookingSettings, CalendarSyncTask, GroupWalk, IndividualWalk, DogProfile, GroupWalkSlotManager, write_transaction
+from .availability import (
+    acheck_slots, aget_closed_dates, aload_capacity_matrix, available_slots_from_matrix, check_slots,
+    get_booking_window
+)
+from . import availability_cache, availability_grid, slot_catalogue
+from .decorators import async_condition, idempotent, throttle
+from .availability_feed import stream_events
 from .forms import (
     GroupWalkForm, IndividualWalkForm, DogForm, 
     GroupWalkDogFormSet, IndividualWalkDogFormSet,
-    AdminResponseForm
+    AdminResponseForm, validate_group_walk_cart
 )
 
 # Import our new services
@@ -33,11 +42,18 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# Query parameters that select a window of the availability calendar
+WINDOW_PARAMS = ('start', 'end', 'month')
+
+# Most slots a single bulk availability check will accept
+MAX_BULK_SLOTS = 20
+
 def home(request):
     """Main page with all sections including booking"""
     return render(request, 'home/home.html')
 
 @require_http_methods(["POST"])
+@idempotent
 def group_walk_booking(request):
     """Handle group walk bookings via AJAX - supports multiple slot selection"""
     import uuid
@@ -65,10 +81,11 @@ def group_walk_booking(request):
         booking_date = request.POST.get('booking_date')
         time_slot = request.POST.get('time_slot')
         if booking_date and time_slot:
+            slot = slot_catalogue.get_slot(time_slot)
             selected_slots = [{
                 'date': booking_date,
                 'timeSlot': time_slot,
-                'timeDisplay': dict(GroupWalk.TIME_SLOT_CHOICES).get(time_slot, time_slot),
+                'timeDisplay': slot.label if slot else time_slot,
                 'dateDisplay': booking_date
             }]
     
@@ -136,78 +153,67 @@ def group_walk_booking(request):
             'errors': errors
         })
     
+    # Validate every slot before reserving any of them - settings, slot overrides
+    # and occupancy for the whole cart are loaded once
+    bookings, failures = validate_group_walk_cart(customer_data, selected_slots)
+    if failures:
+        errors = {}
+        for slot_data, slot_errors in failures:
+            for field_name, field_errors in slot_errors.items():
+                if len(failures) > 1:
+                    field_errors = [f'{slot_data["dateDisplay"]} at {slot_data["timeDisplay"]}: {error}' for error in field_errors]
+                errors.setdefault(field_name, []).extend(field_errors)
+        
+        if len(failures) == 1:
+            slot_data = failures[0][0]
+            message = f'Validation failed for slot {slot_data["dateDisplay"]} at {slot_data["timeDisplay"]}'
+        else:
+            message = f'Validation failed for {len(failures)} slots'
+        
+        return JsonResponse({
+            'success': False,
+            'message': message,
+            'errors': errors,
+            'slot_errors': [
+                {'date': slot_data['date'], 'time_slot': slot_data['timeSlot'], 'errors': slot_errors}
+                for slot_data, slot_errors in failures
+            ],
+        })
+    
+    if is_multi_booking:
+        batch_id = str(uuid.uuid4())
+        for booking in bookings:
+            booking.batch_id = batch_id
+    
     try:
-        with transaction.atomic():
-            created_bookings = []
-            batch_id = str(uuid.uuid4()) if is_multi_booking else None
+        with write_transaction():
+            # Reserve the dogs on every slot (one conditional UPDATE each), insert every
+            # booking in one bulk write and link each to the customer's dog profiles. It's
+            # one transaction, so a crash part way through rolls the reservations back too
+            created_bookings = GroupWalk.create_many(
+                bookings,
+                [
+                    {
+                        'name': dog_info['name'],
+                        'breed': dog_info['breed'],
+                        'age': int(dog_info['age']) if dog_info['age'] else 0,
+                        'allergies': dog_info['allergies'],
+                        'special_instructions': dog_info['special_instructions'],
+                        'good_with_other_dogs': dog_info['good_with_other_dogs'],
+                        'behavioral_notes': dog_info['behavioral_notes'],
+                        'vet_name': dog_info['vet_name'],
+                        'vet_phone': dog_info['vet_phone'],
+                        'vet_address': dog_info['vet_address'],
+                    }
+                    for dog_info in dog_data
+                ]
+            )
             
-            # Create a booking for each selected slot
-            for slot_data in selected_slots:
-                # Create form data for this specific slot
-                form_data = customer_data.copy()
-                form_data.update({
-                    'booking_date': slot_data['date'],
-                    'time_slot': slot_data['timeSlot'],
-                })
-                
-                # Validate this specific slot
-                form = GroupWalkForm(form_data)
-                if not form.is_valid():
-                    # Clean up the form errors and return them properly
-                    slot_errors = {}
-                    for field_name, field_errors in form.errors.items():
-                        clean_errors = [str(error) for error in field_errors]
-                        slot_errors[field_name] = clean_errors
-                    
-                    return JsonResponse({
-                        'success': False,
-                        'message': f'Validation failed for slot {slot_data["dateDisplay"]} at {slot_data["timeDisplay"]}',
-                        'errors': slot_errors
-                    })
-                
-                # Create the booking
-                booking = form.save(commit=False)
-                if batch_id:
-                    booking.batch_id = batch_id
-                booking.save()
-                
-                # Create dog records for this booking
-                created_dogs = []
-                for dog_info in dog_data:
-                    if dog_info['name']:
-                        dog = Dog.objects.create(
-                            group_walk=booking,
-                            name=dog_info['name'],
-                            breed=dog_info['breed'],
-                            age=int(dog_info['age']) if dog_info['age'] else 0,
-                            allergies=dog_info['allergies'],
-                            special_instructions=dog_info['special_instructions'],
-                            good_with_other_dogs=dog_info['good_with_other_dogs'],
-                            behavioral_notes=dog_info['behavioral_notes'],
-                            vet_name=dog_info['vet_name'],
-                            vet_phone=dog_info['vet_phone'],
-                            vet_address=dog_info['vet_address'],
-                        )
-                        created_dogs.append(dog)
-                
-                # Verify correct number of dogs
-                if len(created_dogs) != booking.number_of_dogs:
-                    raise ValueError(f"Expected {booking.number_of_dogs} dogs, but only {len(created_dogs)} were created")
-                
-                # Create individual calendar event for this booking
-                if not booking.calendar_event_id:
-                    try:
-                        from .calendar_service import GoogleCalendarService
-                        calendar_service = GoogleCalendarService()
-                        event_id = calendar_service.create_group_walk_event(booking)
-                        if event_id:
-                            booking.calendar_event_id = event_id
-                            booking.save(update_fields=['calendar_event_id'])
-                            logger.info(f"Calendar event created for booking {booking.id}: {event_id}")
-                    except Exception as e:
-                        logger.error(f"Error creating calendar event for booking {booking.id}: {str(e)}")
-                
-                created_bookings.append(booking)
+            # Queue the calendar events - the sync_calendar worker creates them after commit
+            calendar_tasks = CalendarSyncTask.enqueue(
+                [booking for booking in created_bookings if not booking.calendar_event_id],
+                'create'
+            )
             
             # Send single email for all bookings
             customer_email_sent = False
@@ -221,9 +227,9 @@ def group_walk_booking(request):
                         customer_email_sent = EmailService.send_group_walk_confirmation(created_bookings[0])
                     
                     if customer_email_sent:
-                        logger.info(f"Confirmation email sent for {len(created_bookings)} booking(s)")
+                        logger.info(f"Confirmation email queued for {len(created_bookings)} booking(s)")
                     else:
-                        logger.warning(f"Failed to send confirmation email for {len(created_bookings)} booking(s)")
+                        logger.warning(f"Failed to queue confirmation email for {len(created_bookings)} booking(s)")
                 except Exception as e:
                     logger.error(f"Error sending confirmation email: {str(e)}")
                     # Don't let email failure break the booking - set to False and continue
@@ -239,7 +245,7 @@ def group_walk_booking(request):
                         admin_email_sent = EmailService.send_admin_notification(created_bookings[0], 'group_walk')
                     
                     if admin_email_sent:
-                        logger.info(f"Admin notification sent for {len(created_bookings)} booking(s)")
+                        logger.info(f"Admin notification queued for {len(created_bookings)} booking(s)")
                 except Exception as e:
                     logger.error(f"Error sending admin notification: {str(e)}")
             
@@ -260,6 +266,7 @@ def group_walk_booking(request):
                 'booking_ids': [booking.id for booking in created_bookings],
                 'total_bookings': len(created_bookings),
                 'calendar_events_created': sum(1 for booking in created_bookings if booking.calendar_event_id),
+                'calendar_events_queued': len(calendar_tasks),
                 'email_sent': customer_email_sent,
             })
             
@@ -286,6 +293,7 @@ def group_walk_booking(request):
         })
 
 @require_http_methods(["POST"])
+@idempotent
 def individual_walk_booking(request):
     """Handle individual walk requests via AJAX - return JSON response with full integration"""
     
@@ -330,28 +338,30 @@ def individual_walk_booking(request):
                 # Create the individual walk request
                 booking = form.save()
                 
-                # Create dog records
-                created_dogs = []
+                # Find or create the customer's dog profiles and link them to the request
+                dog_details = []
                 for dog_info in dog_data:
-                    if dog_info['name']:  # Only create if name is provided
+                    if dog_info['name']:  # Only add if name is provided
                         # Validate required vet fields
                         if not dog_info['vet_name'] or not dog_info['vet_phone'] or not dog_info['vet_address']:
                             raise ValueError("All veterinary information fields are required")
                         
-                        dog = Dog.objects.create(
-                            individual_walk=booking,
-                            name=dog_info['name'],
-                            breed=dog_info['breed'],
-                            age=int(dog_info['age']) if dog_info['age'] else 0,
-                            allergies=dog_info['allergies'],
-                            special_instructions=dog_info['special_instructions'],
-                            good_with_other_dogs=dog_info['good_with_other_dogs'],
-                            behavioral_notes=dog_info['behavioral_notes'],
-                            vet_name=dog_info['vet_name'],
-                            vet_phone=dog_info['vet_phone'],
-                            vet_address=dog_info['vet_address'],
-                        )
-                        created_dogs.append(dog)
+                        dog_details.append({
+                            'name': dog_info['name'],
+                            'breed': dog_info['breed'],
+                            'age': int(dog_info['age']) if dog_info['age'] else 0,
+                            'allergies': dog_info['allergies'],
+                            'special_instructions': dog_info['special_instructions'],
+                            'good_with_other_dogs': dog_info['good_with_other_dogs'],
+                            'behavioral_notes': dog_info['behavioral_notes'],
+                            'vet_name': dog_info['vet_name'],
+                            'vet_phone': dog_info['vet_phone'],
+                            'vet_address': dog_info['vet_address'],
+                        })
+                created_dogs = list(dict.fromkeys(
+                    DogProfile.for_owner(booking.customer_email, booking.customer_name, dog_details)
+                ))
+                booking.dogs.add(*created_dogs)
                 
                 # Verify we have the right number of dogs
                 if len(created_dogs) != booking.number_of_dogs:
@@ -367,9 +377,9 @@ def individual_walk_booking(request):
                         customer_email_sent = EmailService.send_individual_walk_request_confirmation(booking)
                         print(f"DEBUG: Email send result = {customer_email_sent}")
                         if customer_email_sent:
-                            logger.info(f"Confirmation email sent for individual walk request {booking.id}")
+                            logger.info(f"Confirmation email queued for individual walk request {booking.id}")
                         else:
-                            logger.warning(f"Failed to send confirmation email for individual walk request {booking.id}")
+                            logger.warning(f"Failed to queue confirmation email for individual walk request {booking.id}")
                             print(f"DEBUG: Email send returned False - check EmailService logs")
                     except Exception as e:
                         print(f"DEBUG: Exception during email send: {str(e)}")
@@ -383,7 +393,7 @@ def individual_walk_booking(request):
                     try:
                         admin_email_sent = EmailService.send_admin_notification(booking, 'individual_walk')
                         if admin_email_sent:
-                            logger.info(f"Admin notification sent for individual walk request {booking.id}")
+                            logger.info(f"Admin notification queued for individual walk request {booking.id}")
                     except Exception as e:
                         logger.error(f"Error sending admin notification for individual walk request {booking.id}: {str(e)}")
                 
@@ -391,7 +401,7 @@ def individual_walk_booking(request):
                 dog_names = [dog.name for dog in created_dogs]
                 
                 # Create status indicators
-                email_status = f"📧 Confirmation sent to {booking.customer_email}" if customer_email_sent else "⚠️ Email confirmation pending"
+                email_status = f"📧 Confirmation will be emailed to {booking.customer_email}" if customer_email_sent else "⚠️ Email confirmation pending"
                 
                 success_html = f"""
                 <div class="booking-success text-center">
@@ -487,8 +497,38 @@ def individual_walk_booking(request):
             'errors': errors
         })
 
-def get_availability_calendar(request):
-    """AJAX endpoint to get calendar availability data for group walks with slot manager integration"""
+async def availability_calendar_etag(request):
+    """ETag for the availability calendar - changes with the availability version and parameters"""
+    # The shared grid knows the version it serves, so usually no database read is needed
+    version = await availability_grid.acurrent_version() or await availability_cache.aget_version()
+    window_params = tuple(request.GET.get(param, '') for param in WINDOW_PARAMS)
+    if request.GET.get('format') == 'compact':
+        # The compact payload serves every dog count
+        return availability_cache.etag_at(
+            'calendar_compact',
+            version,
+            (request.GET.get('days', 180),) + window_params
+        )
+    return availability_cache.etag_at(
+        'calendar',
+        version,
+        (request.GET.get('days', 180), request.GET.get('num_dogs', 1)) + window_params
+    )
+
+async def availability_last_modified(request):
+    """Last-Modified for the public availability endpoints"""
+    return await availability_cache.alast_modified()
+
+@cache_control(no_cache=True)
+@async_condition(etag_func=availability_calendar_etag, last_modified_func=availability_last_modified)
+async def get_availability_calendar(request):
+    """
+    AJAX endpoint to get calendar availability data for group walks with slot manager integration
+
+    Pass format=compact for a capacity matrix the client filters by dog count itself.
+    Pass start/end (ISO dates) or month (YYYY-MM) for a single window of the
+    booking horizon - the response then includes next/previous cursors.
+    """
     try:
         days_ahead = int(request.GET.get('days', 180))
         num_dogs = int(request.GET.get('num_dogs', 1))
@@ -499,54 +539,50 @@ def get_availability_calendar(request):
         if days_ahead < 1 or days_ahead > 180:
             return JsonResponse({'error': 'Invalid date range'}, status=400)
         
-        # Get available slots using the model method
-        available_slots = GroupWalk.get_available_slots(days_ahead=days_ahead, required_dogs=num_dogs)
-        
-        # Group slots by date
-        availability_data = []
-        current_date = None
-        current_day_data = None
+        window = None
+        start_date = date.today() + timedelta(days=1)
+        if any(request.GET.get(param) for param in WINDOW_PARAMS):
+            try:
+                window = get_booking_window(
+                    start=request.GET.get('start'),
+                    end=request.GET.get('end'),
+                    month=request.GET.get('month')
+                )
+            except ValueError as e:
+                return JsonResponse({'error': f'Invalid date range: {str(e)}'}, status=400)
+            start_date = window['start_date']
+            days_ahead = window['days']
         
-        for slot in available_slots:
-            if current_date != slot['date']:
-                # Save previous day if exists
-                if current_day_data:
-                    availability_data.append(current_day_data)
-                
-                # Start new day
-                current_date = slot['date']
-                current_day_data = {
-                    'date': current_date.isoformat(),
-                    'date_display': current_date.strftime('%B %d, %Y'),
-                    'day_name': current_date.strftime('%A'),
-                    'slots': []
-                }
-            
-            # Add slot to current day
-            current_day_data['slots'].append({
-                'time_slot': slot['time_slot'],
-                'time_display': slot['time_display'],
-                'available_spots': slot['available_spots'],
-                'can_book': slot['can_book'],
-                'is_full': slot['is_full'],
-                'requested_dogs': num_dogs
-            })
+        grid_result = await availability_grid.aread_matrix(start_date, days_ahead)
+        if grid_result:
+            # Straight from shared memory - cheaper than a cache lookup
+            matrix = grid_result[1]
+            if request.GET.get('format') == 'compact':
+                payload = compact_availability_payload(start_date, matrix)
+            else:
+                payload = availability_calendar_payload(matrix, num_dogs)
+        elif request.GET.get('format') == 'compact':
+            payload = await availability_cache.aget_or_compute(
+                'calendar_compact',
+                (start_date.isoformat(), days_ahead),
+                lambda: build_compact_availability(start_date, days_ahead)
+            )
+        else:
+            payload = await availability_cache.aget_or_compute(
+                'calendar',
+                (start_date.isoformat(), days_ahead, num_dogs),
+                lambda: build_availability_calendar(start_date, days_ahead, num_dogs)
+            )
         
-        # Don't forget the last day
-        if current_day_data:
-            availability_data.append(current_day_data)
+        if window:
+            payload = dict(
+                payload,
+                window={'start': window['start_date'].isoformat(), 'end': window['end_date'].isoformat()},
+                previous=window['previous'],
+                next=window['next'],
+            )
         
-        # Filter out days with no available slots
-        availability_data = [
-            day for day in availability_data 
-            if any(slot['can_book'] for slot in day['slots'])
-        ]
-        
-        return JsonResponse({
-            'availability': availability_data,
-            'total_days_with_availability': len(availability_data),
-            'requested_dogs': num_dogs,
-        })
+        return JsonResponse(payload)
         
     except ValueError as e:
         logger.error(f"Value error in get_availability_calendar: {str(e)}")
@@ -555,7 +591,84 @@ def get_availability_calendar(request):
         logger.error(f"Unexpected error in get_availability_calendar: {str(e)}")
         return JsonResponse({'error': 'An error occurred while loading availability'}, status=500)
 
-def check_slot_availability(request):
+async def build_availability_calendar(start_date, days_ahead, num_dogs):
+    """Build the availability calendar payload grouped by date from the database"""
+    matrix = await aload_capacity_matrix(days_ahead=days_ahead, start_date=start_date)
+    return availability_calendar_payload(matrix, num_dogs)
+
+def availability_calendar_payload(matrix, num_dogs):
+    """Build the availability calendar payload grouped by date from a capacity matrix"""
+    available_slots = available_slots_from_matrix(matrix, num_dogs)
+    
+    # Group slots by date
+    availability_data = []
+    current_date = None
+    current_day_data = None
+    
+    for slot in available_slots:
+        if current_date != slot['date']:
+            # Save previous day if exists
+            if current_day_data:
+                availability_data.append(current_day_data)
+            
+            # Start new day
+            current_date = slot['date']
+            current_day_data = {
+                'date': current_date.isoformat(),
+                'date_display': current_date.strftime('%B %d, %Y'),
+                'day_name': current_date.strftime('%A'),
+                'slots': []
+            }
+        
+        # Add slot to current day
+        current_day_data['slots'].append({
+            'time_slot': slot['time_slot'],
+            'time_display': slot['time_display'],
+            'available_spots': slot['available_spots'],
+            'can_book': slot['can_book'],
+            'is_full': slot['is_full'],
+            'requested_dogs': num_dogs
+        })
+    
+    # Don't forget the last day
+    if current_day_data:
+        availability_data.append(current_day_data)
+    
+    # Filter out days with no available slots
+    availability_data = [
+        day for day in availability_data 
+        if any(slot['can_book'] for slot in day['slots'])
+    ]
+    
+    return {
+        'availability': availability_data,
+        'total_days_with_availability': len(availability_data),
+        'requested_dogs': num_dogs,
+    }
+
+async def build_compact_availability(start_date, days_ahead):
+    """Build the compact availability payload from the database"""
+    matrix = await aload_capacity_matrix(days_ahead=days_ahead, start_date=start_date)
+    return compact_availability_payload(start_date, matrix)
+
+def compact_availability_payload(start_date, matrix):
+    """
+    Build the compact availability payload from a capacity matrix
+
+    The slot catalogue is sent once, then each day is an array of remaining
+    capacities in catalogue order, with null marking a blocked slot.
+    """
+    return {
+        'format': 'compact',
+        'start': start_date.isoformat(),
+        'slots': [
+            {'time_slot': slot.id, 'time_display': slot.label}
+            for slot in slot_catalogue.SLOTS
+        ],
+        'days': [capacities for check_date, capacities in matrix],
+    }
+
+async def check_slot_availability(request):
     """AJAX endpoint to check specific slot availability in real-time - UPDATED for new time slots"""
     try:
         booking_date = request.GET.get('date')
@@ -570,6 +683,13 @@ def check_slot_availability(request):
         except ValueError:
             return JsonResponse({'error': 'Invalid date format'}, status=400)
         
+        # Only catalogue slots and bookable dog counts reach the cache key
+        if slot_catalogue.get_slot(time_slot) is None:
+            return JsonResponse({'error': 'Invalid time slot'}, status=400)
+        booking_settings = await BookingSettings.aget_settings()
+        if num_dogs < 1 or num_dogs > booking_settings.max_dogs_per_booking:
+            return JsonResponse({'error': 'Invalid number of dogs'}, status=400)
+        
         # Validate date is not in the past
         if booking_date <= date.today():
             return JsonResponse({
@@ -579,67 +699,93 @@ def check_slot_availability(request):
                 'message': 'Cannot book walks for past dates'
             })
         
-        # Check slot manager restrictions
-        slot_manager = GroupWalkSlotManager.objects.filter(date=booking_date).first()
-        max_capacity = 4  # default
+        payload = await availability_cache.aget_or_compute(
+            'check_slot',
+            (booking_date.isoformat(), time_slot, num_dogs),
+            lambda: build_slot_availability(booking_date, time_slot, num_dogs, booking_settings)
+        )
         
-        if slot_manager:
-            # UPDATED for new time slots
-            if time_slot == '09:30-11:30' and not slot_manager.morning_slot_available:
-                return JsonResponse({
-                    'available_spots': 0,
-                    'can_book': False,
-                    'requested_dogs': num_dogs,
-                    'message': 'This time slot is not available on this date'
-                })
-            elif time_slot == '14:00-16:00' and not slot_manager.afternoon_slot_available:
-                return JsonResponse({
-                    'available_spots': 0,
-                    'can_book': False,
-                    'requested_dogs': num_dogs,
-                    'message': 'This time slot is not available on this date'
-                })
-            elif time_slot == '18:00-20:00' and not slot_manager.evening_slot_available:
-                return JsonResponse({
-                    'available_spots': 0,
-                    'can_book': False,
-                    'requested_dogs': num_dogs,
-                    'message': 'This time slot is not available on this date'
-                })
-            
-            # Use custom capacity if set - UPDATED for new time slots
-            if time_slot == '09:30-11:30':
-                max_capacity = slot_manager.morning_slot_capacity
-            elif time_slot == '14:00-16:00':
-                max_capacity = slot_manager.afternoon_slot_capacity
-            elif time_slot == '18:00-20:00':
-                max_capacity = slot_manager.evening_slot_capacity
+        return JsonResponse(payload)
         
-        # Calculate available spots
-        total_dogs_booked = GroupWalk.objects.filter(
-            booking_date=booking_date,
-            time_slot=time_slot,
-            status='confirmed'
-        ).aggregate(total=models.Sum('number_of_dogs'))['total'] or 0
+    except ValueError as e:
+        logger.error(f"Value error in check_slot_availability: {str(e)}")
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    except Exception as e:
+        logger.error(f"Unexpected error in check_slot_availability: {str(e)}")
+        return JsonResponse({'error': 'An error occurred while checking availability'}, status=500)
+
+async def build_slot_availability(booking_date, time_slot, num_dogs, booking_settings):
+    """Build the availability payload for a single date and time slot"""
+    result = (await acheck_slots([(booking_date, time_slot)], num_dogs, booking_settings))[0]
+    del result['date'], result['time_slot']
+    return result
+
+def check_slots_availability(request):
+    """
+    AJAX endpoint to check many slots at once for a multi-booking cart
+
+    Takes slots as a JSON list in the selected_slots format ({date, timeSlot})
+    and answers with one result per slot, in the same order.
+    """
+    try:
+        num_dogs = int(request.GET.get('num_dogs', 1))
+        booking_settings = BookingSettings.get_settings()
+        if num_dogs < 1 or num_dogs > booking_settings.max_dogs_per_booking:
+            return JsonResponse({'error': 'Invalid number of dogs'}, status=400)
         
-        available_spots = max_capacity - total_dogs_booked
-        can_book = available_spots >= num_dogs
+        try:
+            slot_data = json.loads(request.GET.get('slots', ''))
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid slot data'}, status=400)
+        
+        if not isinstance(slot_data, list) or not slot_data:
+            return JsonResponse({'error': 'Missing parameters'}, status=400)
+        if len(slot_data) > MAX_BULK_SLOTS:
+            return JsonResponse({'error': f'Cannot check more than {MAX_BULK_SLOTS} slots at once'}, status=400)
+        
+        slots = []
+        for slot in slot_data:
+            time_slot = slot.get('timeSlot') or slot.get('time_slot')
+            if not slot.get('date') or not time_slot:
+                return JsonResponse({'error': 'Missing parameters'}, status=400)
+            try:
+                slots.append((date.fromisoformat(slot['date']), time_slot))
+            except ValueError:
+                return JsonResponse({'error': 'Invalid date format'}, status=400)
+        
+        results = check_slots(slots, num_dogs, booking_settings)
         
         return JsonResponse({
-            'available_spots': available_spots,
-            'can_book': can_book,
+            'slots': results,
+            'can_book_all': all(result['can_book'] for result in results),
             'requested_dogs': num_dogs,
-            'max_capacity': max_capacity,
-            'message': f'{"Available" if can_book else "Not enough space"} - {available_spots} spots remaining'
         })
         
-    except ValueError as e:
-        logger.error(f"Value error in check_slot_availability: {str(e)}")
+    except (ValueError, AttributeError) as e:
+        logger.error(f"Value error in check_slots_availability: {str(e)}")
         return JsonResponse({'error': 'Invalid parameters'}, status=400)
     except Exception as e:
-        logger.error(f"Unexpected error in check_slot_availability: {str(e)}")
+        logger.error(f"Unexpected error in check_slots_availability: {str(e)}")
         return JsonResponse({'error': 'An error occurred while checking availability'}, status=500)
 
+async def availability_stream(request):
+    """
+    Server-Sent Events stream of availability changes for the booking calendar
+
+    Each event carries [date, time_slot, remaining] deltas. Needs the ASGI
+    server so an open stream does not hold a worker.
+    """
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    except (TypeError, ValueError):
+        last_event_id = None
+    
+    response = StreamingHttpResponse(stream_events(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # Admin views for managing bookings
 
 def admin_dashboard(request):
@@ -774,7 +920,7 @@ def admin_group_walk_detail(request, booking_id):
         return redirect('admin_dashboard')
 
 @require_http_methods(["GET"])
-def health_check(request):
+async def health_check(request):
     """Simple health check endpoint with integration status"""
     status_data = {
         'status': 'ok',
@@ -785,11 +931,16 @@ def health_check(request):
         }
     }
     
+    try:
+        status_data['availability_cache'] = await availability_cache.aget_stats()
+    except Exception as e:
+        logger.error(f"Error reading availability cache stats: {str(e)}")
+    
     # Check if integrations are working
     if INTEGRATIONS_AVAILABLE:
         try:
             from .calendar_service import GoogleCalendarService
-            calendar_service = GoogleCalendarService()
+            calendar_service = await sync_to_async(GoogleCalendarService)()
             status_data['integrations']['calendar_service'] = calendar_service.service is not None
         except Exception:
             pass
@@ -924,13 +1075,13 @@ def debug_booking(request):
     """Enhanced debug endpoint to identify calendar service issues"""
     try:
         # Test 1: Basic imports
-        from .models import GroupWalk, IndividualWalk, Dog
+        from .models import GroupWalk, IndividualWalk, DogProfile
         from .forms import GroupWalkForm, IndividualWalkForm
         
         # Test 2: Database connection
         group_count = GroupWalk.objects.count()
         individual_count = IndividualWalk.objects.count()
-        dog_count = Dog.objects.count()
+        dog_count = DogProfile.objects.count()
         
         # Test 3: Settings
         business_email = getattr(settings, 'BUSINESS_EMAIL', 'NOT FOUND')
@@ -1033,31 +1184,20 @@ def debug_booking(request):
         })
 
 @require_http_methods(["GET"])
-def get_unavailable_dates(request):
+@cache_control(no_cache=True)
+@async_condition(
+    etag_func=lambda request: availability_cache.aetag_for('unavailable_dates', (date.today().isoformat(),)),
+    last_modified_func=availability_last_modified
+)
+async def get_unavailable_dates(request):
     """API endpoint to get all unavailable dates for individual walk form validation"""
     try:
-        from datetime import date, timedelta
-        
-        # Get all future dates that are completely unavailable
-        today = date.today()
-        unavailable_dates = []
-        
-        # Get slot managers where all slots are disabled
-        slot_managers = GroupWalkSlotManager.objects.filter(
-            date__gte=today,
-            morning_slot_available=False,
-            afternoon_slot_available=False,
-            evening_slot_available=False
+        return JsonResponse(
+            await availability_cache.aget_or_compute(
+                'unavailable_dates', (date.today().isoformat(),), build_unavailable_dates
+            )
         )
         
-        for slot_manager in slot_managers:
-            unavailable_dates.append(slot_manager.date.isoformat())
-        
-        return JsonResponse({
-            'success': True,
-            'unavailable_dates': unavailable_dates
-        })
-        
     except Exception as e:
         logger.error(f"Error getting unavailable dates: {str(e)}")
         return JsonResponse({
@@ -1065,26 +1205,96 @@ def get_unavailable_dates(request):
             'error': 'Error loading unavailable dates'
         })
 
+async def build_unavailable_dates():
+    """Build the payload of dates in the booking horizon that are completely unavailable"""
+    # Dates closed by per-date overrides or recurring rules, evaluated in memory
+    unavailable_dates = await aget_closed_dates()
+    
+    return {
+        'success': True,
+        'unavailable_dates': [unavailable_date.isoformat() for unavailable_date in unavailable_dates]
+    }
+
 @require_http_methods(["GET"])
-def get_booking_settings(request):
+@cache_control(no_cache=True)
+@async_condition(
+    etag_func=lambda request: availability_cache.aetag_for('booking_settings', ()),
+    last_modified_func=availability_last_modified
+)
+async def get_booking_settings(request):
     """ API endpoint to get current booking settings for JavaScript """
     try:
-        from .models import BookingSettings
-        settings = BookingSettings.get_settings()
+        return JsonResponse(
+            await availability_cache.aget_or_compute('booking_settings', (), build_booking_settings)
+        )
+    except Exception as e:
+        logger.error(f"Error getting booking settings: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': 'Error loading settings'
+        }, status=500)
+
+async def build_booking_settings():
+    """Build the booking settings payload for JavaScript"""
+    from .models import BookingSettings
+    settings = await BookingSettings.aget_settings()
+
+    return {
+        'success': True,
+        'settings': {
+            'max_dogs_per_booking': settings.max_dogs_per_booking,
+            'allow_weekend_bookings': settings.allow_weekend_bookings,
+            'allow_evening_slot': settings.allow_evening_slot,
+        }
+    }
+
+@require_http_methods(["POST"])
+@throttle(
+    'returning_customer', limit=5, period=60 * 60,
+    key=lambda request: request.POST.get('email', '').strip().lower()
+)
+def returning_customer_lookup(request):
+    """
+    Prefill the dogs of a returning customer
+
+    Both the email and the postcode must match a customer, and lookups are
+    throttled per client and per email, since postcodes in the service area
+    are easy to guess. Only the dogs' names, breeds and ages are returned -
+    never the customer's contact details or their dogs' vet and health notes.
+    A miss looks the same whichever of the two didn't match.
+    """
+    from .models import Customer
+
+    email = request.POST.get('email', '')
+    postcode = request.POST.get('postcode', '')
+    if not email or not postcode:
+        return JsonResponse({
+            'success': False,
+            'error': 'Email and postcode are required'
+        }, status=400)
+
+    try:
+        customer = Customer.find_returning(email, postcode)
+        if customer is None:
+            return JsonResponse({'success': True, 'found': False})
 
         return JsonResponse({
             'success': True,
-            'settings': {
-                'max_dogs_per_booking': settings.max_dogs_per_booking,
-                'allow_weekend_bookings': settings.allow_weekend_bookings,
-                'allow_evening_slot': settings.allow_evening_slot,
-            }
+            'found': True,
+            'dogs': [
+                {
+                    'name': dog.name,
+                    'breed': dog.breed,
+                    'age': dog.age,
+                }
+                for dog in customer.dogs
+            ],
         })
     except Exception as e:
-        logger.error(f"Error getting booking settings: {str(e)}")
+        logger.error(f"Error looking up returning customer: {str(e)}")
         return JsonResponse({
             'success': False,
-            'error': 'Error loading settings'
+            'error': 'Error looking up customer'
         }, status=500)
 
 def generate_multi_booking_success_html(bookings, email_sent):
@@ -1108,8 +1318,9 @@ def generate_multi_booking_success_html(bookings, email_sent):
         for detail in booking_details
     ])
     
-    calendar_status = f"✅ {sum(1 for b in bookings if b.calendar_event_id)} calendar events created"
-    email_status = f"📧 Confirmation sent to {first_booking.customer_email}" if email_sent else "⚠️ Email confirmation pending"
+    events_created = sum(1 for b in bookings if b.calendar_event_id)
+    calendar_status = f"✅ {events_created} calendar events created" if events_created else "📅 Calendar sync queued"
+    email_status = f"📧 Confirmation will be emailed to {first_booking.customer_email}" if email_sent else "⚠️ Email confirmation pending"
     
     return f"""
     <div class="booking-success text-center">
@@ -1149,8 +1360,8 @@ def generate_multi_booking_success_html(bookings, email_sent):
 
 def generate_single_booking_success_html(booking, dog_names, email_sent):
     """Generate success HTML for single booking (existing functionality)"""
-    calendar_status = "✅ Added to calendar" if booking.calendar_event_id else "⚠️ Calendar sync pending"
-    email_status = f"📧 Confirmation sent to {booking.customer_email}" if email_sent else "⚠️ Email confirmation pending"
+    calendar_status = "✅ Added to calendar" if booking.calendar_event_id else "📅 Calendar sync queued"
+    email_status = f"📧 Confirmation will be emailed to {booking.customer_email}" if email_sent else "⚠️ Email confirmation pending"
     
     return f"""
     <div class="booking-success text-center">